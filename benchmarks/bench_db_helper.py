@@ -0,0 +1,143 @@
+# bench_db_helper.py
+#
+# Micro-Benchmarks der DBHelper-Methoden bei wachsenden Tabellengrößen,
+# single-threaded und mit mehreren Threads auf derselben DBHelper-Instanz.
+# Schlägt fehl (Exit-Code 1), wenn eine Methode, die per Index suchen soll,
+# laut EXPLAIN QUERY PLAN eine Tabelle scannt oder ihr Durchsatz zwischen der
+# kleinsten und größten Tabelle stärker als --max-slowdown einbricht.
+#
+#   python benchmarks/bench_db_helper.py --sizes 1000 10000 100000 1000000 --threads 8
+#   python benchmarks/bench_db_helper.py --sizes 1000 10000000 -o db_bench.json
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import db_helper
+from db_helper import DBHelper
+from seed_db import seed_database
+
+
+def capture_statements(fn):
+    """Runs fn() and returns the SQL statements DBHelper executed (with bound values)."""
+    statements = []
+    original = db_helper.sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = original(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    db_helper.sqlite3.connect = traced_connect
+    try:
+        fn()
+    finally:
+        db_helper.sqlite3.connect = original
+    return [s for s in statements if s.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE"))]
+
+
+def scanned_tables(db_path, statements):
+    """Tables that are fully scanned by any of the given statements (also used by test_db_query_plans)."""
+    scans = set()
+    with sqlite3.connect(db_path) as conn:
+        for sql in statements:
+            for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+                detail = row[-1]
+                if detail.startswith("SCAN ") and "CONSTANT ROW" not in detail:
+                    scans.add(detail.split()[1])
+    return scans
+
+
+def build_cases(tokens, usernames):
+    """(name, callable(db, rnd), indexed?) – indexed Methoden dürfen nicht scannen."""
+    valid_until = (datetime.date.today() + datetime.timedelta(days=30)).isoformat()
+    return [
+        ("get_user_by_token", lambda db, rnd: db.get_user_by_token(rnd.choice(tokens)), True),
+        ("get_active_subscriptions", lambda db, rnd: db.get_active_subscriptions(rnd.choice(usernames)), True),
+        ("get_valid_keys", lambda db, rnd: db.get_valid_keys(owner=rnd.choice(usernames)), True),
+        ("store_key", lambda db, rnd: db.store_key(os.urandom(16).hex(), valid_until, rnd.choice(usernames), "Basis"), True),
+        ("list_users", lambda db, rnd: db.list_users(token_filter=rnd.choice(tokens)[:8]), False),
+        ("add_payment", lambda db, rnd: db.add_payment(rnd.choice(usernames), 10.0, "eur", "paid"), True),
+    ]
+
+
+def ops_per_second(db, fn, ops, threads, seed):
+    per_thread = max(1, ops // threads)
+
+    def worker(i):
+        rnd = random.Random(seed + i)
+        for _ in range(per_thread):
+            fn(db, rnd)
+
+    start = time.perf_counter()
+    if threads == 1:
+        worker(0)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DBHelper Micro-Benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--ops", type=int, default=2000, help="Operationen pro Methode und Messung")
+    parser.add_argument("--scan-ops", type=int, default=20, help="Operationen für Methoden, die scannen dürfen")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--max-slowdown", type=float, default=5.0,
+                        help="erlaubter Faktor ops/s kleinste / größte Tabelle für indizierte Methoden")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="JSON-Ergebnisdatei")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="db_bench_")
+    results, failures = {}, []
+    for size in sorted(args.sizes):
+        db_path = os.path.join(tmp_dir, f"bench_{size}.db")
+        seeded = seed_database(db_path, users=size, keys=size, payments=size, seed=args.seed)
+        db = DBHelper(db_path)
+        usernames = [f"user{i:08d}" for i in random.Random(args.seed).sample(range(size), min(size, 10_000))]
+        rnd = random.Random(args.seed)
+        for name, fn, indexed in build_cases(seeded["tokens"], usernames):
+            scans = scanned_tables(db_path, capture_statements(lambda: fn(db, rnd)))
+            ops = args.ops if indexed else args.scan_ops
+            single = ops_per_second(db, fn, ops, 1, args.seed)
+            multi = ops_per_second(db, fn, ops, args.threads, args.seed)
+            results.setdefault(name, {})[size] = {
+                "ops_per_sec_1t": round(single, 1),
+                f"ops_per_sec_{args.threads}t": round(multi, 1),
+                "scans": sorted(scans),
+            }
+            print(f"{name:<26} {size:>10} rows  {single:>10.0f} ops/s (1t)  "
+                  f"{multi:>10.0f} ops/s ({args.threads}t)  {'SCAN ' + ','.join(sorted(scans)) if scans else 'index'}")
+            if indexed and scans:
+                failures.append(f"{name}: scannt {', '.join(sorted(scans))} bei {size} Zeilen")
+        os.remove(db_path)
+
+    smallest, largest = min(args.sizes), max(args.sizes)
+    if smallest != largest:
+        for name, fn, indexed in build_cases([""], [""]):
+            if not indexed:
+                continue
+            slowdown = results[name][smallest]["ops_per_sec_1t"] / max(results[name][largest]["ops_per_sec_1t"], 1e-9)
+            if slowdown > args.max_slowdown:
+                failures.append(f"{name}: {slowdown:.1f}x langsamer bei {largest} als bei {smallest} Zeilen")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"threads": args.threads, "results": results, "failures": failures}, f, indent=2)
+    for failure in failures:
+        print("FEHLER:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# bench_ecm_emm.py
+#
+# Durchsatz der ECM/EMM-Erzeugung in Nachrichten pro Sekunde.
+#
+#   python benchmarks/bench_ecm_emm.py --subscribers 200000
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ecm_emm
+
+
+def rate(fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return count / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ECM/EMM Nachrichten pro Sekunde")
+    parser.add_argument("--subscribers", type=int, default=100_000)
+    parser.add_argument("--ecms", type=int, default=100_000)
+    parser.add_argument("--paket", default="Premium", choices=sorted(ecm_emm.PACKAGE_IDS))
+    args = parser.parse_args()
+
+    expiry = int(time.time()) + 30 * 86400
+    subscribers = [(address, expiry) for address in range(1, args.subscribers + 1)]
+    even, odd = os.urandom(16), os.urandom(16)
+
+    def single_emms():
+        for address, exp in subscribers:
+            ecm_emm.build_emm(address, args.paket, exp)
+
+    def ecms():
+        for period in range(args.ecms):
+            ecm_emm.build_ecm(args.paket, period, even, odd)
+
+    results = {
+        "EMM Batch (build_emms)": rate(lambda: ecm_emm.build_emms(subscribers, args.paket), args.subscribers),
+        "EMM einzeln (build_emm)": rate(single_emms, args.subscribers),
+        "ECM (build_ecm)": rate(ecms, args.ecms),
+    }
+    for name, (per_sec, elapsed) in results.items():
+        print(f"{name:<26} {per_sec:12,.0f} Nachrichten/s  ({elapsed:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
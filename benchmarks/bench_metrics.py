@@ -0,0 +1,47 @@
+# bench_metrics.py
+#
+# Misst den Overhead eines einzelnen Samples (Ziel: < 1 µs).
+#
+#   python benchmarks/bench_metrics.py -n 1000000
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import metrics
+
+
+def per_sample(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    empty_start = time.perf_counter()
+    for _ in range(rounds):
+        pass
+    loop = time.perf_counter() - empty_start
+    return (empty_start - start - loop) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead pro Metrik-Sample")
+    parser.add_argument("-n", "--rounds", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    registry = metrics.Registry()
+    hist = registry.histogram("bench_seconds", "Bench", ("endpoint",))
+    counter = registry.counter("bench_total", "Bench", ("endpoint",))
+    labels = ("authenticate",)
+
+    results = {
+        "Histogram.observe": per_sample(lambda: hist.observe(0.003, labels), args.rounds),
+        "Counter.inc": per_sample(lambda: counter.inc(labels), args.rounds),
+    }
+    for name, seconds in results.items():
+        flag = "OK" if seconds < 1e-6 else "ZU LANGSAM"
+        print(f"{name:<20} {seconds * 1e9:8.1f} ns/Sample  {flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# bench_templates.py
+#
+# Vergleicht die Renderzeit pro Seite: früher render_template_string mit dem
+# kompletten Inline-Template (Parse + Compile bei jedem Request), jetzt
+# render_template aus dem gecachten Loader plus Fragment-Cache.
+#
+#   python benchmarks/bench_templates.py --users 500 --watermarks 50 --keys 20 -n 200
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
+
+
+def read_template(name):
+    with open(os.path.join(TEMPLATE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def legacy_admin_template():
+    """Rebuilds the former monolithic TEMPLATE string of admin_dashboard.py."""
+    source = read_template('admin_dashboard.html')
+    source = source.replace('    {{ watermark_table }}\n', read_template('admin_watermarks.html'))
+    source = source.replace('    {{ ecm_emm_table }}\n', read_template('admin_ecm_emm.html'))
+    return source
+
+
+def seed(db, users, watermarks, keys):
+    for i in range(users):
+        db.add_user(f"user{i}", "", f"HWID-{i:06d}", "Basis", f"token{i:06d}", f"user{i}@example.com")
+    for i in range(watermarks):
+        db.add_watermark(f"Logo {i}", f"static/watermarks/logo{i}.png", "bottom-right", i % 2 == 0)
+    for i in range(keys):
+        db.store_key(os.urandom(16).hex(), None, f"user{i}", "Basis")
+
+
+def timed(label, fn, rounds):
+    fn()  # Warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    per_page = (time.perf_counter() - start) / rounds
+    print(f"{label:<40} {per_page * 1000:8.3f} ms/Seite")
+    return per_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renderzeit Admin-Dashboard / Self-Service")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--watermarks", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=20)
+    parser.add_argument("-n", "--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    config.DB_PATH = os.path.join(tmp_dir, "bench.db")
+
+    from flask import render_template, render_template_string
+    import admin_dashboard
+    import self_service
+
+    seed(admin_dashboard.db, args.users, args.watermarks, args.keys)
+    legacy_source = legacy_admin_template()
+    self_service_source = read_template('self_service.html')
+
+    def admin_context():
+        users = admin_dashboard.db.list_users()[:admin_dashboard.PER_PAGE]
+        return dict(
+            users=users, paket_filter=None, hwid_filter="", token_filter="",
+            page=1, total_pages=max(1, args.users // admin_dashboard.PER_PAGE),
+            next_rotation="-", last_backup=None
+        )
+
+    def admin_before():
+        render_template_string(
+            legacy_source,
+            watermarks=admin_dashboard.db.get_watermarks(),
+            ecm_emm_records=admin_dashboard.db.get_recent_keys(limit=20),
+            **admin_context()
+        )
+
+    def admin_after():
+        versions = admin_dashboard.db.get_data_versions()
+        watermark_table = admin_dashboard.fragments.get(
+            "watermarks", versions.get("watermarks"),
+            lambda: render_template("admin_watermarks.html", watermarks=admin_dashboard.db.get_watermarks())
+        )
+        ecm_emm_table = admin_dashboard.fragments.get(
+            "ecm_emm", versions.get("keys"),
+            lambda: render_template("admin_ecm_emm.html", ecm_emm_records=admin_dashboard.db.get_recent_keys(limit=20))
+        )
+        render_template(
+            "admin_dashboard.html",
+            watermark_table=watermark_table, ecm_emm_table=ecm_emm_table,
+            **admin_context()
+        )
+
+    user = {'username': 'user1', 'hwid': 'HWID-000001', 'paket': 'Basis', 'token': 'token000001', 'email': ''}
+    subscription = {'id': 1, 'username': 'user1', 'paket': 'Basis', 'start_date': '2025-01-01', 'end_date': '2025-02-01', 'active': 1}
+
+    def portal_before():
+        render_template_string(self_service_source, user=user, subscription=subscription, prices=config.PRICES, error=None)
+
+    def portal_after():
+        render_template(self_service.SELF_SERVICE_TEMPLATE, user=user, subscription=subscription, prices=config.PRICES, error=None)
+
+    with admin_dashboard.app.test_request_context("/admin"):
+        before = timed("admin: render_template_string", admin_before, args.rounds)
+        after = timed("admin: Loader + Fragment-Cache", admin_after, args.rounds)
+        print(f"{'admin: Speedup':<40} {before / after:8.1f}x")
+    with self_service.app.test_request_context("/selfservice"):
+        before = timed("selfservice: render_template_string", portal_before, args.rounds)
+        after = timed("selfservice: Loader", portal_after, args.rounds)
+        print(f"{'selfservice: Speedup':<40} {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
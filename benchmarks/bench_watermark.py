@@ -0,0 +1,74 @@
+# bench_watermark.py
+#
+# Frames pro Sekunde beim Einblenden eines Watermarks (nur CPU). Verglichen
+# wird watermark_renderer (vorberechnetes Overlay, Ganzzahl-Blending auf dem
+# Logo-Ausschnitt) mit dem naiven Weg: Logo pro Frame skalieren und mit
+# Float-Alpha über den ganzen Frame mischen.
+#
+#   python benchmarks/bench_watermark.py --resolution 1920x1080 --frames 500
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from watermark_renderer import WatermarkRenderer
+
+
+def naive_composite(frame, logo_path, scale):
+    height, width = frame.shape[:2]
+    logo = Image.open(logo_path).convert('RGBA')
+    logo_w = round(width * scale)
+    logo = logo.resize((logo_w, round(logo.height * logo_w / logo.width)), Image.LANCZOS)
+    layer = Image.new('RGBA', (width, height))
+    layer.paste(logo, (width - logo.width, height - logo.height))
+    pixels = np.asarray(layer, dtype=np.float32) / 255.0
+    alpha = pixels[:, :, 3:]
+    return (frame * (1.0 - alpha) + pixels[:, :, :3] * 255.0 * alpha).astype(np.uint8)
+
+
+def fps(fn, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watermark-Compositing in Frames pro Sekunde")
+    parser.add_argument("--resolution", default="1920x1080")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--naive-frames", type=int, default=30)
+    parser.add_argument("--scale", type=float, default=0.12)
+    args = parser.parse_args()
+    width, height = map(int, args.resolution.lower().split("x"))
+
+    rng = np.random.default_rng(1)
+    frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        logo_path = os.path.join(tmp_dir, "logo.png")
+        Image.fromarray(rng.integers(0, 256, (200, 400, 4), dtype=np.uint8), 'RGBA').save(logo_path)
+
+        renderer = WatermarkRenderer(scale=args.scale)
+        start = time.perf_counter()
+        renderer.precompute([(1, "logo", logo_path, "bottom-right", 1)], [(width, height)])
+        print(f"Overlay vorberechnet: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+        cached = fps(lambda f: renderer.composite(f, logo_path, "bottom-right"),
+                     [frames[i % len(frames)] for i in range(args.frames)])
+        naive = fps(lambda f: naive_composite(f, logo_path, args.scale),
+                    [frames[i % len(frames)] for i in range(args.naive_frames)])
+
+    print(f"{width}x{height}, Logo {args.scale:.0%} der Breite")
+    print(f"watermark_renderer: {cached:10,.0f} fps")
+    print(f"naiv (pro Frame):   {naive:10,.1f} fps")
+    print(f"Faktor:             {cached / naive:10,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# bench_webhook_queue.py
+#
+# Webhook-Eingang unter Last: ein lokaler Fake-Stripe-Generator erzeugt
+# signierte checkout.session.completed-Events (mit Wiederholungen wie bei
+# Provider-Retries). Gemessen werden die Quittierungszeit (Signaturprüfung +
+# Einreihen) und der Durchsatz des Worker-Pools; am Ende wird geprüft, dass
+# jedes Event genau einmal gebucht wurde.
+#
+#   python benchmarks/bench_webhook_queue.py --events 5000 --duplicates 0.2 --workers 4
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_helper import DBHelper
+from payment_providers.stripe_adapter import StripeAdapter
+from webhook_queue import WebhookQueue
+
+
+class FakeStripe:
+    """Generates Stripe-style webhook payloads with valid Stripe-Signature headers."""
+
+    def __init__(self, secret, users, seed=1):
+        self.secret = secret.encode()
+        self.users = users
+        self.rng = random.Random(seed)
+
+    def checkout_completed(self, i):
+        paket = self.rng.choice(('Basis', 'Basis+', 'Premium'))
+        zyklus = self.rng.choice(('1m', '6m', '12m'))
+        event = {
+            'id': f"evt_bench_{i}",
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'id': f"cs_bench_{i}",
+                'object': 'checkout.session',
+                'amount_total': config.PRICES[paket][zyklus] * 100,
+                'currency': 'eur',
+                'metadata': {'username': self.rng.choice(self.users), 'paket': paket, 'zyklus': zyklus},
+            }},
+        }
+        return json.dumps(event).encode()
+
+    def sign(self, payload):
+        timestamp = int(time.time())
+        signature = hmac.new(self.secret, f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+        return f"t={timestamp},v1={signature}"
+
+    def deliveries(self, count, duplicates):
+        """Payloads in delivery order, a share of them delivered twice (provider retries)."""
+        payloads = [self.checkout_completed(i) for i in range(count)]
+        retries = self.rng.sample(payloads, int(count * duplicates))
+        deliveries = payloads + retries
+        self.rng.shuffle(deliveries)
+        return deliveries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durchsatz der Webhook-Queue")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Anteil doppelt zugestellter Events")
+    parser.add_argument("--workers", type=int, default=config.WEBHOOK_WORKERS)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = DBHelper(os.path.join(tmp_dir, 'bench.db'))
+        users = [f"user{i}" for i in range(args.users)]
+        db.add_users_batch([(u, "", f"HWID-{i}", "Basis", f"token{i}", "") for i, u in enumerate(users)])
+
+        adapter = StripeAdapter(db)
+        queue = WebhookQueue(db, adapter.process_event, workers=args.workers)
+        fake = FakeStripe(config.STRIPE_WEBHOOK_SECRET, users)
+        deliveries = fake.deliveries(args.events, args.duplicates)
+
+        ack_times, start = [], time.perf_counter()
+        for payload in deliveries:
+            t0 = time.perf_counter()
+            event = adapter.verify_webhook(payload, fake.sign(payload))
+            queue.enqueue(event['id'], "stripe", event['type'], event)
+            ack_times.append(time.perf_counter() - t0)
+        ingest = time.perf_counter() - start
+
+        start = time.perf_counter()
+        queue.start()
+        while set(db.get_webhook_queue_stats()) - {'done', 'failed'}:
+            time.sleep(0.05)
+        processing = time.perf_counter() - start
+        queue.stop()
+
+        stats = db.get_webhook_queue_stats()
+        booked = sum(len(db.get_payments_by_user(u)) for u in users)
+        ack_times.sort()
+        print(f"Zustellungen: {len(deliveries)} ({args.events} Events, {len(deliveries) - args.events} Duplikate)")
+        print(f"Quittierung:  {len(deliveries) / ingest:,.0f}/s, p50 {statistics.median(ack_times) * 1e3:.2f} ms, "
+              f"p99 {ack_times[int(len(ack_times) * 0.99) - 1] * 1e3:.2f} ms")
+        print(f"Verarbeitung: {args.events / processing:,.0f} Events/s mit {args.workers} Workern")
+        print(f"Status: {stats}, gebuchte Zahlungen: {booked}")
+        if booked != args.events:
+            print("FEHLER: Events nicht genau einmal gebucht")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
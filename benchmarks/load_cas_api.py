@@ -0,0 +1,268 @@
+# load_cas_api.py
+#
+# Reproduzierbarer Lasttest für die CAS-API (cas_api.app).
+# Seedet eine synthetische Datenbank, treibt /api/authenticate, /api/stream_info
+# und Token create/revoke in-process (Flask test client) oder über HTTP
+# (lokaler Werkzeug-Server) mit fester Parallelität und schreibt Durchsatz,
+# Latenz-Perzentile und Wartezeiten auf DBHelper.lock als JSON. Gemessen wird
+# nur der Python-Lock im Prozess, nicht sqlite-connect/execute oder SQLite-Sperren.
+#
+#   python benchmarks/load_cas_api.py --users 10000 --requests 2000 --concurrency 8 --mode both -o result.json
+#   python benchmarks/load_cas_api.py ... --compare alt.json
+
+import argparse
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from seed_db import seed_database
+
+SCENARIOS = ("authenticate", "stream_info", "token_cycle")
+
+
+class TimedLock:
+    """Drop-in replacement for DBHelper.lock (threading.Lock) that records acquisition wait times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits_lock = threading.Lock()
+        self.waits = []
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        wait = time.perf_counter() - start
+        with self._waits_lock:
+            self.waits.append(wait)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        return False
+
+    def reset(self):
+        with self._waits_lock:
+            self.waits = []
+
+
+def sign(data):
+    return hmac.new(config.API_SECRET_KEY.encode(), data.encode(), hashlib.sha256).hexdigest()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, wall, statuses, lock_waits):
+    latencies = sorted(latencies)
+    lock_waits = sorted(lock_waits)
+    ok = sum(count for status, count in statuses.items() if 200 <= int(status) < 300)
+    return {
+        "requests": len(latencies),
+        "ok": ok,
+        "status_counts": statuses,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p90": round(percentile(latencies, 90) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "helper_lock_wait_ms": {
+            "acquisitions": len(lock_waits),
+            "total": round(sum(lock_waits) * 1000, 3),
+            "p99": round(percentile(lock_waits, 99) * 1000, 4),
+            "max": round(lock_waits[-1] * 1000, 4) if lock_waits else 0.0,
+        },
+    }
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self._local = threading.local()
+        self._app = app
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        resp = client.open(path, method=method, json=body, headers=headers or {})
+        return resp.status_code, resp.get_json(silent=True)
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=dict(headers or {}))
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                return resp.status, json.loads(resp.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def start_http_server(app):
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def make_operation(name, client, tokens, hwids, rnd_seed):
+    rnd = random.Random(rnd_seed)
+    counter = iter(range(10 ** 9))
+    master = {"Authorization": f"Bearer {config.MASTER_KEY}"}
+
+    def authenticate():
+        i = rnd.randrange(len(tokens))
+        token, hwid = tokens[i], hwids[i]
+        body = {"hwid": hwid, "token": token}
+        return client.request("POST", "/api/authenticate", body, {"X-Signature": sign(f"{hwid}{token}")})[0]
+
+    def stream_info():
+        token = tokens[rnd.randrange(len(tokens))]
+        return client.request("GET", f"/api/stream_info?token={token}", None, {"X-Signature": sign(token)})[0]
+
+    def token_cycle():
+        n = next(counter)
+        username = f"load-{rnd_seed}-{n}"
+        status, data = client.request("POST", "/api/token/create", {"username": username, "hwid": f"HW-{username}"}, master)
+        if status != 200:
+            return status
+        return client.request("POST", "/api/token/revoke", {"token": data["token"]}, master)[0]
+
+    return {"authenticate": authenticate, "stream_info": stream_info, "token_cycle": token_cycle}[name]
+
+
+def run_scenario(name, client, lock, tokens, hwids, total, concurrency):
+    # Rest gleichmäßig verteilen, damit genau `total` Requests laufen
+    per_worker, extra = divmod(total, concurrency)
+    lock.reset()
+
+    def worker(worker_id):
+        op = make_operation(name, client, tokens, hwids, worker_id)
+        latencies, statuses = [], {}
+        for _ in range(per_worker + (1 if worker_id < extra else 0)):
+            start = time.perf_counter()
+            status = op()
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return latencies, statuses
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    latencies, statuses = [], {}
+    for lat, st in results:
+        latencies.extend(lat)
+        for status, count in st.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return summarize(latencies, wall, statuses, list(lock.waits))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    print(f"{'Szenario':<32} {'rps alt':>10} {'rps neu':>10} {'p99 alt':>10} {'p99 neu':>10}")
+    for key, result in new["results"].items():
+        before = old.get("results", {}).get(key)
+        if not before:
+            continue
+        print(f"{key:<32} {before['throughput_rps']:>10} {result['throughput_rps']:>10} "
+              f"{before['latency_ms']['p99']:>10} {result['latency_ms']['p99']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest CAS-API")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--subscriptions", type=int)
+    parser.add_argument("--keys", type=int)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests pro Szenario")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--mode", choices=("inprocess", "http", "both"), default="inprocess")
+    parser.add_argument("--scenario", choices=SCENARIOS, nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="JSON-Ergebnisdatei")
+    parser.add_argument("--compare", help="Älteres JSON-Ergebnis zum Vergleich")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="cas_load_")
+    config.DB_PATH = os.path.join(tmp_dir, "iptv_users.db")
+    config.LOG_FILE = os.path.join(tmp_dir, "admin_events.log")
+    seeded = seed_database(config.DB_PATH, args.users, args.subscriptions, args.keys, seed=args.seed)
+
+    import cas_api
+    cas_api.limiter.enabled = False  # Lasttest misst die API, nicht das Rate Limit
+    lock = TimedLock()
+    cas_api.db.lock = lock
+
+    modes = ("inprocess", "http") if args.mode == "both" else (args.mode,)
+    results = {}
+    for mode in modes:
+        server = None
+        if mode == "http":
+            server, base_url = start_http_server(cas_api.app)
+            client = HTTPClient(base_url)
+        else:
+            client = InProcessClient(cas_api.app)
+        for concurrency in args.concurrency:
+            for name in args.scenario:
+                key = f"{mode}/{name}/c{concurrency}"
+                results[key] = run_scenario(name, client, lock, seeded["tokens"], seeded["hwids"],
+                                            args.requests, concurrency)
+                r = results[key]
+                print(f"{key:<32} {r['throughput_rps']:>9} rps  p50 {r['latency_ms']['p50']:>8} ms  "
+                      f"p99 {r['latency_ms']['p99']:>8} ms  helper-lock {r['helper_lock_wait_ms']['total']:>9} ms  "
+                      f"ok {r['ok']}/{r['requests']}")
+        if server is not None:
+            server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "dataset": {k: seeded[k] for k in ("users", "subscriptions", "keys", "seed")},
+        "requests_per_scenario": args.requests,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
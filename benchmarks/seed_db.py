@@ -0,0 +1,118 @@
+# seed_db.py
+#
+# Erzeugt eine synthetische iptv_users.db mit reproduzierbaren Daten.
+#
+#   python benchmarks/seed_db.py bench.db --users 100000 --subscriptions 120000 --keys 200000
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_helper import DBHelper
+
+PAKETE = ('Basis', 'Basis+', 'Premium')
+BATCH = 10_000
+
+
+def user_row(i, rnd):
+    return (
+        f"user{i:08d}", "", f"HWID-{i:08d}", rnd.choice(PAKETE),
+        f"{rnd.getrandbits(128):032x}", f"user{i}@example.com"
+    )
+
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed_database(db_path, users=1000, subscriptions=None, keys=None, payments=0, seed=42):
+    """Fills `db_path` with synthetic users, subscriptions, keys and payments.
+
+    Returns a dict with the generated counts and a sample of tokens/hwids for
+    driving requests. About 90% of the subscriptions are active today.
+    """
+    subscriptions = users if subscriptions is None else subscriptions
+    keys = users if keys is None else keys
+    rnd = random.Random(seed)
+    DBHelper(db_path)  # Schema anlegen
+    today = datetime.date.today()
+    tokens, hwids = [], []
+
+    def users_gen():
+        for i in range(users):
+            row = user_row(i, rnd)
+            if len(tokens) < 10_000:
+                tokens.append(row[4])
+                hwids.append(row[2])
+            yield row
+
+    def subs_gen():
+        for i in range(subscriptions):
+            uid = i % users
+            start = today - datetime.timedelta(days=rnd.randint(0, 365))
+            days = rnd.choice((30, 183, 365))
+            if rnd.random() < 0.1:
+                start = today - datetime.timedelta(days=days + rnd.randint(1, 100))
+            yield (f"user{uid:08d}", rnd.choice(PAKETE), start.isoformat(),
+                   (start + datetime.timedelta(days=days)).isoformat(), 1)
+
+    def keys_gen():
+        now = datetime.datetime.utcnow()
+        for i in range(keys):
+            uid = i % users
+            valid_until = now + datetime.timedelta(seconds=rnd.randint(-86400, 86400))
+            yield (os.urandom(16).hex(), valid_until.isoformat(), f"user{uid:08d}", rnd.choice(PAKETE))
+
+    def payments_gen():
+        for i in range(payments):
+            yield (f"user{i % users:08d}", rnd.choice((10.0, 15.0, 20.0, 55.0)), "eur", "paid")
+
+    start = time.perf_counter()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        for batch in _batched(users_gen()):
+            conn.executemany('INSERT OR REPLACE INTO users(username, password, hwid, paket, token, email) VALUES (?, ?, ?, ?, ?, ?)', batch)
+        for batch in _batched(subs_gen()):
+            conn.executemany('INSERT INTO subscriptions(username, paket, start_date, end_date, active) VALUES (?, ?, ?, ?, ?)', batch)
+        for batch in _batched(keys_gen()):
+            conn.executemany('INSERT INTO keys(key_value, valid_until, owner, paket) VALUES (?, ?, ?, ?)', batch)
+        for batch in _batched(payments_gen()):
+            conn.executemany('INSERT INTO payments(username, amount, currency, status) VALUES (?, ?, ?, ?)', batch)
+        conn.commit()
+        conn.execute("PRAGMA journal_mode=DELETE")
+    return {
+        "users": users, "subscriptions": subscriptions, "keys": keys, "payments": payments,
+        "seed": seed, "seconds": round(time.perf_counter() - start, 3),
+        "tokens": tokens, "hwids": hwids,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetische IPTV-Datenbank erzeugen")
+    parser.add_argument("db_path")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--subscriptions", type=int)
+    parser.add_argument("--keys", type=int)
+    parser.add_argument("--payments", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    info = seed_database(args.db_path, args.users, args.subscriptions, args.keys, args.payments, args.seed)
+    print(f"{info['users']} Users, {info['subscriptions']} Abos, {info['keys']} Keys, "
+          f"{info['payments']} Zahlungen in {info['seconds']} s -> {args.db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# bulk_users.py
+#
+# Streaming-Import/-Export von Benutzern (CSV oder JSONL) für Migrationen.
+# Zeilen werden chunkweise per executemany in je einer Transaktion geschrieben,
+# der Fortschritt wird mit jedem Chunk committet; ein erneuter Aufruf nach
+# einem Abbruch setzt hinter dem letzten committeten Chunk fort.
+#
+# Bestehende Benutzer werden aktualisiert. Fehlen Passwort, Email oder Token
+# in der Datei (der Export enthält kein Passwort), bleiben die gespeicherten
+# Werte erhalten. Tokens, die in der Datei oder in der Datenbank schon einem
+# anderen Benutzer gehören, werden abgelehnt.
+#
+#   python bulk_users.py import subscribers.csv --chunk-size 5000
+#   python bulk_users.py export users.jsonl
+
+import argparse
+import csv
+import json
+import os
+import time
+
+import config
+from db_helper import DBHelper
+
+FIELDS = ('username', 'hwid', 'paket', 'token', 'email')
+PAKETE = ('Basis', 'Basis+', 'Premium')
+MAX_ERROR_SAMPLES = 20
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if ext == '.csv':
+        return 'csv'
+    raise ValueError(f"Unbekanntes Format für {path} (csv oder jsonl angeben)")
+
+
+def read_records(path, fmt):
+    """Yields one record per input line, without loading the file into memory.
+
+    JSONL lines that are not valid JSON are yielded as the ValueError, so
+    validate() can reject them with their line number.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                try:
+                    yield json.loads(line) if line else {}
+                except ValueError as e:
+                    yield e
+
+
+def _field(record, key):
+    value = record.get(key)
+    return None if value is None else str(value).strip()
+
+
+def validate(record):
+    """Returns (row, None) for a valid record or (None, error message).
+
+    password, email and token are None when the record does not contain them.
+    """
+    if isinstance(record, ValueError):
+        return None, f"kein gültiges JSON ({record})"
+    if not isinstance(record, dict):
+        return None, f"kein JSON-Objekt ({type(record).__name__})"
+    username = _field(record, 'username')
+    hwid = _field(record, 'hwid')
+    paket = _field(record, 'paket') or 'Basis'
+    email = _field(record, 'email')
+    if not username:
+        return None, "username fehlt"
+    if not hwid:
+        return None, f"{username}: hwid fehlt"
+    if paket not in PAKETE:
+        return None, f"{username}: unbekanntes Paket {paket!r}"
+    if email and '@' not in email:
+        return None, f"{username}: ungültige Email {email!r}"
+    return [username, record.get('password'), hwid, paket, _field(record, 'token') or None, email], None
+
+
+def generate_tokens(count):
+    """Generates `count` 32-char hex tokens from a single urandom call."""
+    raw = os.urandom(16 * count).hex()
+    return [raw[i:i + 32] for i in range(0, len(raw), 32)]
+
+
+def _reject(stats, line_no, error):
+    stats['rejected'] += 1
+    if len(stats['errors']) < MAX_ERROR_SAMPLES:
+        stats['errors'].append(f"Zeile {line_no}: {error}")
+
+
+def _check_tokens(db, chunk, stats):
+    """Drops rows whose token belongs to another user (earlier in the file or in the database)."""
+    owners = {token: row[0] for token, row in db.get_users_by_tokens(
+        row[4] for _, row in chunk if row[4]).items()}
+    accepted = []
+    for line_no, row in chunk:
+        username, token = row[0], row[4]
+        if token:
+            owner = owners.setdefault(token, username)
+            if owner != username:
+                _reject(stats, line_no, f"{username}: Token gehört bereits {owner}")
+                continue
+        accepted.append(row)
+    return accepted
+
+
+def _fill_tokens(db, rows):
+    """Rows without token keep the stored token of an existing user, new users get a generated one."""
+    missing = [row for row in rows if row[4] is None]
+    existing = db.get_users_by_usernames(row[0] for row in missing)
+    new = []
+    for row in missing:
+        if row[0] in existing:
+            row[4] = existing[row[0]][3]
+        else:
+            new.append(row)
+    for row, token in zip(new, generate_tokens(len(new))):
+        row[4] = token
+
+
+def import_users(db, path, fmt=None, chunk_size=5000, resume=True, progress=None):
+    """Imports users from a CSV/JSONL file in chunks of `chunk_size` rows.
+
+    Returns a dict with imported/rejected counts and rows per second. Memory
+    use is bounded by the chunk size; only the first few errors are kept.
+    """
+    fmt = detect_format(path, fmt)
+    source = os.path.abspath(path)
+    skip = db.get_import_progress(source) if resume else 0
+    stats = {'source': source, 'resumed_at': skip, 'imported': 0, 'rejected': 0, 'errors': []}
+    start = time.perf_counter()
+
+    chunk, line_no = [], 0
+    for line_no, record in enumerate(read_records(path, fmt), start=1):
+        if line_no <= skip:
+            continue
+        row, error = validate(record)
+        if error:
+            _reject(stats, line_no, error)
+        else:
+            chunk.append((line_no, row))
+        if len(chunk) >= chunk_size:
+            _commit_chunk(db, chunk, source, line_no, stats, start, progress)
+            chunk = []
+    if line_no > skip:
+        _commit_chunk(db, chunk, source, line_no, stats, start, progress)
+
+    db.clear_import_progress(source)
+    elapsed = time.perf_counter() - start
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_sec'] = round(stats['imported'] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def _commit_chunk(db, chunk, source, rows_done, stats, start, progress):
+    rows = _check_tokens(db, chunk, stats)
+    _fill_tokens(db, rows)
+    db.add_users_batch([tuple(row) for row in rows], source=source, rows_done=rows_done)
+    stats['imported'] += len(rows)
+    if progress:
+        elapsed = time.perf_counter() - start
+        progress(rows_done, stats['imported'], stats['imported'] / elapsed if elapsed else 0.0)
+
+
+def export_users(db, path, fmt=None, batch_size=5000):
+    """Streams all users to a CSV/JSONL file. Returns the number of rows written."""
+    fmt = detect_format(path, fmt)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for row in db.iter_users(batch_size):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in db.iter_users(batch_size):
+                f.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n')
+                count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-Import/-Export von Benutzern")
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import')
+    imp.add_argument('path')
+    imp.add_argument('--format', choices=('csv', 'jsonl'))
+    imp.add_argument('--chunk-size', type=int, default=5000)
+    imp.add_argument('--restart', action='store_true', help="Fortschritt ignorieren und von vorn beginnen")
+    exp = sub.add_parser('export')
+    exp.add_argument('path')
+    exp.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--db', default=config.DB_PATH)
+    args = parser.parse_args()
+
+    db = DBHelper(args.db)
+    if args.command == 'import':
+        def report(line_no, imported, rate):
+            print(f"\r{line_no} Zeilen gelesen, {imported} importiert ({rate:.0f} Zeilen/s)", end='', flush=True)
+        stats = import_users(db, args.path, args.format, args.chunk_size, resume=not args.restart, progress=report)
+        print()
+        if stats['resumed_at']:
+            print(f"Fortgesetzt ab Zeile {stats['resumed_at']}")
+        print(f"{stats['imported']} importiert, {stats['rejected']} abgelehnt in {stats['seconds']} s "
+              f"({stats['rows_per_sec']} Zeilen/s)")
+        for error in stats['errors']:
+            print("  ", error)
+    else:
+        start = time.perf_counter()
+        count = export_users(db, args.path, args.format)
+        elapsed = time.perf_counter() - start
+        print(f"{count} Benutzer exportiert in {elapsed:.2f} s ({count / elapsed if elapsed else 0:.0f} Zeilen/s)")
+
+
+if __name__ == '__main__':
+    main()
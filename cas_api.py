@@ -11,10 +11,22 @@ from flask import Flask, request, jsonify, abort, send_file
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import config
+import metrics
+import profiling
 from db_helper import DBHelper
+from entitlement_index import EntitlementIndex
+from expiry_sweeper import ExpirySweeper
+from key_retention import KeyRetention
+from rotation_scheduler import RotationScheduler
 
 app = Flask(__name__)
-db = DBHelper(config.DB_PATH)
+db = metrics.instrument_db(DBHelper(config.DB_PATH))
+entitlements = EntitlementIndex(db)
+db.add_subscription_listener(entitlements.on_subscription_change)
+expiry_sweeper = ExpirySweeper(db)
+db.add_subscription_listener(expiry_sweeper.on_subscription_change)
+metrics.instrument_app(app, "cas_api")
+profiling.init_app(app, "cas_api")
 
 # Logger setup
 logging.basicConfig(
@@ -30,6 +42,7 @@ limiter = Limiter(
     default_limits=["200 per day", "50 per hour"]
 )
 limiter.init_app(app)
+limiter.exempt(app.view_functions["metrics"])
 
 def verify_signature(data: str, signature: str) -> bool:
     """HMAC-SHA256 signature verification."""
@@ -50,24 +63,77 @@ def generate_control_word() -> str:
     """Generate a new 16-byte hex control word."""
     return os.urandom(16).hex()
 
+def key_period(ts=None):
+    """Rotation period containing `ts`: (index, start, next key switch) as Unix timestamps."""
+    interval = config.ROTATION_INTERVAL
+    ts = time.time() if ts is None else ts
+    index = int(ts // interval)
+    return index, index * interval, (index + 1) * interval
+
+def utc_iso(ts):
+    return datetime.datetime.utcfromtimestamp(ts).isoformat()
+
+def resolve_control_words(users, ts=None):
+    """Current and next control word (odd/even pair) for each user row.
+
+    Missing words are generated and stored in one batch: the current one valid
+    until the next key switch, the next one valid from the switch for one more
+    interval. Returns ({username: (current_cw, next_cw)}, period index, switch ts).
+    """
+    ts = time.time() if ts is None else ts
+    index, start, switch = key_period(ts)
+    now, switch_iso = utc_iso(ts), utc_iso(switch)
+    usernames = [u[0] for u in users]
+    pairs = db.get_key_pairs_for_users(usernames, now, switch_iso)
+
+    new_keys = []
+    for user in users:
+        current, upcoming = pairs.get(user[0], (None, None))
+        if current is None:
+            new_keys.append((generate_control_word(), switch_iso, user[0], user[2], utc_iso(start)))
+        if upcoming is None:
+            new_keys.append((generate_control_word(), utc_iso(switch + config.ROTATION_INTERVAL),
+                             user[0], user[2], switch_iso))
+    if new_keys:
+        # Unique-Index (owner, valid_from): parallele Requests erzeugen keine zweiten Keys
+        db.store_keys_batch(new_keys)
+        pairs.update(db.get_key_pairs_for_users({k[2] for k in new_keys}, now, switch_iso))
+
+    words = {}
+    for name in usernames:
+        current, upcoming = pairs[name]
+        words[name] = (current[1], upcoming[1])
+    return words, index, switch
+
+def key_schedule_info(index, switch):
+    return {
+        "key_parity":    "even" if index % 2 == 0 else "odd",
+        "key_switch_at": utc_iso(switch) + "Z",
+    }
+
 def automatic_key_rotation():
-    """Background thread to rotate ECM keys for all active subscriptions."""
-    while True:
-        time.sleep(config.ROTATION_INTERVAL)
-        users = db.get_all_users()
-        now = datetime.datetime.utcnow().date()
-        for user in users:
-            username, hwid, paket, token, email = user
-            sub = db.get_active_subscription(username)
-            if not sub:
-                continue
-            _, _, sub_paket, start_str, end_str, active = sub
-            end_date = datetime.date.fromisoformat(end_str)
-            if end_date < now:
-                continue
-            cw = generate_control_word()
-            db.store_key(cw, end_str, username, paket)
-            log_request(username, "auto_key_rotate")
+    """Background thread: generates next control words, spread over the rotation interval.
+
+    A hashed timing wheel hands each tick 1/ROTATION_SLOTS of the users, so
+    key generation no longer happens for everyone at once.
+    """
+    scheduler = RotationScheduler(
+        db, "cas_api", config.ROTATION_INTERVAL, config.ROTATION_SLOTS,
+        list_keys=lambda: (user[0] for user in db.iter_users(5000)),
+        rotate=prefetch_next_keys,
+        jitter=config.ROTATION_JITTER
+    )
+    scheduler.run_forever()
+
+def prefetch_next_keys(usernames, batch_size=500):
+    """Makes sure every given user with an active subscription has the next key."""
+    usernames = list(usernames)
+    for i in range(0, len(usernames), batch_size):
+        subs = db.get_active_subscriptions_for_users(usernames[i:i + batch_size])
+        if subs:
+            # (username, hwid, paket) reicht für resolve_control_words
+            resolve_control_words([(name, None, sub[2]) for name, sub in subs.items()])
+            log_request("system", f"auto_key_prefetch users={len(subs)}")
 
 @app.route("/api/authenticate", methods=["POST"])
 @limiter.limit("10/minute")
@@ -91,13 +157,9 @@ def authenticate():
         log_request(user[0], "authenticate", False)
         abort(403, "Subscription expired or inactive")
 
-    # Fetch or generate ECM key for this user
-    key_record = db.get_valid_key_for_user(user[0])
-    if key_record:
-        cw = key_record[1]
-    else:
-        cw = generate_control_word()
-        db.store_key(cw, sub[4], user[0], user[2])
+    # Current and next ECM key for this user
+    words, index, switch = resolve_control_words([user])
+    cw, next_cw = words[user[0]]
 
     log_request(user[0], "authenticate")
     return jsonify({
@@ -109,13 +171,76 @@ def authenticate():
             "token":    user[3],
             "email":    user[4]
         },
-        "ecm_key": cw
+        "ecm_key": cw,
+        "next_ecm_key": next_cw,
+        **key_schedule_info(index, switch)
     })
 
+@app.route("/api/authenticate/batch", methods=["POST"])
+@limiter.limit("60/minute")
+def authenticate_batch():
+    """Authenticate up to BATCH_AUTH_MAX_DEVICES (hwid, token) pairs under one signature.
+
+    The X-Signature header covers the raw request body. All lookups are
+    resolved with set-based queries; the response holds one result per device
+    in request order.
+    """
+    body      = request.get_data(as_text=True)
+    signature = request.headers.get("X-Signature", "")
+    if not verify_signature(body, signature):
+        log_request("unknown", "authenticate_batch", False)
+        abort(403, "Invalid signature")
+
+    devices = (request.get_json(silent=True) or {}).get("devices")
+    if not isinstance(devices, list) or not devices:
+        abort(400, "Missing devices")
+    if len(devices) > config.BATCH_AUTH_MAX_DEVICES:
+        abort(413, f"At most {config.BATCH_AUTH_MAX_DEVICES} devices per batch")
+
+    # null/fehlende Felder zählen als leer, sonst würde daraus der String "None"
+    pairs = [(str(d.get("hwid") or ""), str(d.get("token") or "")) if isinstance(d, dict) else ("", "")
+             for d in devices]
+    by_token = db.get_users_by_tokens([t for _, t in pairs if t])
+    by_hwid = db.get_users_by_hwids([h for h, t in pairs if not t and h])
+    users = [by_token.get(t) if t else by_hwid.get(h) for h, t in pairs]
+    usernames = [u[0] for u in users if u]
+    subs = db.get_active_subscriptions_for_users(usernames)
+    entitled = {u[0]: u for u in users if u and u[0] in subs}
+    words, index, switch = resolve_control_words(list(entitled.values()))
+
+    results = []
+    for (hwid, token), user in zip(pairs, users):
+        if not user:
+            results.append({"hwid": hwid, "token": token, "status": "error", "code": 404, "error": "User not found"})
+            continue
+        sub = subs.get(user[0])
+        if not sub:
+            results.append({"hwid": hwid, "token": token, "status": "error", "code": 403,
+                            "error": "Subscription expired or inactive"})
+            continue
+        cw, next_cw = words[user[0]]
+        results.append({
+            "hwid": hwid, "token": token, "status": "ok",
+            "user": {
+                "username": user[0],
+                "hwid":     user[1],
+                "paket":    user[2],
+                "token":    user[3],
+                "email":    user[4]
+            },
+            "ecm_key": cw,
+            "next_ecm_key": next_cw
+        })
+
+    ok = sum(1 for r in results if r["status"] == "ok")
+    log_request("batch", f"authenticate_batch devices={len(results)} ok={ok}")
+    return jsonify({"status": "ok", "results": results, **key_schedule_info(index, switch)})
+
 @app.route("/api/stream_info", methods=["GET"])
 @limiter.limit("30/minute")
 def stream_info():
     token     = request.args.get("token", "")
+    channel   = request.args.get("channel")
     signature = request.headers.get("X-Signature", "")
     if not verify_signature(token, signature):
         log_request("unknown", "stream_info", False)
@@ -131,13 +256,16 @@ def stream_info():
         log_request(user[0], "stream_info", False)
         abort(403, "Subscription expired or inactive")
 
-    # Ensure an ECM key
-    key_record = db.get_valid_key_for_user(user[0])
-    if key_record:
-        cw = key_record[1]
-    else:
-        cw = generate_control_word()
-        db.store_key(cw, sub[4], user[0], user[2])
+    # Der Index wird im Hintergrund-Thread aufgebaut, der Request liest nur
+    if channel and not entitlements.ready.is_set():
+        abort(503, "Entitlements are still loading")
+    if channel and not entitlements.is_entitled(user[0], channel):
+        log_request(user[0], f"stream_info channel={channel}", False)
+        abort(403, "Channel not included in subscription")
+
+    # Current and next ECM key (odd/even), clients switch at key_switch_at
+    words, index, switch = resolve_control_words([user])
+    cw, next_cw = words[user[0]]
 
     log_request(user[0], "stream_info")
     return jsonify({
@@ -145,6 +273,9 @@ def stream_info():
         "stream_info": {
             "stream_url":  f"{config.BASE_STREAM_URL}{user[0]}/stream.m3u8",
             "aes_key":     cw,
+            "next_aes_key": next_cw,
+            **key_schedule_info(index, switch),
+            "channels":    entitlements.channels_for(user[0]),
             "watermark":   f"User-{user[0]}-WM",
             "logo_url":    f"{config.BASE_STREAM_URL}logos/logo.png"
         }
@@ -170,11 +301,10 @@ def create_token():
     token = os.urandom(16).hex()
     db.add_user(username, "", hwid, paket, token, email)
 
-    # Immediately generate first ECM key
+    # Immediately generate first ECM key pair
     sub = db.get_active_subscription(username)
     if sub:
-        cw = generate_control_word()
-        db.store_key(cw, sub[4], username, paket)
+        resolve_control_words([(username, hwid, paket, token, email)])
 
     log_request(username, "create_token")
     return jsonify({"status": "ok", "token": token})
@@ -201,4 +331,7 @@ def run_api_server():
 if __name__ == "__main__":
     # Start automatic rotation thread
     threading.Thread(target=automatic_key_rotation, daemon=True).start()
+    threading.Thread(target=KeyRetention(db).run_forever, daemon=True).start()
+    threading.Thread(target=expiry_sweeper.run_forever, daemon=True).start()
+    threading.Thread(target=entitlements.run_forever, daemon=True).start()
     run_api_server()
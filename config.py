@@ -31,7 +31,58 @@ BASE_STREAM_URL = "https://stream.example.com/"
 # Intervall für automatische Schlüsselrotation in Sekunden (z.B. 3600 = 1 Stunde)
 ROTATION_INTERVAL = 3600
 
-# Payment Provider (z.B. "stripe", "paypal")
+# Timing Wheel der Rotation: Anzahl Slots pro Intervall und Jitter-Anteil eines Ticks (0..1)
+ROTATION_SLOTS = 60
+ROTATION_JITTER = 0.5
+
+# Retention der keys-Tabelle (key_retention.py): abgelaufene Keys nach Grace-Zeit archivieren
+KEY_RETENTION_GRACE = 86400      # Sekunden nach valid_until
+KEY_RETENTION_BATCH = 1000       # Keys pro Transaktion
+KEY_RETENTION_PAUSE = 0.05       # Pause zwischen Batches in Sekunden
+KEY_RETENTION_INTERVAL = 600     # Abstand der Durchläufe in Sekunden
+KEY_VACUUM_PAGES = 2000          # max. freigegebene Seiten pro Durchlauf (0 = alle)
+
+# Kanäle (tvg-id) und das mindestens nötige Paket (entitlement_index.py)
+CHANNEL_PACKAGES = {
+    "news": "Basis",
+    "sport": "Basis+",
+    "kino": "Premium",
+}
+ENTITLEMENT_REFRESH = 5          # Sekunden zwischen Versionsprüfungen gegen die Datenbank
+
+# Expiry-Sweeper (expiry_sweeper.py)
+EXPIRY_SWEEP_BATCH = 1000        # Subscriptions pro Transaktion
+EXPIRY_SWEEP_MAX_SLEEP = 3600    # spätestens dann erneut prüfen (Änderungen anderer Prozesse)
+EXPIRY_SWEEP_RETRY = 60          # Wartezeit nach einem fehlgeschlagenen Durchlauf
+
+# EMM-Karussell (emm_carousel.py)
+EMM_CAROUSEL_BITRATE = 2000000   # Bit/s für die EMM-Ausgabe
+EMM_CAROUSEL_TICK = 0.1          # Sendeintervall in Sekunden
+EMM_CAROUSEL_RESYNC = 300        # Abgleich mit der Datenbank in Sekunden
+
+# Maximale Anzahl Geräte pro /api/authenticate/batch Request
+BATCH_AUTH_MAX_DEVICES = 500
+
+# /metrics (metrics.py): nur von diesen Adressen oder mit "Authorization: Bearer METRICS_TOKEN".
+# Hinter einem Reverse Proxy auf demselben Host ist remote_addr immer lokal, dann die Adressen leeren.
+METRICS_ALLOWED_ADDRS = ("127.0.0.1", "::1")
+METRICS_TOKEN = ""               # leer = kein Token-Zugriff
+
+# Profiling (Stack-Sampling einzelner Requests, zur Laufzeit über /admin/profiling umschaltbar)
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.01   # Anteil der Requests, die aufgezeichnet werden
+PROFILING_INTERVAL = 0.005     # Sampling-Intervall in Sekunden
+PROFILING_DIR = "profiles"     # Ausgabe der .folded-Dateien für Flamegraphs
+
+# Webhook-Queue (webhook_queue.py)
+WEBHOOK_WORKERS = 4              # Worker-Threads
+WEBHOOK_BATCH = 20               # Events pro Claim
+WEBHOOK_MAX_ATTEMPTS = 8         # danach Status 'failed'
+WEBHOOK_RETRY_BASE = 2.0         # Sekunden, verdoppelt sich pro Versuch
+WEBHOOK_POLL_INTERVAL = 1.0      # Sekunden, falls Events aus anderen Prozessen kommen
+WEBHOOK_STALE_AFTER = 300        # 'processing' länger als das gilt beim Start als abgestürzt
+
+# Payment Provider (siehe payment_providers/__init__.py: "stripe" oder "stub" für Offline-Tests)
 PAYMENT_PROVIDER = "stripe"
 
 # Stripe Einstellungen
@@ -39,6 +90,30 @@ STRIPE_API_KEY = "sk_test_deinkey"
 STRIPE_WEBHOOK_SECRET = "whsec_deinsecret"
 SUCCESS_URL = "https://deine-domain.de/selfservice/success"
 CANCEL_URL = "https://deine-domain.de/selfservice/cancel"
+PAYMENT_HTTP_TIMEOUT = 10        # Sekunden pro Provider-Request
+
+# Stub-Provider (lokal, ohne Netzwerk)
+STUB_WEBHOOK_SECRET = "stubsecret"
+
+# Cache für /payment_status (Endstatus bleiben bis zur Verdrängung, sonst TTL in Sekunden)
+PAYMENT_STATUS_CACHE_SIZE = 10000
+PAYMENT_STATUS_CACHE_TTL = 5
+
+# Self-Service: Gültigkeit des aufgelösten Zustands im Session-Cookie (Sekunden)
+SELF_SERVICE_SESSION_TTL = 300
+
+# Vorschau-Wand (preview_wall.py): Standbilder vieler Kanäle per ffmpeg
+PREVIEW_WORKERS = 4              # gleichzeitige ffmpeg-Prozesse
+PREVIEW_REFRESH = 30             # Sekunden, ab denen ein Vorschaubild neu geholt wird
+PREVIEW_TTL = 120                # Sekunden, danach wird ein Vorschaubild verworfen
+PREVIEW_WIDTH = 320              # Breite der Vorschaubilder in Pixel
+PREVIEW_GRAB_TIMEOUT = 15        # Sekunden pro Grab
+FFMPEG_PATH = "ffmpeg"
+
+# Watermark-Rendering (watermark_renderer.py)
+WATERMARK_SCALE = 0.12           # Logobreite relativ zur Framebreite
+WATERMARK_MARGIN = 0.02          # Abstand zum Rand relativ zur Framebreite
+WATERMARK_CACHE_SIZE = 64        # vorberechnete Overlays (Logo x Position x Auflösung)
 
 # Paketpreise in Euro
 PRICES = {
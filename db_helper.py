@@ -2,15 +2,59 @@ import sqlite3
 import threading
 import datetime
 
+# Tabellen, deren Änderungen in data_versions mitgezählt werden
+VERSIONED_TABLES = ('users', 'watermarks', 'keys', 'subscriptions', 'payment_rollups')
+
+# Maximale Anzahl Parameter pro IN (...)-Abfrage (SQLite-Limit liegt je nach Build bei 999)
+IN_CHUNK = 500
+
+KEY_COLUMNS = 'key_id, key_value, created_at, valid_until, owner, paket, valid_from'
+
+# Spalten, nach denen get_users_page sortieren darf (username als Tie-Breaker)
+USER_SORT_COLUMNS = ('username', 'hwid', 'paket', 'token', 'email')
+
+# Paket-Prioritäten (höher = besser)
+PAKET_ORDER = {'Basis': 1, 'Basis+': 2, 'Premium': 3}
+
+# Bestehende Benutzer werden aktualisiert, nicht ersetzt (rowid und subscriber_id bleiben)
+USER_UPSERT = '''
+    ON CONFLICT(username) DO UPDATE SET
+        password = excluded.password, hwid = excluded.hwid, paket = excluded.paket,
+        token = excluded.token, email = excluded.email
+'''
+
+# Wartezeit auf die Schreibsperre anderer Verbindungen/Prozesse (Sekunden)
+BUSY_TIMEOUT = 30
+
+
+def _chunks(values, size=None):
+    size = size or IN_CHUNK
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
 class DBHelper:
-    def __init__(self, db_path='iptv_users.db'):
+    def __init__(self, db_path='iptv_users.db', create_tables=True):
         self.db_path = db_path
         self.lock = threading.Lock()
-        self._create_tables()
+        # Callbacks (username, event) nach Subscription-Änderungen und delete_user ('delete')
+        self.subscription_listeners = []
+        self.schema_ready = False
+        # create_tables=False: Schema erst mit ensure_schema() anlegen (z.B. im Hintergrund beim GUI-Start)
+        if create_tables:
+            self.ensure_schema()
+
+    def ensure_schema(self):
+        """Legt Tabellen, Indizes und Migrationen an (idempotent)."""
+        if not self.schema_ready:
+            self._create_tables()
+            self.schema_ready = True
 
     def _create_tables(self):
         with self.lock, sqlite3.connect(self.db_path) as conn:
             c = conn.cursor()
+            # Freie Seiten per PRAGMA incremental_vacuum zurückgeben (wirkt nur bei neuen Dateien)
+            c.execute('PRAGMA auto_vacuum = INCREMENTAL')
             # Users
             c.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -67,27 +111,191 @@ class DBHelper:
                     FOREIGN KEY(username) REFERENCES users(username)
                 )
             ''')
+            # Fortschritt von Bulk-Importen (letzter committeter Chunk je Quelle)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS import_progress (
+                    source TEXT PRIMARY KEY,
+                    rows_done INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Eingangs-Queue für Payment-Webhooks (webhook_queue.py), event_id = Idempotenz-Schlüssel
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS webhook_events (
+                    event_id TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    claimed_at REAL,
+                    error TEXT,
+                    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_webhook_events_due ON webhook_events(status, available_at)')
+            # Cursor der Rotations-Scheduler (Timing Wheel), damit ein Neustart fortsetzt
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS scheduler_state (
+                    name TEXT PRIMARY KEY,
+                    cursor INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Indizes für die Lookups im Request-Pfad (siehe test/test_db_query_plans.py)
+            c.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions(username, active, end_date)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_keys_owner ON keys(owner, valid_until)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_users_hwid ON users(hwid)')
+            # Sortierung der Benutzertabelle im GUI nach Paket (get_users_page)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_users_paket_sort ON users(COALESCE(paket, ''), username)")
+            # Fälligkeits-Queue für den Expiry-Sweeper (expiry_sweeper.py)
+            c.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_due ON subscriptions(active, end_date)')
+            # Migration: valid_from für vorab erzeugte (odd/even) Control Words
+            key_columns = {row[1] for row in c.execute('PRAGMA table_info(keys)')}
+            if 'valid_from' not in key_columns:
+                c.execute('ALTER TABLE keys ADD COLUMN valid_from TIMESTAMP')
+            c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_keys_owner_from ON keys(owner, valid_from)')
+            # Migration: Referenz des Payment-Providers (Checkout-Session) für Status-Abfragen
+            payment_columns = {row[1] for row in c.execute('PRAGMA table_info(payments)')}
+            if 'provider_ref' not in payment_columns:
+                c.execute('ALTER TABLE payments ADD COLUMN provider_ref TEXT')
+            c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_ref ON payments(provider_ref)')
+            if 'paket' not in payment_columns:
+                c.execute('ALTER TABLE payments ADD COLUMN paket TEXT')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_payments_user ON payments(username, timestamp)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_payments_time ON payments(timestamp, payment_id)')
+            # Tägliche Umsatz-Rollups, in add_payment/complete_checkout per UPSERT fortgeschrieben.
+            # day ist der UTC-Tag (payments.timestamp = CURRENT_TIMESTAMP)
+            rollups_exist = c.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'payment_rollups'").fetchone()
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS payment_rollups (
+                    day DATE NOT NULL,
+                    paket TEXT NOT NULL,
+                    currency TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payments INTEGER NOT NULL,
+                    amount REAL NOT NULL,
+                    PRIMARY KEY (day, paket, currency, status)
+                )
+            ''')
+            if not rollups_exist:
+                # Erstes Anlegen: vorhandene Zahlungen einmalig übernehmen
+                c.execute('''
+                    INSERT INTO payment_rollups(day, paket, currency, status, payments, amount)
+                    SELECT date(timestamp), COALESCE(paket, ''), currency, status, COUNT(*), SUM(amount)
+                    FROM payments GROUP BY 1, 2, 3, 4
+                ''')
+            # Retention: abgelaufene Keys per Index finden, get_recent_keys ohne Sortier-Scan
+            c.execute('CREATE INDEX IF NOT EXISTS idx_keys_valid_until ON keys(valid_until)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_keys_created ON keys(created_at)')
+            # Archiv abgelaufener Keys (ohne Sekundärindizes, nur für Audits)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS keys_archive (
+                    key_id INTEGER PRIMARY KEY,
+                    key_value TEXT NOT NULL,
+                    created_at TIMESTAMP,
+                    valid_until TIMESTAMP,
+                    owner TEXT,
+                    paket TEXT,
+                    valid_from TIMESTAMP,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Migration: stabile Teilnehmer-ID (EMM-Adresse, Entitlement-Index). rowid ändert
+            # sich bei VACUUM und beim Neuanlegen eines Benutzers, subscriber_id nie; vergeben
+            # wird fortlaufend aus id_sequences, gelöschte IDs werden nicht wiederverwendet.
+            user_columns = {row[1] for row in c.execute('PRAGMA table_info(users)')}
+            if 'subscriber_id' not in user_columns:
+                c.execute('ALTER TABLE users ADD COLUMN subscriber_id INTEGER')
+                c.execute('UPDATE users SET subscriber_id = rowid')
+            c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_subscriber ON users(subscriber_id)')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS id_sequences (
+                    name TEXT PRIMARY KEY,
+                    last INTEGER NOT NULL
+                )
+            ''')
+            c.execute('''
+                INSERT OR IGNORE INTO id_sequences(name, last)
+                SELECT 'subscriber_id', COALESCE(MAX(subscriber_id), 0) FROM users
+            ''')
+            c.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_users_subscriber_id
+                AFTER INSERT ON users WHEN NEW.subscriber_id IS NULL
+                BEGIN
+                    UPDATE id_sequences SET last = last + 1 WHERE name = 'subscriber_id';
+                    UPDATE users SET subscriber_id = (SELECT last FROM id_sequences WHERE name = 'subscriber_id')
+                    WHERE rowid = NEW.rowid;
+                END
+            ''')
+            # Daten-Versionen für Fragment-Caches (per Trigger, prozessübergreifend gültig)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            for table in VERSIONED_TABLES:
+                c.execute('INSERT OR IGNORE INTO data_versions(name, version) VALUES (?, 0)', (table,))
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    c.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                        AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                        END
+                    ''')
+            conn.commit()
+
+    # --- Versions-Methoden ---
+
+    def get_data_versions(self):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return dict(conn.execute('SELECT name, version FROM data_versions').fetchall())
+
+    # --- Scheduler-Methoden ---
+
+    def get_scheduler_cursor(self, name):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            row = conn.execute('SELECT cursor FROM scheduler_state WHERE name = ?', (name,)).fetchone()
+            return row[0] if row else None
+
+    def set_scheduler_cursor(self, name, cursor):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                INSERT INTO scheduler_state(name, cursor, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(name) DO UPDATE SET cursor = excluded.cursor, updated_at = excluded.updated_at
+            ''', (name, cursor))
             conn.commit()
 
     # --- User-Methoden ---
 
     def add_user(self, username, password, hwid, paket, token, email=''):
+        # Upsert statt INSERT OR REPLACE: die Zeile (und subscriber_id) bleibt erhalten,
+        # ein Token eines anderen Benutzers ergibt IntegrityError statt ihn zu löschen
         with self.lock, sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                INSERT OR REPLACE INTO users(username, password, hwid, paket, token, email)
+            conn.execute(f'''
+                INSERT INTO users(username, password, hwid, paket, token, email)
                 VALUES (?, ?, ?, ?, ?, ?)
+                {USER_UPSERT}
             ''', (username, password, hwid, paket, token, email))
             conn.commit()
 
     def delete_user(self, username):
-        with self.lock, sqlite3.connect(self.db_path) as conn:
-            conn.execute('DELETE FROM users WHERE username = ?', (username,))
-            conn.commit()
+        self._delete_users('username = ?', username)
 
     def delete_user_by_token(self, token):
+        self._delete_users('token = ?', token)
+
+    def _delete_users(self, where, value):
         with self.lock, sqlite3.connect(self.db_path) as conn:
-            conn.execute('DELETE FROM users WHERE token = ?', (token,))
+            rows = conn.execute(f'DELETE FROM users WHERE {where} RETURNING username', (value,)).fetchall()
             conn.commit()
+        for (username,) in rows:
+            self._notify_subscription(username, 'delete')
 
     def update_user_details(self, username, paket, hwid, email):
         with self.lock, sqlite3.connect(self.db_path) as conn:
@@ -98,6 +306,11 @@ class DBHelper:
             ''', (paket, hwid, email, username))
             conn.commit()
 
+    def update_user_package(self, username, paket):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('UPDATE users SET paket = ? WHERE username = ?', (paket, username))
+            conn.commit()
+
     def update_user_token(self, username, new_token):
         with self.lock, sqlite3.connect(self.db_path) as conn:
             conn.execute('''
@@ -126,6 +339,45 @@ class DBHelper:
                 FROM users WHERE username = ?
             ''', (username,)).fetchone()
 
+    def get_users_by_tokens(self, tokens):
+        """Set-basierter Lookup: {token: user_row} für alle gefundenen Tokens."""
+        result = {}
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            for chunk in _chunks(set(tokens)):
+                marks = ','.join('?' * len(chunk))
+                for row in conn.execute(f'''
+                    SELECT username, hwid, paket, token, email
+                    FROM users WHERE token IN ({marks})
+                ''', chunk):
+                    result[row[3]] = row
+        return result
+
+    def get_users_by_usernames(self, usernames):
+        """Set-basierter Lookup: {username: user_row} für alle gefundenen Benutzer."""
+        result = {}
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            for chunk in _chunks(set(usernames)):
+                marks = ','.join('?' * len(chunk))
+                for row in conn.execute(f'''
+                    SELECT username, hwid, paket, token, email
+                    FROM users WHERE username IN ({marks})
+                ''', chunk):
+                    result[row[0]] = row
+        return result
+
+    def get_users_by_hwids(self, hwids):
+        """Set-basierter Lookup: {hwid: user_row} für alle gefundenen HWIDs."""
+        result = {}
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            for chunk in _chunks(set(hwids)):
+                marks = ','.join('?' * len(chunk))
+                for row in conn.execute(f'''
+                    SELECT username, hwid, paket, token, email
+                    FROM users WHERE hwid IN ({marks})
+                ''', chunk):
+                    result.setdefault(row[1], row)
+        return result
+
     def get_token_by_username(self, username):
         with self.lock, sqlite3.connect(self.db_path) as conn:
             row = conn.execute('SELECT token FROM users WHERE username = ?', (username,)).fetchone()
@@ -147,22 +399,110 @@ class DBHelper:
         with self.lock, sqlite3.connect(self.db_path) as conn:
             return conn.execute('SELECT username, hwid, paket, token, email FROM users').fetchall()
 
+    def count_users(self):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def get_users_page(self, after=None, limit=500, order_by='username', descending=False):
+        """Eine Seite Benutzer, sortiert nach `order_by` (Keyset-Pagination).
+
+        `after` ist der Sortierschlüssel der letzten Zeile der vorigen Seite,
+        siehe user_sort_key; None liefert die erste Seite.
+        """
+        if order_by not in USER_SORT_COLUMNS:
+            raise ValueError(f"Unbekannte Sortierspalte: {order_by}")
+        direction, op = ('DESC', '<') if descending else ('ASC', '>')
+        query = 'SELECT username, hwid, paket, token, email FROM users'
+        params = []
+        if order_by == 'username':
+            order = f'username {direction}'
+            if after:
+                query += f' WHERE username {op} ?'
+                params.append(after[1])
+        else:
+            key = f"COALESCE({order_by}, '')"
+            order = f'{key} {direction}, username {direction}'
+            if after:
+                # Ausgeschrieben statt Row-Value-Vergleich, damit SQLite im Index sucht statt scannt
+                query += f' WHERE {key} {op}= ? AND ({key} {op} ? OR username {op} ?)'
+                params.extend([after[0], after[0], after[1]])
+        query += f' ORDER BY {order} LIMIT ?'
+        params.append(limit)
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute(query, params).fetchall()
+
+    @staticmethod
+    def user_sort_key(row, order_by='username'):
+        """Sortierschlüssel einer Zeile aus get_users_page (für `after`)."""
+        return (row[USER_SORT_COLUMNS.index(order_by)] or '', row[0])
+
+    def iter_users(self, batch_size=1000):
+        """Alle Benutzer in username-Reihenfolge, seitenweise gelesen (Keyset-Pagination)."""
+        last = ''
+        while True:
+            with self.lock, sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute('''
+                    SELECT username, hwid, paket, token, email
+                    FROM users WHERE username > ?
+                    ORDER BY username LIMIT ?
+                ''', (last, batch_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def add_users_batch(self, rows, source=None, rows_done=None):
+        """Fügt (username, password, hwid, paket, token, email)-Zeilen in einer Transaktion ein.
+
+        Bestehende Benutzer werden aktualisiert; password oder email None
+        behält den gespeicherten Wert (der Export enthält kein Passwort).
+        Ein Token, das einem anderen Benutzer gehört, ergibt IntegrityError.
+        Mit `source` wird der Import-Fortschritt `rows_done` in derselben
+        Transaktion gespeichert, sodass ein Abbruch nie halbe Chunks hinterlässt.
+        """
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.executemany('''
+                INSERT INTO users(username, password, hwid, paket, token, email)
+                VALUES (?1, COALESCE(?2, ''), ?3, ?4, ?5, COALESCE(?6, ''))
+                ON CONFLICT(username) DO UPDATE SET
+                    password = COALESCE(?2, users.password), hwid = excluded.hwid, paket = excluded.paket,
+                    token = excluded.token, email = COALESCE(?6, users.email)
+            ''', rows)
+            if source is not None:
+                conn.execute('''
+                    INSERT INTO import_progress(source, rows_done, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(source) DO UPDATE SET rows_done = excluded.rows_done, updated_at = excluded.updated_at
+                ''', (source, rows_done))
+            conn.commit()
+
+    def get_import_progress(self, source):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            row = conn.execute('SELECT rows_done FROM import_progress WHERE source = ?', (source,)).fetchone()
+            return row[0] if row else 0
+
+    def clear_import_progress(self, source):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('DELETE FROM import_progress WHERE source = ?', (source,))
+            conn.commit()
+
     # --- Key-Methoden ---
 
-    def store_key(self, key_value, valid_until, owner, paket):
+    def store_key(self, key_value, valid_until, owner, paket, valid_from=None):
         with self.lock, sqlite3.connect(self.db_path) as conn:
             c = conn.cursor()
             c.execute('''
-                INSERT INTO keys(key_value, valid_until, owner, paket)
-                VALUES (?, ?, ?, ?)
-            ''', (key_value, valid_until, owner, paket))
+                INSERT INTO keys(key_value, valid_until, owner, paket, valid_from)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key_value, valid_until, owner, paket, valid_from))
             conn.commit()
             return c.lastrowid
 
     def get_valid_keys(self, owner=None, paket=None):
         now = datetime.datetime.utcnow().isoformat()
-        query = 'SELECT key_id, key_value, created_at, valid_until, owner, paket FROM keys WHERE valid_until IS NULL OR valid_until > ?'
-        params = [now]
+        query = '''SELECT key_id, key_value, created_at, valid_until, owner, paket FROM keys
+                   WHERE (valid_until IS NULL OR valid_until > ?) AND (valid_from IS NULL OR valid_from <= ?)'''
+        params = [now, now]
         if owner:
             query += ' AND owner = ?'; params.append(owner)
         if paket:
@@ -174,6 +514,57 @@ class DBHelper:
         with self.lock, sqlite3.connect(self.db_path) as conn:
             return conn.execute('SELECT key_id, key_value, created_at, valid_until, owner, paket FROM keys WHERE key_id = ?', (key_id,)).fetchone()
 
+    def get_valid_key_for_user(self, username):
+        now = datetime.datetime.utcnow().isoformat()
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute('''
+                SELECT key_id, key_value, created_at, valid_until, owner, paket
+                FROM keys
+                WHERE owner = ? AND (valid_until IS NULL OR valid_until > ?)
+                  AND (valid_from IS NULL OR valid_from <= ?)
+                ORDER BY key_id DESC LIMIT 1
+            ''', (username, now, now)).fetchone()
+
+    def get_key_pairs_for_users(self, usernames, now, activation):
+        """{username: (aktueller Key, nächster Key)} für mehrere Benutzer.
+
+        Der aktuelle Key ist der neueste bereits gültige, der nächste der neueste
+        mit valid_from >= activation (Zeitpunkt des nächsten Schlüsselwechsels).
+        Fehlende Keys sind None. Zeilen enthalten zusätzlich valid_from.
+        """
+        result = {}
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            for chunk in _chunks(set(usernames)):
+                marks = ','.join('?' * len(chunk))
+                for row in conn.execute(f'''
+                    SELECT key_id, key_value, created_at, valid_until, owner, paket, valid_from
+                    FROM keys
+                    WHERE owner IN ({marks}) AND (valid_until IS NULL OR valid_until > ?)
+                    ORDER BY key_id
+                ''', chunk + [now]):
+                    current, upcoming = result.get(row[4], (None, None))
+                    if row[6] is None or row[6] <= now:
+                        current = row
+                    elif row[6] >= activation:
+                        upcoming = row
+                    result[row[4]] = (current, upcoming)
+        return result
+
+    def get_key_pair(self, username, now, activation):
+        return self.get_key_pairs_for_users([username], now, activation).get(username, (None, None))
+
+    def store_keys_batch(self, rows):
+        """Speichert (key_value, valid_until, owner, paket, valid_from)-Zeilen in einer Transaktion.
+
+        Existiert für (owner, valid_from) schon ein Key, bleibt dieser erhalten.
+        """
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO keys(key_value, valid_until, owner, paket, valid_from)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+
     def get_recent_keys(self, limit=20):
         with self.lock, sqlite3.connect(self.db_path) as conn:
             return conn.execute('''
@@ -181,6 +572,70 @@ class DBHelper:
                 FROM keys ORDER BY created_at DESC LIMIT ?
             ''', (limit,)).fetchall()
 
+    def archive_expired_keys(self, cutoff, batch_size=1000):
+        """Verschiebt bis zu `batch_size` Keys mit valid_until < cutoff nach keys_archive.
+
+        Eine kurze Transaktion pro Aufruf, damit Aufrufer in kleinen Batches
+        laufen können, ohne den Request-Pfad zu blockieren. Liefert die Anzahl.
+        """
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            ids = [row[0] for row in conn.execute('''
+                SELECT key_id FROM keys
+                WHERE valid_until IS NOT NULL AND valid_until < ?
+                ORDER BY valid_until LIMIT ?
+            ''', (cutoff, batch_size))]
+            if not ids:
+                return 0
+            marks = ','.join('?' * len(ids))
+            conn.execute(f'''
+                INSERT OR REPLACE INTO keys_archive({KEY_COLUMNS})
+                SELECT {KEY_COLUMNS} FROM keys WHERE key_id IN ({marks})
+            ''', ids)
+            conn.execute(f'DELETE FROM keys WHERE key_id IN ({marks})', ids)
+            conn.commit()
+            return len(ids)
+
+    def get_archived_keys(self, owner, limit=100):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute(f'''
+                SELECT {KEY_COLUMNS} FROM keys_archive
+                WHERE owner = ? ORDER BY key_id DESC LIMIT ?
+            ''', (owner, limit)).fetchall()
+
+    def get_storage_stats(self):
+        """Zeilen in keys/keys_archive und Seitenbelegung der Datenbankdatei."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return {
+                'keys': conn.execute('SELECT COUNT(*) FROM keys').fetchone()[0],
+                'keys_archive': conn.execute('SELECT COUNT(*) FROM keys_archive').fetchone()[0],
+                'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+                'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+                'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0],
+                'auto_vacuum': conn.execute('PRAGMA auto_vacuum').fetchone()[0],
+            }
+
+    def incremental_vacuum(self, pages=None):
+        """Gibt bis zu `pages` freie Seiten ans Dateisystem zurück (None = alle), liefert deren Anzahl.
+
+        Wirkt nur mit auto_vacuum=INCREMENTAL; ältere Datenbanken brauchen
+        vorher einmal ein volles VACUUM (key_retention.py --convert).
+        """
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            before = conn.execute('PRAGMA page_count').fetchone()[0]
+            # execute() würde das Pragma nur einen Schritt (= eine Seite) ausführen
+            conn.executescript(f'PRAGMA incremental_vacuum({int(pages or 0)});')
+            return before - conn.execute('PRAGMA page_count').fetchone()[0]
+
+    def convert_to_incremental_vacuum(self):
+        """Einmaliges volles VACUUM, stellt eine bestehende Datenbank auf auto_vacuum=INCREMENTAL um."""
+        with self.lock:
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            try:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            finally:
+                conn.close()
+
     # --- Subscription-Methoden ---
 
     def add_subscription(self, username, paket, start_date, end_date):
@@ -190,6 +645,14 @@ class DBHelper:
                 VALUES (?, ?, ?, ?, 1)
             ''', (username, paket, start_date, end_date))
             conn.commit()
+        self._notify_subscription(username, 'add')
+
+    def add_subscription_listener(self, callback):
+        self.subscription_listeners.append(callback)
+
+    def _notify_subscription(self, username, event):
+        for callback in self.subscription_listeners:
+            callback(username, event)
 
     def get_active_subscriptions(self, username):
         today = datetime.date.today().isoformat()
@@ -201,19 +664,174 @@ class DBHelper:
                 ORDER BY end_date DESC
             ''', (username, today)).fetchall()
 
+    def get_active_subscriptions_for_users(self, usernames):
+        """{username: aktive Subscription mit dem spätesten Enddatum} für mehrere Benutzer."""
+        today = datetime.date.today().isoformat()
+        result = {}
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            for chunk in _chunks(set(usernames)):
+                marks = ','.join('?' * len(chunk))
+                for row in conn.execute(f'''
+                    SELECT sub_id, username, paket, start_date, end_date, active
+                    FROM subscriptions
+                    WHERE username IN ({marks}) AND active = 1 AND end_date >= ?
+                    ORDER BY end_date DESC
+                ''', chunk + [today]):
+                    result.setdefault(row[1], row)
+        return result
+
+    def get_package_subscribers(self, paket):
+        """(subscriber_id, username, end_date) der Abonnenten, deren bestes aktives Paket `paket` ist.
+
+        end_date ist das späteste Ende der `paket`-Subscriptions; Benutzer mit
+        einem höheren Paket bekommen dessen EMM (die Bitmap enthält `paket`).
+        """
+        today = datetime.date.today().isoformat()
+        higher = [name for name, rank in PAKET_ORDER.items() if rank > PAKET_ORDER.get(paket, 0)]
+        marks = ','.join('?' * len(higher))
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute(f'''
+                SELECT u.subscriber_id, u.username, MAX(s.end_date)
+                FROM subscriptions s JOIN users u ON u.username = s.username
+                WHERE s.paket = ? AND s.active = 1 AND s.end_date >= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM subscriptions h
+                      WHERE h.username = s.username AND h.active = 1 AND h.end_date >= ?
+                        AND h.paket IN ({marks})
+                  )
+                GROUP BY u.subscriber_id ORDER BY u.subscriber_id
+            ''', [paket, today, today] + higher).fetchall()
+
+    def iter_entitlements(self, package_ranks, usernames=None, batch_size=1000):
+        """Yields (subscriber_id, höchster Paket-Rang, end_date, username) aktiver Abonnenten.
+
+        `package_ranks` bildet Paketnamen auf Ränge ab (unbekannte Pakete = 0).
+        end_date ist das späteste Ende der Subscriptions mit dem höchsten Rang,
+        nicht das aller Subscriptions (Premium bis Februar und Basis bis
+        Dezember ergeben Premium bis Februar).
+        Ohne `usernames` werden alle Benutzer sortiert nach subscriber_id gelesen,
+        `batch_size` pro Abfrage (Keyset-Pagination). Jeder Chunk wird komplett
+        geholt; zwischen den Chunks ist der Lock frei.
+        """
+        today = datetime.date.today().isoformat()
+        cases = ' '.join('WHEN ? THEN ?' for _ in package_ranks)
+        rank_params = [value for item in package_ranks.items() for value in item]
+        # MAX über "Rang|end_date" (Rang dreistellig) liefert Rang und Enddatum derselben Subscription.
+        # CROSS JOIN legt die Reihenfolge fest: users per Index (Keyset bzw. username),
+        # dann deren Subscriptions, statt pro Chunk alle aktiven Subscriptions zu sortieren
+        query = f'''
+            SELECT u.subscriber_id, MAX(printf('%03d|%s', CASE s.paket {cases} ELSE 0 END, s.end_date)),
+                   u.username
+            FROM users u CROSS JOIN subscriptions s ON s.username = u.username
+            WHERE s.active = 1 AND s.end_date >= ? {{filter}}
+            GROUP BY u.subscriber_id ORDER BY u.subscriber_id {{limit}}
+        '''
+
+        def split(rows):
+            for subscriber_id, best, username in rows:
+                yield subscriber_id, int(best[:3]), best[4:], username
+
+        if usernames is None:
+            last = 0
+            while True:
+                with self.lock, sqlite3.connect(self.db_path) as conn:
+                    rows = conn.execute(query.format(filter='AND u.subscriber_id > ?', limit='LIMIT ?'),
+                                        rank_params + [today, last, batch_size]).fetchall()
+                if not rows:
+                    return
+                yield from split(rows)
+                last = rows[-1][0]
+        for chunk in _chunks(set(usernames)):
+            marks = ','.join('?' * len(chunk))
+            with self.lock, sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(query.format(filter=f'AND u.username IN ({marks})', limit=''),
+                                    rank_params + [today] + chunk).fetchall()
+            yield from split(rows)
+
+    def get_subscriber_id(self, username):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            row = conn.execute('SELECT subscriber_id FROM users WHERE username = ?', (username,)).fetchone()
+            return row[0] if row else None
+
+    def get_next_expiry(self):
+        """Frühestes end_date einer aktiven Subscription (None, wenn keine aktiv ist)."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute('SELECT MIN(end_date) FROM subscriptions WHERE active = 1').fetchone()[0]
+
+    def expire_subscriptions(self, today, batch_size=1000):
+        """Deaktiviert bis zu `batch_size` aktive Subscriptions mit end_date < today.
+
+        Benachrichtigt die Subscription-Listener einmal pro betroffenem Benutzer
+        (Event 'expire'). Liefert die betroffenen Benutzernamen.
+        """
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute('''
+                UPDATE subscriptions SET active = 0
+                WHERE sub_id IN (
+                    SELECT sub_id FROM subscriptions
+                    WHERE active = 1 AND end_date < ?
+                    ORDER BY end_date LIMIT ?
+                )
+                RETURNING username
+            ''', (today, batch_size)).fetchall()
+            conn.commit()
+        usernames = list(dict.fromkeys(row[0] for row in rows))
+        for username in usernames:
+            self._notify_subscription(username, 'expire')
+        return usernames
+
     def get_active_subscription(self, username):
         subs = self.get_active_subscriptions(username)
         return subs[0] if subs else None
 
     def get_best_active_package(self, username):
         # Priorität: Premium > Basis+ > Basis
-        order = {'Premium':3, 'Basis+':2, 'Basis':1}
         subs = self.get_active_subscriptions(username)
         if not subs:
             return None
-        best = max(subs, key=lambda s: order.get(s[2], 0))
+        best = max(subs, key=lambda s: PAKET_ORDER.get(s[2], 0))
         return best[2]
 
+    def book_subscription(self, username, paket, days, today=None):
+        """Bucht `days` Tage `paket` atomar und liefert den Stand danach.
+
+        Beginn ist heute, wenn `paket` höher ist als das beste aktive Abo,
+        sonst dessen Ende. Zeitraum und Insert laufen als ein INSERT ... SELECT
+        in BEGIN IMMEDIATE, parallele Buchungen (Threads oder Prozesse) warten
+        also, statt vom selben Enddatum aus zu starten. Liefert (booked,
+        active, user): neue Subscription, aktives Abo wie bei
+        get_active_subscription und users-Zeile mit neuem Paket; None für
+        unbekannte Benutzer.
+        """
+        today = today or datetime.date.today().isoformat()
+        with self.lock:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=BUSY_TIMEOUT)
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    if not conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone():
+                        conn.execute('ROLLBACK')
+                        return None
+                    booked = self._insert_booking(conn, username, paket, days, today)
+                    active = conn.execute('''
+                        SELECT sub_id, username, paket, start_date, end_date, active
+                        FROM subscriptions
+                        WHERE username = ? AND active = 1 AND end_date >= ?
+                        ORDER BY end_date DESC LIMIT 1
+                    ''', (username, today)).fetchone()
+                    user = conn.execute('''
+                        UPDATE users SET paket = ? WHERE username = ?
+                        RETURNING username, hwid, paket, token, email
+                    ''', (paket, username)).fetchone()
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                conn.close()
+        self._notify_subscription(username, 'add')
+        return booked, active, user
+
     def cancel_subscription(self, username):
         # Markiere alle aktiven Subs als inactive, aber lasse end_date unangetastet
         with self.lock, sqlite3.connect(self.db_path) as conn:
@@ -222,6 +840,7 @@ class DBHelper:
                 WHERE username = ? AND active = 1
             ''', (username,))
             conn.commit()
+        self._notify_subscription(username, 'cancel')
 
     # --- Watermark-Methoden ---
 
@@ -240,6 +859,13 @@ class DBHelper:
                 FROM watermarks
             ''').fetchall()
 
+    def get_watermark(self, wm_id):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute('''
+                SELECT wm_id, name, path, position, visible
+                FROM watermarks WHERE wm_id = ?
+            ''', (wm_id,)).fetchone()
+
     def update_watermark(self, wm_id, visible):
         with self.lock, sqlite3.connect(self.db_path) as conn:
             conn.execute('''
@@ -250,15 +876,132 @@ class DBHelper:
 
     # --- Payment-Methoden ---
 
-    def add_payment(self, username, amount, currency, status):
+    @staticmethod
+    def _insert_payment(conn, username, amount, currency, status, paket=None, provider_ref=None):
+        """Fügt eine Zahlung ein und zählt sie in der gleichen Transaktion in ihren Tages-Rollup."""
+        payment_id = conn.execute('''
+            INSERT INTO payments(username, amount, currency, status, paket, provider_ref)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (username, amount, currency, status, paket, provider_ref)).lastrowid
+        DBHelper._rollup_payment(conn, payment_id)
+        return payment_id
+
+    @staticmethod
+    def _rollup_payment(conn, payment_id, sign=1):
+        """Zählt eine Zahlung in ihren Tages-Rollup ein (sign=1) oder aus (sign=-1); leere Rollups entfallen."""
+        conn.execute('''
+            INSERT INTO payment_rollups(day, paket, currency, status, payments, amount)
+            SELECT date(timestamp), COALESCE(paket, ''), currency, status, ?1, ?1 * amount
+            FROM payments WHERE payment_id = ?2
+            ON CONFLICT(day, paket, currency, status) DO UPDATE
+            SET payments = payments + excluded.payments, amount = amount + excluded.amount
+        ''', (sign, payment_id))
+        if sign < 0:
+            conn.execute('''
+                DELETE FROM payment_rollups
+                WHERE payments = 0 AND (day, paket, currency, status) = (
+                    SELECT date(timestamp), COALESCE(paket, ''), currency, status
+                    FROM payments WHERE payment_id = ?
+                )
+            ''', (payment_id,))
+
+    def add_payment(self, username, amount, currency, status, paket=None, provider_ref=None):
         with self.lock, sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO payments(username, amount, currency, status)
-                VALUES (?, ?, ?, ?)
-            ''', (username, amount, currency, status))
+            payment_id = self._insert_payment(conn, username, amount, currency, status, paket, provider_ref)
             conn.commit()
-            return c.lastrowid
+            return payment_id
+
+    def add_pending_payment(self, username, paket, amount, currency, provider_ref):
+        """Erfasst eine Checkout-Session als Zahlung mit Status 'pending' (abgeschlossen per complete_checkout)."""
+        return self.add_payment(username, amount, currency, 'pending', paket, provider_ref)
+
+    def complete_checkout(self, event_id, username, paket, amount, currency, days, provider_ref=None, today=None):
+        """Bucht einen bezahlten Checkout über `days` Tage aus Webhook `event_id` in einer Transaktion.
+
+        Zeitraum nach der Buchungsregel von _insert_booking (Upgrade ab heute,
+        sonst im Anschluss an das laufende Abo). Zahlung, Subscription, Paket
+        des Benutzers und das done des Webhook-Events werden gemeinsam in
+        BEGIN IMMEDIATE committet: ein abgestürzter Worker bucht nie doppelt,
+        parallele Buchungen warten aufeinander. Eine offene Zahlung mit
+        derselben Provider-Referenz wird 'paid' (gezählt am Tag des Abschlusses).
+        False, wenn Event oder Provider-Referenz schon gebucht sind.
+        """
+        today = today or datetime.date.today().isoformat()
+        with self.lock:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=BUSY_TIMEOUT)
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    booked = self._complete_checkout(conn, event_id, username, paket, amount, currency, days,
+                                                     provider_ref, today)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                conn.close()
+        if booked:
+            self._notify_subscription(username, 'add')
+        return booked
+
+    def _complete_checkout(self, conn, event_id, username, paket, amount, currency, days, provider_ref, today):
+        """Rumpf von complete_checkout innerhalb der offenen Transaktion `conn`."""
+        row = conn.execute('SELECT status FROM webhook_events WHERE event_id = ?', (event_id,)).fetchone()
+        if row and row[0] == 'done':
+            return False
+        existing = provider_ref and conn.execute(
+            'SELECT payment_id, status FROM payments WHERE provider_ref = ?', (provider_ref,)).fetchone()
+        if existing and existing[1] != 'pending':
+            # Anderes Event zur selben Session wurde schon gebucht
+            conn.execute("UPDATE webhook_events SET status = 'done' WHERE event_id = ?", (event_id,))
+            return False
+        if existing:
+            self._rollup_payment(conn, existing[0], -1)
+            conn.execute('''
+                UPDATE payments
+                SET status = 'paid', amount = ?, currency = ?, paket = ?, timestamp = CURRENT_TIMESTAMP
+                WHERE payment_id = ?
+            ''', (amount, currency, paket, existing[0]))
+            self._rollup_payment(conn, existing[0])
+        else:
+            self._insert_payment(conn, username, amount, currency, 'paid', paket, provider_ref)
+        self._insert_booking(conn, username, paket, days, today)
+        conn.execute('UPDATE users SET paket = ? WHERE username = ?', (paket, username))
+        conn.execute("UPDATE webhook_events SET status = 'done', error = NULL WHERE event_id = ?", (event_id,))
+        return True
+
+    @staticmethod
+    def _insert_booking(conn, username, paket, days, today):
+        """Legt `days` Tage `paket` an und liefert die neue Subscription-Zeile.
+
+        Ein Upgrade (höherer Rang als das beste aktive Abo) beginnt heute,
+        sonst beginnt der Zeitraum am Ende dieses Abos.
+        """
+        cases = ' '.join('WHEN ? THEN ?' for _ in PAKET_ORDER)
+        rank_params = [value for item in PAKET_ORDER.items() for value in item]
+        return conn.execute(f'''
+            INSERT INTO subscriptions(username, paket, start_date, end_date, active)
+            SELECT ?, ?, start, date(start, '+' || ? || ' days'), 1 FROM (
+                SELECT CASE
+                    WHEN cur.end_date IS NULL OR ? > (CASE cur.paket {cases} ELSE 0 END) THEN ?
+                    ELSE cur.end_date
+                END AS start
+                FROM (SELECT 1) LEFT JOIN (
+                    SELECT paket, end_date FROM subscriptions
+                    WHERE username = ? AND active = 1 AND end_date >= ?
+                    ORDER BY end_date DESC LIMIT 1
+                ) cur
+            )
+            RETURNING sub_id, username, paket, start_date, end_date, active
+        ''', [username, paket, days, PAKET_ORDER.get(paket, 0)] + rank_params
+             + [today, username, today]).fetchone()
+
+    def get_payment_by_ref(self, provider_ref):
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute('''
+                SELECT payment_id, username, amount, currency, status, timestamp, provider_ref
+                FROM payments WHERE provider_ref = ?
+            ''', (provider_ref,)).fetchone()
 
     def get_payments_by_user(self, username):
         with self.lock, sqlite3.connect(self.db_path) as conn:
@@ -267,3 +1010,116 @@ class DBHelper:
                 FROM payments WHERE username = ?
                 ORDER BY timestamp DESC
             ''', (username,)).fetchall()
+
+    def iter_payments(self, start=None, end=None, batch_size=5000):
+        """Liefert Zahlungen sortiert nach (timestamp, payment_id), optional in [start, end).
+
+        Keyset-Pagination: jeder Batch ist eine kurze Abfrage über den Index.
+        """
+        last = (start or '', 0)
+        while True:
+            query = '''
+                SELECT payment_id, username, amount, currency, status, timestamp, paket
+                FROM payments
+                WHERE (timestamp > ? OR (timestamp = ? AND payment_id > ?))
+            '''
+            params = [last[0], last[0], last[1]]
+            if end:
+                query += ' AND timestamp < ?'
+                params.append(end)
+            query += ' ORDER BY timestamp, payment_id LIMIT ?'
+            params.append(batch_size)
+            with self.lock, sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(query, params).fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1][5], rows[-1][0])
+
+    def get_payment_rollups(self, start_day, end_day, status=None):
+        """(day, paket, currency, status, payments, amount) für start_day <= day <= end_day."""
+        query = '''
+            SELECT day, paket, currency, status, payments, amount FROM payment_rollups
+            WHERE day BETWEEN ? AND ?
+        '''
+        params = [start_day, end_day]
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return conn.execute(query + ' ORDER BY day, paket, currency, status', params).fetchall()
+
+    def replace_payment_rollups(self, start_day, end_day, rows):
+        """Ersetzt alle Rollups von start_day bis end_day (einschließlich) in einer Transaktion."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('DELETE FROM payment_rollups WHERE day BETWEEN ? AND ?', (start_day, end_day))
+            conn.executemany('''
+                INSERT INTO payment_rollups(day, paket, currency, status, payments, amount)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+
+    # --- Webhook-Queue-Methoden ---
+
+    def enqueue_webhook_event(self, event_id, provider, event_type, payload):
+        """Speichert ein verifiziertes Webhook-Event. False, wenn event_id schon bekannt ist."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            c = conn.execute('''
+                INSERT OR IGNORE INTO webhook_events(event_id, provider, event_type, payload)
+                VALUES (?, ?, ?, ?)
+            ''', (event_id, provider, event_type, payload))
+            conn.commit()
+            return c.rowcount == 1
+
+    def claim_webhook_events(self, now, limit=10):
+        """Setzt bis zu `limit` fällige pending-Events auf processing und liefert sie.
+
+        Ein einziges UPDATE ... RETURNING, damit parallele Worker (auch in
+        anderen Prozessen) nie dasselbe Event bekommen.
+        """
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute('''
+                UPDATE webhook_events SET status = 'processing', claimed_at = ?, attempts = attempts + 1
+                WHERE event_id IN (
+                    SELECT event_id FROM webhook_events
+                    WHERE status = 'pending' AND available_at <= ?
+                    ORDER BY available_at LIMIT ?
+                )
+                RETURNING event_id, provider, event_type, payload, attempts
+            ''', (now, now, limit)).fetchall()
+            conn.commit()
+            return rows
+
+    def finish_webhook_event(self, event_id):
+        """Markiert das Event als erledigt."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE webhook_events SET status = 'done', error = NULL WHERE event_id = ?", (event_id,))
+            conn.commit()
+
+    def fail_webhook_event(self, event_id, error, retry_at=None):
+        """Stellt das Event für `retry_at` zurück auf pending, ohne retry_at auf failed."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            if retry_at is None:
+                conn.execute("UPDATE webhook_events SET status = 'failed', error = ? WHERE event_id = ?",
+                             (error, event_id))
+            else:
+                conn.execute('''
+                    UPDATE webhook_events SET status = 'pending', error = ?, available_at = ?
+                    WHERE event_id = ? AND status = 'processing'
+                ''', (error, retry_at, event_id))
+            conn.commit()
+
+    def requeue_stale_webhook_events(self, claimed_before):
+        """Setzt in processing hängengebliebene Events (Worker abgestürzt) zurück auf pending, liefert die Anzahl."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            c = conn.execute('''
+                UPDATE webhook_events SET status = 'pending'
+                WHERE status = 'processing' AND claimed_at < ?
+            ''', (claimed_before,))
+            conn.commit()
+            return c.rowcount
+
+    def get_webhook_queue_stats(self):
+        """{status: Anzahl} der Webhook-Events."""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM webhook_events GROUP BY status').fetchall())
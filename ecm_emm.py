@@ -0,0 +1,191 @@
+# ecm_emm.py
+#
+# Binäre ECM/EMM-Nachrichten (Big Endian, feste Länge):
+#
+#   ECM  (57 Byte): Header | paket_id B | period I | nonce 8s | CW gerade 16s | CW ungerade 16s | MAC 8s
+#   EMM  (52 Byte): Header | address I | bitmap I | expiry I | issued I | nonce 8s | Paket-Key 16s | MAC 8s
+#   Header: table_id B | version B | section_length H (Länge ab dem Header)
+#
+# Das CW-Paar der ECM ist mit dem Paket-Key verschlüsselt, die EMM liefert
+# dem Empfänger (address = users.subscriber_id) Entitlement-Bitmap, Ablaufdatum und
+# den Paket-Key, verschlüsselt mit seinem individuellen Key. Alle Keys werden
+# per HMAC-SHA256 aus MASTER_KEY abgeleitet, die Verschlüsselung ist ein
+# HMAC-SHA256-Keystream (XOR) mit 8 Byte MAC über die ganze Nachricht.
+# Jede Nachricht trägt eine zufällige Nonce, damit nie zwei Nachrichten
+# denselben Keystream verwenden (sonst verrät ein bekanntes CW-Paar alle
+# anderen derselben Periode). Entzugs-EMMs (Bitmap 0) enthalten keinen Key.
+
+import calendar
+import datetime
+import hashlib
+import hmac
+import os
+import struct
+import time
+
+import config
+
+VERSION = 2
+ECM_TABLE_EVEN = 0x80
+ECM_TABLE_ODD = 0x81
+EMM_TABLE_UNIQUE = 0x82
+
+HEADER = struct.Struct('>BBH')
+ECM = struct.Struct('>BBHBI8s16s16s8s')
+EMM = struct.Struct('>BBHIIII8s16s8s')
+MAC_SIZE = 8
+NONCE_SIZE = 8
+
+# Paket-Kennungen und Entitlement-Bits (höhere Pakete enthalten die niedrigeren)
+PACKAGE_IDS = {'Basis': 1, 'Basis+': 2, 'Premium': 3}
+PACKAGE_BITS = {'Basis': 0b001, 'Basis+': 0b011, 'Premium': 0b111}
+
+
+class MessageError(ValueError):
+    """Nachricht hat falsche Länge, unbekannte Tabelle oder ungültige MAC."""
+
+
+def derive_key(label, master_key=None):
+    master_key = (master_key or config.MASTER_KEY).encode()
+    return hmac.digest(master_key, label.encode(), hashlib.sha256)[:16]
+
+
+def package_key(paket):
+    return derive_key(f"package:{paket}")
+
+
+def subscriber_key(address):
+    return derive_key(f"subscriber:{address}")
+
+
+def _xor(data, key, nonce):
+    stream = hmac.digest(key, b'K' + nonce, hashlib.sha256)
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(stream[:len(data)], 'big')).to_bytes(len(data), 'big')
+
+
+def _mac(key, message):
+    return hmac.digest(key, b'M' + message, hashlib.sha256)[:MAC_SIZE]
+
+
+def _check_mac(key, message):
+    if not hmac.compare_digest(_mac(key, message[:-MAC_SIZE]), message[-MAC_SIZE:]):
+        raise MessageError("MAC ungültig")
+
+
+def _parse_header(data, expected_size):
+    if len(data) != expected_size:
+        raise MessageError(f"Länge {len(data)} statt {expected_size}")
+    table_id, version, length = HEADER.unpack_from(data)
+    if version != VERSION or length != expected_size - HEADER.size:
+        raise MessageError(f"Unbekannte Version {version} oder Länge {length}")
+    return table_id
+
+
+def to_timestamp(date_str):
+    """'YYYY-MM-DD' (Enddatum inklusive) -> Unix-Zeit am Ende des Tages (UTC)."""
+    day = datetime.date.fromisoformat(date_str[:10])
+    return calendar.timegm(day.timetuple()) + 86400 - 1
+
+
+def _cw_bytes(cw):
+    return bytes.fromhex(cw) if isinstance(cw, str) else bytes(cw)
+
+
+# --- ECM ---
+
+def build_ecm(paket, period, cw_even, cw_odd):
+    """ECM for `period` carrying the even/odd control word pair of `paket`."""
+    key = package_key(paket)
+    paket_id = PACKAGE_IDS[paket]
+    table_id = ECM_TABLE_ODD if period % 2 else ECM_TABLE_EVEN
+    nonce = os.urandom(NONCE_SIZE)
+    words = _xor(_cw_bytes(cw_even) + _cw_bytes(cw_odd), key, struct.pack('>BI', paket_id, period) + nonce)
+    body = ECM.pack(table_id, VERSION, ECM.size - HEADER.size, paket_id, period, nonce,
+                    words[:16], words[16:], b'\0' * MAC_SIZE)[:-MAC_SIZE]
+    return body + _mac(key, body)
+
+
+def parse_ecm(data, paket):
+    """Decrypts an ECM with the key of `paket`. Raises MessageError if invalid."""
+    table_id = _parse_header(data, ECM.size)
+    if table_id not in (ECM_TABLE_EVEN, ECM_TABLE_ODD):
+        raise MessageError(f"Keine ECM (table_id 0x{table_id:02x})")
+    key = package_key(paket)
+    _check_mac(key, data)
+    _, _, _, paket_id, period, nonce, even, odd, _ = ECM.unpack(data)
+    words = _xor(even + odd, key, struct.pack('>BI', paket_id, period) + nonce)
+    return {'paket_id': paket_id, 'period': period, 'parity': 'odd' if table_id == ECM_TABLE_ODD else 'even',
+            'cw_even': words[:16].hex(), 'cw_odd': words[16:].hex()}
+
+
+# --- EMM ---
+
+def build_emms(subscribers, paket, issued=None):
+    """EMMs for all (address, expiry_ts) pairs of one package in a single buffer.
+
+    The package part (bitmap, package key, header) is computed once; per
+    subscriber only the individual key, nonce, keystream and MAC remain.
+    Returns a bytearray of len(subscribers) * EMM.size bytes.
+    """
+    issued = int(time.time() if issued is None else issued)
+    # paket=None: Entzug (Bitmap 0, Key-Feld bleibt leer und unverschlüsselt)
+    bitmap = PACKAGE_BITS[paket] if paket else 0
+    pkg_int = int.from_bytes(package_key(paket), 'big') if paket else None
+    master = config.MASTER_KEY.encode()
+    issued_bytes = issued.to_bytes(4, 'big')
+    nonces = os.urandom(NONCE_SIZE * len(subscribers))
+    digest, sha256, from_bytes = hmac.digest, hashlib.sha256, int.from_bytes
+    pack_into, size, body_size = EMM.pack_into, EMM.size, EMM.size - MAC_SIZE
+    length = EMM.size - HEADER.size
+    empty = bytes(16)
+
+    buf = bytearray(size * len(subscribers))
+    view = memoryview(buf)
+    offset = 0
+    for n, (address, expiry) in enumerate(subscribers):
+        key = digest(master, b'subscriber:%d' % address, sha256)[:16]
+        nonce = nonces[n * NONCE_SIZE:(n + 1) * NONCE_SIZE]
+        if pkg_int is None:
+            wrapped = empty
+        else:
+            stream = digest(key, b'K' + issued_bytes + nonce, sha256)
+            wrapped = (pkg_int ^ from_bytes(stream[:16], 'big')).to_bytes(16, 'big')
+        pack_into(buf, offset, EMM_TABLE_UNIQUE, VERSION, length, address, bitmap, expiry, issued,
+                  nonce, wrapped, b'')
+        buf[offset + body_size:offset + size] = digest(key, b'M' + view[offset:offset + body_size], sha256)[:MAC_SIZE]
+        offset += size
+    return buf
+
+
+def build_emm(address, paket, expiry, issued=None):
+    return bytes(build_emms([(address, expiry)], paket, issued))
+
+
+def parse_emm(data, address=None):
+    """Verifies and decrypts one EMM (with the key of `address`, default: its own address)."""
+    table_id = _parse_header(data, EMM.size)
+    if table_id != EMM_TABLE_UNIQUE:
+        raise MessageError(f"Keine EMM (table_id 0x{table_id:02x})")
+    _, _, _, msg_address, bitmap, expiry, issued, nonce, wrapped, _ = EMM.unpack(data)
+    key = subscriber_key(msg_address if address is None else address)
+    _check_mac(key, data)
+    package = _xor(wrapped, key, issued.to_bytes(4, 'big') + nonce).hex() if bitmap else None
+    return {'address': msg_address, 'bitmap': bitmap, 'expiry': expiry, 'issued': issued,
+            'package_key': package}
+
+
+def iter_emms(buffer):
+    """Splits a build_emms() buffer into single messages."""
+    view = memoryview(buffer)
+    for offset in range(0, len(buffer), EMM.size):
+        yield bytes(view[offset:offset + EMM.size])
+
+
+def generate_package_emms(db, paket, issued=None):
+    """EMMs for every subscriber whose best active package is `paket`. Returns (buffer, count)."""
+    subscribers = [(address, to_timestamp(end_date)) for address, _, end_date in db.get_package_subscribers(paket)]
+    return build_emms(subscribers, paket, issued), len(subscribers)
+
+
+def current_period(ts=None):
+    return int((time.time() if ts is None else ts) // config.ROTATION_INTERVAL)
@@ -1,14 +1,25 @@
 # ecm_emm_gui.py
+#
+# Oberfläche für ecm_emm.py: erzeugt ECMs aus einem CW-Paar und EMMs für alle
+# aktiven Abonnenten eines Pakets.
+
+import os
+from itertools import islice
 
 from PySide6.QtWidgets import (QWidget, QLabel, QLineEdit, QPushButton,
                                QVBoxLayout, QHBoxLayout, QMessageBox, QTextEdit)
 from PySide6.QtCore import Qt
 
+import config
+import ecm_emm
+from db_helper import DBHelper
+
 class ECMEMMWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("ECM/EMM Verwaltung")
         self.setMinimumSize(700, 500)
+        self.db = DBHelper(config.DB_PATH)
         self.init_ui()
 
     def init_ui(self):
@@ -16,10 +27,10 @@ class ECMEMMWindow(QWidget):
         self.label_title.setStyleSheet("font-size: 18px; font-weight: bold")
 
         self.input_key = QLineEdit()
-        self.input_key.setPlaceholderText("Session Key eingeben (AES-128 Hex)")
+        self.input_key.setPlaceholderText("Control Word eingeben (AES-128 Hex, leer = zufällig)")
 
         self.input_entitlement = QLineEdit()
-        self.input_entitlement.setPlaceholderText("Entitlement (z. B. Paketkennung)")
+        self.input_entitlement.setPlaceholderText("Paket (" + ", ".join(ecm_emm.PACKAGE_IDS) + ")")
 
         self.button_generate_ecm = QPushButton("ECM generieren")
         self.button_generate_ecm.clicked.connect(self.generate_ecm)
@@ -46,22 +57,38 @@ class ECMEMMWindow(QWidget):
 
         self.setLayout(layout)
 
+    def _read_paket(self):
+        paket = self.input_entitlement.text().strip()
+        if paket not in ecm_emm.PACKAGE_IDS:
+            QMessageBox.warning(self, "Fehler", "Bitte ein gültiges Paket eingeben: " + ", ".join(ecm_emm.PACKAGE_IDS))
+            return None
+        return paket
+
     def generate_ecm(self):
-        key = self.input_key.text()
-        entitlement = self.input_entitlement.text()
-        if not key or not entitlement:
-            QMessageBox.warning(self, "Fehler", "Bitte Key und Entitlement eingeben.")
+        paket = self._read_paket()
+        if not paket:
+            return
+        try:
+            cw = bytes.fromhex(self.input_key.text().strip()) or os.urandom(16)
+        except ValueError:
+            cw = b''
+        if len(cw) != 16:
+            QMessageBox.warning(self, "Fehler", "Control Word muss 16 Byte (32 Hex-Zeichen) lang sein.")
             return
-        # Platzhalter für echte ECM-Erzeugung
-        ecm = f"ECM-Block für {entitlement} mit Key {key} erzeugt."
-        self.output_box.append(ecm)
+        period = ecm_emm.current_period()
+        next_cw = os.urandom(16)
+        # Aktuelles CW in den Slot der aktuellen Parität, das nächste in den anderen
+        pair = (cw, next_cw) if period % 2 == 0 else (next_cw, cw)
+        ecm = ecm_emm.build_ecm(paket, period, *pair)
+        self.output_box.append(f"ECM {paket} Periode {period} ({len(ecm)} Byte): {ecm.hex()}")
 
     def generate_emm(self):
-        key = self.input_key.text()
-        entitlement = self.input_entitlement.text()
-        if not key or not entitlement:
-            QMessageBox.warning(self, "Fehler", "Bitte Key und Entitlement eingeben.")
+        paket = self._read_paket()
+        if not paket:
             return
-        # Platzhalter für echte EMM-Erzeugung
-        emm = f"EMM-Block für {entitlement} mit Key {key} erzeugt."
-        self.output_box.append(emm)
+        buffer, count = ecm_emm.generate_package_emms(self.db, paket)
+        self.output_box.append(f"{count} EMMs für {paket} erzeugt ({len(buffer)} Byte)")
+        for emm in islice(ecm_emm.iter_emms(buffer), 5):
+            self.output_box.append("  " + emm.hex())
+        if count > 5:
+            self.output_box.append(f"  ... {count - 5} weitere")
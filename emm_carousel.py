@@ -0,0 +1,264 @@
+# emm_carousel.py
+#
+# EMM-Karussell des Headends: wiederholt die EMMs aller Abonnenten zyklisch,
+# damit jeder Empfänger seine Entitlements irgendwann erhält. Änderungen aus
+# add_subscription/cancel_subscription/delete_user (Listener im selben
+# Prozess) und aus dem periodischen Abgleich mit der Datenbank (andere
+# Prozesse) landen in einer Prioritätswarteschlange und werden vor dem
+# regulären Umlauf gesendet. Adresse ist die stabile users.subscriber_id.
+# Die Ausgabe ist per Token Bucket auf EMM_CAROUSEL_BITRATE begrenzt.
+#
+# Speicher: drei nach Adresse sortierte arrays (9 Byte pro Abonnent), damit
+# auch Millionen Einträge in den Speicher passen.
+#
+#   python emm_carousel.py --udp 239.1.1.1:5000
+#   python emm_carousel.py --file emm.bin --seconds 60
+
+import argparse
+import heapq
+import itertools
+import socket
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+import config
+import ecm_emm
+import metrics
+from db_helper import DBHelper
+
+PRIORITY_CHANGE = 0   # Listener: add_subscription / cancel_subscription
+PRIORITY_RESYNC = 1   # beim Abgleich mit der Datenbank gefundene Änderung
+
+RANK_PAKETE = {rank: paket for paket, rank in ecm_emm.PACKAGE_IDS.items()}
+
+EMMS_SENT = metrics.REGISTRY.counter(
+    "iptv_emm_carousel_sent_total", "Gesendete EMMs", ("kind",))
+CAROUSEL_ENTRIES = metrics.REGISTRY.gauge(
+    "iptv_emm_carousel_entries", "Abonnenten im EMM-Karussell")
+CAROUSEL_PENDING = metrics.REGISTRY.gauge(
+    "iptv_emm_carousel_pending", "Priorisierte EMMs in der Warteschlange")
+CAROUSEL_CYCLE = metrics.REGISTRY.histogram(
+    "iptv_emm_carousel_cycle_seconds", "Dauer eines vollständigen Karussell-Umlaufs",
+    buckets=(1, 10, 30, 60, 300, 600, 1800, 3600, 7200, 21600))
+
+
+class EMMCarousel:
+    """Round-robin EMM carousel with a priority queue for changed entitlements."""
+
+    def __init__(self, db, bitrate=None, clock=time.monotonic):
+        self.db = db
+        self.bitrate = bitrate or config.EMM_CAROUSEL_BITRATE
+        self.clock = clock
+        self.lock = threading.Lock()
+        # Sortiert nach Adresse (users.subscriber_id); Rang 0 = Entzug wird noch ausgestrahlt
+        self.addresses = array('I')
+        self.ranks = array('B')
+        self.expiries = array('I')
+        self.cursor = 0
+        self.pending = []
+        self._queued = set()
+        self._seq = itertools.count()
+        self.tokens = 0.0
+        self._last_tick = None
+        self._cycle_start = clock()
+
+    def __len__(self):
+        return len(self.addresses)
+
+    # --- Zustand ---
+
+    def _index(self, address):
+        i = bisect_left(self.addresses, address)
+        return i if i < len(self.addresses) and self.addresses[i] == address else None
+
+    def _queue(self, address, priority):
+        if address not in self._queued:
+            self._queued.add(address)
+            heapq.heappush(self.pending, (priority, next(self._seq), address))
+
+    def update(self, address, rank, expiry, priority=PRIORITY_CHANGE):
+        """Sets the entitlement of one subscriber and queues its EMM with `priority`."""
+        with self.lock:
+            i = bisect_left(self.addresses, address)
+            if i < len(self.addresses) and self.addresses[i] == address:
+                self.ranks[i], self.expiries[i] = rank, expiry
+            else:
+                self.addresses.insert(i, address)
+                self.ranks.insert(i, rank)
+                self.expiries.insert(i, expiry)
+                if i < self.cursor:
+                    self.cursor += 1
+            self._queue(address, priority)
+            CAROUSEL_ENTRIES.set(len(self.addresses))
+            CAROUSEL_PENDING.set(len(self.pending))
+
+    def on_subscription_change(self, username, event):
+        """DBHelper subscription listener."""
+        if event == 'delete':
+            # Die Adresse des gelöschten Benutzers ist nicht mehr lesbar; der Abgleich
+            # findet sie als fehlend und strahlt den Entzug aus
+            self.resync()
+            return
+        rows = list(self.db.iter_entitlements(ecm_emm.PACKAGE_IDS, [username]))
+        if rows:
+            address, rank, end_date, _ = rows[0]
+            self.update(address, rank, ecm_emm.to_timestamp(end_date))
+            return
+        address = self.db.get_subscriber_id(username)
+        if address is not None:
+            self.update(address, 0, 0)
+
+    def resync(self):
+        """Reloads all entitlements from the database and queues every difference.
+
+        Subscribers that lost their entitlement stay in the carousel with rank 0
+        (revocation) until the next resync. Returns the number of changes.
+        """
+        addresses, ranks, expiries = array('I'), array('B'), array('I')
+        for address, rank, end_date, _ in self.db.iter_entitlements(ecm_emm.PACKAGE_IDS):
+            addresses.append(address)
+            ranks.append(rank)
+            expiries.append(ecm_emm.to_timestamp(end_date))
+
+        with self.lock:
+            old_a, old_r, old_e = self.addresses, self.ranks, self.expiries
+            merged_a, merged_r, merged_e = array('I'), array('B'), array('I')
+            changes = []
+            i = j = 0
+            while i < len(old_a) or j < len(addresses):
+                if j == len(addresses) or (i < len(old_a) and old_a[i] < addresses[j]):
+                    if old_r[i]:  # Entzug einen Resync-Zeitraum lang ausstrahlen
+                        merged_a.append(old_a[i]); merged_r.append(0); merged_e.append(0)
+                        changes.append(old_a[i])
+                    i += 1
+                    continue
+                if i < len(old_a) and old_a[i] == addresses[j]:
+                    if (old_r[i], old_e[i]) != (ranks[j], expiries[j]):
+                        changes.append(addresses[j])
+                    i += 1
+                else:
+                    changes.append(addresses[j])
+                merged_a.append(addresses[j]); merged_r.append(ranks[j]); merged_e.append(expiries[j])
+                j += 1
+            self.addresses, self.ranks, self.expiries = merged_a, merged_r, merged_e
+            if self.cursor >= len(merged_a):
+                self.cursor = 0
+            for address in changes:
+                self._queue(address, PRIORITY_RESYNC)
+            CAROUSEL_ENTRIES.set(len(merged_a))
+            CAROUSEL_PENDING.set(len(self.pending))
+        return len(changes)
+
+    # --- Ausgabe ---
+
+    def next_chunk(self, count, issued=None):
+        """Next `count` EMMs: queued changes first, then the regular round-robin."""
+        selected = []
+        with self.lock:
+            while self.pending and len(selected) < count:
+                _, _, address = heapq.heappop(self.pending)
+                self._queued.discard(address)
+                i = self._index(address)
+                if i is not None:
+                    selected.append((self.ranks[i], address, self.expiries[i]))
+            changed = len(selected)
+            total = len(self.addresses)
+            for _ in range(min(count - changed, total)):
+                i = self.cursor
+                selected.append((self.ranks[i], self.addresses[i], self.expiries[i]))
+                self.cursor = i + 1
+                if self.cursor == total:
+                    self.cursor = 0
+                    now = self.clock()
+                    CAROUSEL_CYCLE.observe(now - self._cycle_start)
+                    self._cycle_start = now
+            CAROUSEL_PENDING.set(len(self.pending))
+        EMMS_SENT.inc(("change",), changed)
+        EMMS_SENT.inc(("carousel",), len(selected) - changed)
+        return self._encode(selected, issued)
+
+    @staticmethod
+    def _encode(selected, issued):
+        by_rank = {}
+        for rank, address, expiry in selected:
+            by_rank.setdefault(rank, []).append((address, expiry))
+        out = bytearray()
+        for rank, subscribers in by_rank.items():
+            out += ecm_emm.build_emms(subscribers, RANK_PAKETE.get(rank), issued)
+        return out
+
+    def tick(self, now=None):
+        """Token bucket: returns as many EMMs as the bitrate allows since the last tick."""
+        now = self.clock() if now is None else now
+        rate = self.bitrate / 8.0
+        if self._last_tick is None:
+            self._last_tick = now
+        # Höchstens eine Sekunde Guthaben, sonst gäbe es nach Pausen einen Burst
+        self.tokens = min(max(rate, ecm_emm.EMM.size), self.tokens + (now - self._last_tick) * rate)
+        self._last_tick = now
+        count = int(self.tokens // ecm_emm.EMM.size)
+        if not count:
+            return bytearray()
+        chunk = self.next_chunk(count)
+        self.tokens -= len(chunk)
+        return chunk
+
+    def run_forever(self, sink, interval=None, resync_interval=None, stop_event=None):
+        """Calls sink(bytes) every `interval` seconds, resyncing with the database periodically."""
+        interval = config.EMM_CAROUSEL_TICK if interval is None else interval
+        resync_interval = config.EMM_CAROUSEL_RESYNC if resync_interval is None else resync_interval
+        stop_event = stop_event or threading.Event()
+        last_resync = None
+        while not stop_event.is_set():
+            now = self.clock()
+            if last_resync is None or now - last_resync >= resync_interval:
+                self.resync()
+                last_resync = now
+            chunk = self.tick(now)
+            if chunk:
+                sink(chunk)
+            stop_event.wait(interval)
+
+
+def udp_sink(host, port, per_datagram=None):
+    """Sends EMMs in UDP datagrams of at most 1316 bytes (7 TS packets)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    size = (per_datagram or 1316 // ecm_emm.EMM.size) * ecm_emm.EMM.size
+
+    def send(chunk):
+        view = memoryview(chunk)
+        for offset in range(0, len(chunk), size):
+            sock.sendto(view[offset:offset + size], (host, port))
+    return send
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EMM-Karussell mit fester Bitrate")
+    parser.add_argument('--db', default=config.DB_PATH)
+    parser.add_argument('--bitrate', type=int, default=config.EMM_CAROUSEL_BITRATE, help="Bit/s")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--udp', help="host:port")
+    target.add_argument('--file')
+    parser.add_argument('--seconds', type=float, help="Nach dieser Zeit beenden")
+    args = parser.parse_args()
+
+    db = DBHelper(args.db)
+    carousel = EMMCarousel(db, bitrate=args.bitrate)
+    db.add_subscription_listener(carousel.on_subscription_change)
+    stop = threading.Event()
+    if args.seconds:
+        threading.Timer(args.seconds, stop.set).start()
+
+    if args.udp:
+        host, port = args.udp.rsplit(':', 1)
+        carousel.run_forever(udp_sink(host, int(port)), stop_event=stop)
+    else:
+        with open(args.file, 'wb') as f:
+            carousel.run_forever(f.write, stop_event=stop)
+    print(f"{len(carousel)} Abonnenten im Karussell")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# entitlement_index.py
+#
+# Entitlement-Index im Speicher: ein bytearray mit einer Paket-Bitmaske pro
+# users.subscriber_id (Bits aus ecm_emm.PACKAGE_BITS, höhere Pakete enthalten die
+# niedrigeren). "Darf Benutzer X Kanal Y sehen" ist damit ein Index- und ein
+# Bit-Zugriff, "alle Benutzer von Paket P" ein translate() über das Array.
+#
+# Änderungen im selben Prozess kommen über den Subscription-Listener des
+# DBHelper (nur der betroffene Benutzer wird neu gelesen, auch beim Löschen),
+# Änderungen anderer Prozesse über die Versionen der Tabellen subscriptions und
+# users (data_versions). Den Neuaufbau erledigt run_forever() in einem eigenen
+# Thread; Requests lesen nur. Bis `ready` gesetzt ist, ist der Index leer.
+
+import threading
+from itertools import compress
+
+import config
+import ecm_emm
+
+# Tabellen, deren data_versions einen Neuaufbau auslösen
+SOURCE_TABLES = ('subscriptions', 'users')
+
+RANK_BITS = {rank: ecm_emm.PACKAGE_BITS[paket] for paket, rank in ecm_emm.PACKAGE_IDS.items()}
+
+
+def package_bit(paket):
+    """Bit, das genau `paket` kennzeichnet (unabhängig von der Hierarchie)."""
+    return 1 << (ecm_emm.PACKAGE_IDS[paket] - 1)
+
+
+class EntitlementIndex:
+    """Package bitmask per subscriber_id, kept in sync with the subscriptions and users tables."""
+
+    def __init__(self, db, channel_packages=None, refresh_interval=None):
+        self.db = db
+        self.channel_packages = config.CHANNEL_PACKAGES if channel_packages is None else channel_packages
+        self.refresh_interval = config.ENTITLEMENT_REFRESH if refresh_interval is None else refresh_interval
+        self.lock = threading.Lock()
+        self.masks = bytearray()
+        self.ids = {}
+        self.version = None
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self._changed = None  # während rebuild(): Benutzer, die der Listener geändert hat
+        self._channel_bits = {channel: package_bit(paket) for channel, paket in self.channel_packages.items()}
+
+    @staticmethod
+    def _set(masks, ids, subscriber_id, username, mask):
+        if subscriber_id >= len(masks):
+            # Wachstum um mindestens 50 %, damit neue Benutzer nicht jedes Mal kopieren
+            masks.extend(bytes(max(subscriber_id + 1 - len(masks), len(masks) // 2)))
+        masks[subscriber_id] = mask
+        ids[username] = subscriber_id
+
+    def _source_version(self):
+        versions = self.db.get_data_versions()
+        return tuple(versions.get(table) for table in SOURCE_TABLES)
+
+    def rebuild(self):
+        """Full reload from the database; readers see the old index until it is done.
+
+        iter_entitlements reads in chunks and releases the DB lock in between,
+        so requests are not blocked. Users changed by the listener meanwhile are
+        re-read after the swap; changes of other processes show up as a newer
+        version at the next refresh().
+        """
+        version = self._source_version()
+        with self.lock:
+            self._changed = set()
+        masks, ids = bytearray(), {}
+        try:
+            for subscriber_id, rank, _, username in self.db.iter_entitlements(ecm_emm.PACKAGE_IDS):
+                self._set(masks, ids, subscriber_id, username, RANK_BITS.get(rank, 0))
+        finally:
+            with self.lock:
+                changed, self._changed = self._changed, None
+        with self.lock:
+            self.masks, self.ids = masks, ids
+            self.version = version
+        for username in changed:
+            self._reload_user(username)
+        self.ready.set()
+
+    def refresh(self):
+        """Rebuilds if another process changed subscriptions or users. Returns True if it did."""
+        if self._source_version() == self.version:
+            return False
+        self.rebuild()
+        return True
+
+    def run_forever(self):
+        """Background thread: initial build, then a version check every refresh_interval s."""
+        while not self.stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARN] Entitlement-Index: {e}")
+            self.stopped.wait(self.refresh_interval)
+
+    def stop(self):
+        self.stopped.set()
+
+    def _reload_user(self, username):
+        rows = list(self.db.iter_entitlements(ecm_emm.PACKAGE_IDS, [username]))
+        with self.lock:
+            if self._changed is not None:
+                self._changed.add(username)
+            old = self.ids.pop(username, None)
+            if old is not None:
+                self.masks[old] = 0
+            if rows:
+                subscriber_id, rank, _, _ = rows[0]
+                self._set(self.masks, self.ids, subscriber_id, username, RANK_BITS.get(rank, 0))
+
+    def on_subscription_change(self, username, event):
+        """DBHelper subscription listener: re-reads only the affected user."""
+        self._reload_user(username)
+        with self.lock:
+            # Eigene Änderung: Version nachziehen, damit refresh() nicht neu aufbaut
+            if self._changed is None:
+                self.version = self._source_version()
+
+    # --- Abfragen ---
+
+    def mask_of(self, username):
+        subscriber_id = self.ids.get(username)
+        return self.masks[subscriber_id] if subscriber_id is not None else 0
+
+    def is_entitled(self, username, channel):
+        """True if the user's packages include the package of `channel` (unknown channels: False)."""
+        bit = self._channel_bits.get(channel)
+        return bit is not None and bool(self.mask_of(username) & bit)
+
+    def channels_for(self, username):
+        mask = self.mask_of(username)
+        return [channel for channel, bit in self._channel_bits.items() if mask & bit]
+
+    def _flags(self, paket):
+        """bytes with 1 at every subscriber_id entitled to `paket`, 0 elsewhere."""
+        bit = package_bit(paket)
+        table = bytes(1 if mask & bit else 0 for mask in range(256))
+        with self.lock:
+            return self.masks.translate(table)
+
+    def users_of(self, paket):
+        """All subscriber ids entitled to `paket` (including higher packages), ascending."""
+        flags = self._flags(paket)
+        return list(compress(range(len(flags)), flags))
+
+    def count(self, paket):
+        return self._flags(paket).count(1)
+
+    def filter_playlist(self, username, m3u):
+        """Drops #EXTINF entries (and their URL line) of channels the user is not entitled to.
+
+        The channel is taken from the tvg-id attribute; entries without one stay.
+        """
+        mask = self.mask_of(username)
+        out, skip = [], False
+        for line in m3u.splitlines():
+            if line.startswith('#EXTINF'):
+                channel = _tvg_id(line)
+                bit = self._channel_bits.get(channel) if channel else None
+                skip = channel is not None and not (bit and mask & bit)
+                if skip:
+                    continue
+            elif skip:
+                # Zusatzzeilen (#EXTVLCOPT, ...) und die URL des Eintrags ebenfalls entfernen
+                if line and not line.startswith('#'):
+                    skip = False
+                continue
+            out.append(line)
+        return '\n'.join(out) + '\n'
+
+
+def _tvg_id(extinf):
+    start = extinf.find('tvg-id="')
+    if start < 0:
+        return None
+    start += len('tvg-id="')
+    return extinf[start:extinf.find('"', start)]
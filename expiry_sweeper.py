@@ -0,0 +1,108 @@
+# expiry_sweeper.py
+#
+# Deaktiviert abgelaufene Subscriptions (end_date vor heute) in Batches über
+# den Index idx_subscriptions_due. Betroffene Benutzer gehen an die
+# Subscription-Listener des DBHelper (Entitlement-Index, EMM-Karussell), andere
+# Prozesse sehen die Änderung über data_versions. Statt zu pollen schläft der
+# Sweeper bis zum nächsten fälligen end_date; neue Subscriptions im selben
+# Prozess wecken ihn auf, damit ein früheres Enddatum nicht verpasst wird.
+#
+#   python expiry_sweeper.py           # ein Durchlauf
+#   python expiry_sweeper.py --loop
+
+import argparse
+import datetime
+import threading
+import time
+
+import config
+import metrics
+from db_helper import DBHelper
+
+SUBSCRIPTIONS_EXPIRED = metrics.REGISTRY.counter(
+    "iptv_subscriptions_expired_users_total", "Benutzer, deren Subscriptions der Sweeper deaktiviert hat")
+NEXT_SWEEP = metrics.REGISTRY.gauge(
+    "iptv_expiry_next_sweep_timestamp", "Geplanter nächster Lauf des Expiry-Sweepers (Unix-Zeit)")
+
+
+class ExpirySweeper:
+    """Deactivates expired subscriptions and sleeps until the next due date."""
+
+    def __init__(self, db, batch_size=None, max_sleep=None, retry=None, clock=time.time):
+        self.db = db
+        self.batch_size = batch_size or config.EXPIRY_SWEEP_BATCH
+        self.max_sleep = config.EXPIRY_SWEEP_MAX_SLEEP if max_sleep is None else max_sleep
+        self.retry = config.EXPIRY_SWEEP_RETRY if retry is None else retry
+        self.clock = clock
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+
+    def today(self):
+        return datetime.date.fromtimestamp(self.clock()).isoformat()
+
+    def run_once(self):
+        """Expires everything that is due. Returns the affected usernames."""
+        today, expired = self.today(), []
+        while True:
+            usernames = self.db.expire_subscriptions(today, self.batch_size)
+            if not usernames:
+                break
+            expired.extend(usernames)
+            SUBSCRIPTIONS_EXPIRED.inc(amount=len(usernames))
+        return expired
+
+    def next_wakeup(self):
+        """Unix time at which the next subscription expires (start of the day after end_date).
+
+        Capped at max_sleep, so subscriptions added by other processes are picked up too.
+        """
+        now = self.clock()
+        latest = now + self.max_sleep
+        end_date = self.db.get_next_expiry()
+        if end_date is None:
+            return latest
+        day_after = datetime.date.fromisoformat(end_date[:10]) + datetime.timedelta(days=1)
+        due = time.mktime(day_after.timetuple())
+        return min(max(due, now), latest)
+
+    def on_subscription_change(self, username, event):
+        """DBHelper subscription listener: a new subscription may expire earlier."""
+        if event == 'add':
+            self.wake.set()
+
+    def run_forever(self):
+        while not self.stopped.is_set():
+            self.wake.clear()
+            try:
+                self.run_once()
+                wakeup = self.next_wakeup()
+            except Exception as e:
+                # z.B. DB gesperrt: Thread am Leben lassen, nach `retry` Sekunden erneut
+                print(f"[WARN] Expiry-Sweeper: {e}")
+                wakeup = self.clock() + self.retry
+            NEXT_SWEEP.set(wakeup)
+            self.wake.wait(max(0.0, wakeup - self.clock()))
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Abgelaufene Subscriptions deaktivieren")
+    parser.add_argument('--db', default=config.DB_PATH)
+    parser.add_argument('--loop', action='store_true', help="Dauerhaft laufen, bis zum nächsten Ablauf schlafen")
+    args = parser.parse_args()
+
+    sweeper = ExpirySweeper(DBHelper(args.db))
+    if args.loop:
+        sweeper.run_forever()
+        return
+    expired = sweeper.run_once()
+    print(f"{len(expired)} Benutzer mit abgelaufenen Subscriptions deaktiviert")
+    wakeup = datetime.datetime.fromtimestamp(sweeper.next_wakeup())
+    print(f"Nächster Ablauf: {wakeup:%Y-%m-%d %H:%M}")
+
+
+if __name__ == '__main__':
+    main()
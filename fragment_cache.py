@@ -0,0 +1,34 @@
+# fragment_cache.py
+
+import threading
+from markupsafe import Markup
+from metrics import CACHE_REQUESTS
+
+
+class FragmentCache:
+    """Caches rendered HTML fragments keyed by a data version counter."""
+
+    def __init__(self, name="fragments"):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._hit = (name, "hit")
+        self._miss = (name, "miss")
+
+    def get(self, name, version, render):
+        """Return the cached fragment `name` or re-render it when `version` changed."""
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == version:
+            CACHE_REQUESTS.inc(self._hit)
+            return entry[1]
+        CACHE_REQUESTS.inc(self._miss)
+        html = Markup(render())
+        with self._lock:
+            self._entries[name] = (version, html)
+        return html
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
@@ -0,0 +1,161 @@
+# gui_workers.py
+#
+# Datenzugriff der Qt-Fenster außerhalb des GUI-Threads. DBHelper-Abfragen
+# laufen als QRunnable im QThreadPool, Ergebnisse kommen per Signal zurück in
+# den GUI-Thread. Anfragen haben einen Schlüssel (z.B. "users"); eine neue
+# Anfrage mit demselben Schlüssel bricht die alte ab, verspätete Ergebnisse
+# veralteter Anfragen werden verworfen.
+#
+# Große Tabellen laden seitenweise (user_admin.UserTableModel), jede Seite
+# ist eine eigene Anfrage.
+#
+# Dauerläufer wie die Schlüsselrotation laufen als RotationWorker in einem
+# eigenen QThread (QTimer statt sleep) und melden Log-Zeilen gesammelt per
+# Signal; Widgets werden nur im GUI-Thread angefasst.
+
+from PySide6.QtCore import QObject, QRunnable, QThread, QThreadPool, QTimer, Signal, Slot
+
+MAX_TIMER_WAIT = 60   # Sekunden; Uhrsprünge (Standby) werden spätestens danach bemerkt
+
+
+class _Task(QRunnable):
+    def __init__(self, loader, key, generation, fn, args):
+        super().__init__()
+        self.loader = loader
+        self.key = key
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+        emit = self.loader._delivered.emit
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            if not self.cancelled:
+                emit(self.key, self.generation, 'error', str(e))
+            return
+        if not self.cancelled:
+            emit(self.key, self.generation, 'result', result)
+
+
+class DataLoader(QObject):
+    """Runs DBHelper calls in a thread pool and delivers results on the GUI thread."""
+
+    _delivered = Signal(str, int, str, object)
+
+    def __init__(self, pool=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self.tasks = {}
+        self.callbacks = {}
+        self.generation = 0
+        # Queued Connection: der Slot läuft im Thread des Loaders (GUI-Thread)
+        self._delivered.connect(self._deliver)
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None):
+        """Runs fn(*args) off the GUI thread; on_result(result) / on_error(message) on the GUI thread."""
+        self.cancel(key)
+        self.generation += 1
+        task = _Task(self, key, self.generation, fn, args)
+        self.tasks[key] = task
+        self.callbacks[key] = {'result': on_result, 'error': on_error}
+        self.pool.start(task)
+
+    def cancel(self, key):
+        task = self.tasks.pop(key, None)
+        self.callbacks.pop(key, None)
+        if task:
+            task.cancelled = True
+            # Noch nicht gestartete Tasks gar nicht erst laufen lassen
+            self.pool.tryTake(task)
+
+    def is_running(self, key):
+        return key in self.tasks
+
+    def shutdown(self):
+        """Cancels everything (call from closeEvent, before the window goes away)."""
+        for key in list(self.tasks):
+            self.cancel(key)
+
+    @Slot(str, int, str, object)
+    def _deliver(self, key, generation, kind, payload):
+        task = self.tasks.get(key)
+        if task is None or task.generation != generation:
+            return  # veraltete oder abgebrochene Anfrage
+        callbacks = self.callbacks[key]
+        del self.tasks[key], self.callbacks[key]
+        callback = callbacks.get(kind)
+        if callback:
+            callback(payload)
+
+
+class RotationWorker(QObject):
+    """Drives a RotationScheduler from a QTimer on its own QThread.
+
+    `make_scheduler()` builds the scheduler on the worker thread (its
+    constructor reads and writes the cursor in the database). The scheduler's
+    rotate callback runs on the worker thread and reports via log(line); the
+    lines of one run are emitted together through `lines`.
+    """
+
+    lines = Signal(list)
+
+    def __init__(self, make_scheduler):
+        super().__init__()
+        self.make_scheduler = make_scheduler
+        self.scheduler = None
+        self.pending = []
+        self.timer = None
+        self.thread = None
+
+    def log(self, line):
+        self.pending.append(line)
+
+    def start(self):
+        """Moves the worker to a new QThread and starts scheduling there."""
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self._begin)
+        self.thread.finished.connect(self._end)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            self.thread.quit()
+            self.thread.wait()
+            self.thread = None
+
+    @Slot()
+    def _begin(self):
+        try:
+            self.scheduler = self.make_scheduler()
+        except Exception as e:
+            self.lines.emit([f"[Fehler] Schlüsselrotation nicht gestartet: {e}"])
+            return
+        # Timer im Worker-Thread anlegen, damit er dort feuert
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._run)
+        self._run()
+
+    @Slot()
+    def _end(self):
+        # Letztes Signal aus dem Worker-Thread: Timer dort stoppen, wo er lebt
+        if self.timer:
+            self.timer.stop()
+
+    @Slot()
+    def _run(self):
+        try:
+            self.scheduler.run_pending()
+        except Exception as e:
+            self.pending.append(f"[Fehler] Schlüsselrotation: {e}")
+        if self.pending:
+            self.lines.emit(self.pending)
+            self.pending = []
+        wait = min(max(0.0, self.scheduler.next_due() - self.scheduler.clock()), MAX_TIMER_WAIT)
+        self.timer.start(int(wait * 1000))
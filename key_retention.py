@@ -0,0 +1,116 @@
+# key_retention.py
+#
+# Retention für die keys-Tabelle: jede Rotation hängt Control Words an, ohne
+# dass alte je gelöscht werden. Abgelaufene Keys (valid_until älter als die
+# Grace-Zeit) werden in kleinen Batches nach keys_archive verschoben, danach
+# gibt PRAGMA incremental_vacuum freie Seiten an das Dateisystem zurück.
+#
+#   python key_retention.py              # ein Durchlauf
+#   python key_retention.py --loop       # alle KEY_RETENTION_INTERVAL Sekunden
+#   python key_retention.py --convert    # bestehende DB einmalig auf incremental vacuum umstellen
+
+import argparse
+import datetime
+import threading
+import time
+
+import config
+import metrics
+from db_helper import DBHelper
+
+KEYS_ARCHIVED = metrics.REGISTRY.counter(
+    "iptv_keys_archived_total", "Ins Archiv verschobene abgelaufene Keys")
+PAGES_RECLAIMED = metrics.REGISTRY.counter(
+    "iptv_db_reclaimed_pages_total", "Per incremental_vacuum freigegebene Datenbankseiten")
+TABLE_ROWS = metrics.REGISTRY.gauge(
+    "iptv_db_table_rows", "Zeilen pro Tabelle", ("table",))
+DB_PAGES = metrics.REGISTRY.gauge(
+    "iptv_db_pages", "Seiten der Datenbankdatei", ("kind",))
+RETENTION_DURATION = metrics.REGISTRY.histogram(
+    "iptv_key_retention_duration_seconds", "Laufzeit eines Retention-Durchlaufs")
+
+
+class KeyRetention:
+    """Archives expired keys in batches and compacts the database file."""
+
+    def __init__(self, db, grace=None, batch_size=None, pause=None, vacuum_pages=None,
+                 clock=time.time):
+        self.db = db
+        self.grace = config.KEY_RETENTION_GRACE if grace is None else grace
+        self.batch_size = batch_size or config.KEY_RETENTION_BATCH
+        self.pause = config.KEY_RETENTION_PAUSE if pause is None else pause
+        self.vacuum_pages = config.KEY_VACUUM_PAGES if vacuum_pages is None else vacuum_pages
+        self.clock = clock
+
+    def cutoff(self):
+        return datetime.datetime.utcfromtimestamp(self.clock() - self.grace).isoformat()
+
+    def run_once(self, stop_event=None):
+        """One pass: archive all expired keys batch by batch, then vacuum. Returns stats."""
+        start = time.perf_counter()
+        cutoff = self.cutoff()
+        archived = 0
+        while stop_event is None or not stop_event.is_set():
+            moved = self.db.archive_expired_keys(cutoff, self.batch_size)
+            archived += moved
+            KEYS_ARCHIVED.inc(amount=moved)
+            if moved < self.batch_size:
+                break
+            # Lock zwischen den Batches freigeben, damit Requests durchkommen
+            time.sleep(self.pause)
+        reclaimed = self.db.incremental_vacuum(self.vacuum_pages) if archived else 0
+        PAGES_RECLAIMED.inc(amount=reclaimed)
+        stats = self.db.get_storage_stats()
+        self.update_gauges(stats)
+        RETENTION_DURATION.observe(time.perf_counter() - start)
+        stats.update(archived=archived, reclaimed_pages=reclaimed, cutoff=cutoff)
+        return stats
+
+    @staticmethod
+    def update_gauges(stats):
+        TABLE_ROWS.set(stats['keys'], ("keys",))
+        TABLE_ROWS.set(stats['keys_archive'], ("keys_archive",))
+        DB_PAGES.set(stats['page_count'], ("total",))
+        DB_PAGES.set(stats['freelist_count'], ("free",))
+
+    def run_forever(self, interval=None, stop_event=None):
+        interval = config.KEY_RETENTION_INTERVAL if interval is None else interval
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.run_once(stop_event)
+            except Exception as e:
+                # Fehler nur protokollieren, der nächste Durchlauf folgt nach `interval`
+                print(f"[WARN] Key-Retention: {e}")
+            stop_event.wait(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Abgelaufene Keys archivieren und Datenbank kompaktieren")
+    parser.add_argument('--db', default=config.DB_PATH)
+    parser.add_argument('--grace', type=int, default=config.KEY_RETENTION_GRACE, help="Sekunden nach Ablauf")
+    parser.add_argument('--batch-size', type=int, default=config.KEY_RETENTION_BATCH)
+    parser.add_argument('--loop', action='store_true', help="Dauerhaft im Intervall laufen")
+    parser.add_argument('--convert', action='store_true',
+                        help="Einmaliges VACUUM, um eine bestehende DB auf auto_vacuum=INCREMENTAL umzustellen")
+    args = parser.parse_args()
+
+    db = DBHelper(args.db)
+    if args.convert:
+        db.convert_to_incremental_vacuum()
+    retention = KeyRetention(db, grace=args.grace, batch_size=args.batch_size)
+    if args.loop:
+        retention.run_forever()
+        return
+    stats = retention.run_once()
+    size_mb = stats['page_count'] * stats['page_size'] / 1e6
+    print(f"{stats['archived']} Keys archiviert (älter als {stats['cutoff']}), "
+          f"{stats['reclaimed_pages']} Seiten freigegeben")
+    print(f"keys: {stats['keys']} Zeilen, Archiv: {stats['keys_archive']} Zeilen, "
+          f"Datei: {size_mb:.1f} MB, frei: {stats['freelist_count']} Seiten")
+    if not stats['auto_vacuum']:
+        print("Hinweis: auto_vacuum ist aus, freie Seiten werden nur wiederverwendet (--convert)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,45 @@
 import sys
-import threading
-import time
-from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget,
-    QPushButton, QComboBox, QTextEdit, QListWidget, QListWidgetItem,
-    QFileDialog, QMessageBox, QInputDialog, QHBoxLayout
-)
+import startup_timing
+
+with startup_timing.measure("import", "PySide6.QtWidgets"):
+    from PySide6.QtWidgets import (
+        QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget,
+        QPushButton, QComboBox, QPlainTextEdit, QListWidget, QListWidgetItem,
+        QFileDialog, QMessageBox, QInputDialog, QHBoxLayout
+    )
+    from PySide6.QtCore import QTimer
 from configparser import ConfigParser
 import os
 
-from user_admin import UserAdminWindow
-from ecm_emm_gui import ECMEMMWindow
-from playlist_editor import PlaylistEditor
-from dashboard_gui import DashboardWindow
-from aes_hls import AESHLSManager
-from db_helper import DBHelper
+# Fenster (user_admin, ecm_emm_gui, playlist_editor, dashboard_gui mit
+# QtWebEngine) und aes_hls werden erst beim ersten Gebrauch importiert.
+with startup_timing.measure("import", "db_helper, rotation, workers"):
+    from db_helper import DBHelper
+    from rotation_scheduler import RotationScheduler
+    from gui_workers import DataLoader, RotationWorker
 
 CONFIG_PATH = "config/config.ini"
 
+# Maximale Zeilen im DRM-Log; ältere Zeilen fallen vorne heraus
+LOG_MAX_LINES = 5000
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("IPTV CAS Studio")
         self.setGeometry(200, 200, 1100, 800)
         self.drm_output = None
-        self.db = DBHelper()
+        self.rotation_worker = None
+        # Schema wird im Hintergrund angelegt, danach Watermarks laden und Rotation starten
+        self.db = DBHelper(create_tables=False)
+        self.loader = DataLoader(parent=self)
         self.init_ui()
         self.load_config()
+        self.loader.submit("schema", self.db.ensure_schema, on_result=self.database_ready,
+                           on_error=lambda msg: QMessageBox.critical(self, "Datenbankfehler", msg))
+
+    def database_ready(self, _):
+        self.load_watermarks()
         self.start_key_rotation()
 
     def init_ui(self):
@@ -65,8 +78,9 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(btn_layout)
 
         # DRM-Log Ausgabe
-        self.drm_output = QTextEdit()
+        self.drm_output = QPlainTextEdit()
         self.drm_output.setReadOnly(True)
+        self.drm_output.setMaximumBlockCount(LOG_MAX_LINES)
         self.drm_output.setPlaceholderText("DRM-Log erscheint hier…")
         main_layout.addWidget(self.drm_output)
 
@@ -89,8 +103,6 @@ class MainWindow(QMainWindow):
         self.wm_list = QListWidget()
         main_layout.addWidget(self.wm_list)
 
-        self.load_watermarks()
-
         container = QWidget()
         container.setLayout(main_layout)
         self.setCentralWidget(container)
@@ -116,44 +128,62 @@ class MainWindow(QMainWindow):
             self.config.write(f)
         print(f"Sprache geändert zu: {selected}")
 
+    def _open_window(self, attr, module_name, class_name, *args):
+        """Importiert das Fenster-Modul beim ersten Öffnen und zeigt ein neues Fenster."""
+        window_class = getattr(startup_timing.import_module(module_name), class_name)
+        with startup_timing.measure("construct", class_name):
+            window = window_class(*args)
+        setattr(self, attr, window)
+        window.show()
+        startup_timing.report(f"{class_name} geöffnet")
+
     def open_user_admin(self):
-        self.user_admin_window = UserAdminWindow()
-        self.user_admin_window.show()
+        self._open_window("user_admin_window", "user_admin", "UserAdminWindow", self.db)
 
     def open_ecm_emm(self):
-        self.ecm_emm_window = ECMEMMWindow()
-        self.ecm_emm_window.show()
+        self._open_window("ecm_emm_window", "ecm_emm_gui", "ECMEMMWindow")
 
     def open_drm_manager(self):
-        drm = AESHLSManager()
+        drm = startup_timing.import_module("aes_hls").AESHLSManager()
         key = drm.generate_key()
         keyinfo = drm.write_keyinfo()
-        self.drm_output.append(f"Neuer Key generiert: {key}")
-        self.drm_output.append(f"Keyinfo-Datei: {keyinfo}\n")
+        self.drm_output.appendPlainText(f"Neuer Key generiert: {key}")
+        self.drm_output.appendPlainText(f"Keyinfo-Datei: {keyinfo}\n")
 
     def open_playlist_manager(self):
-        self.playlist_window = PlaylistEditor()
-        self.playlist_window.show()
+        self._open_window("playlist_window", "playlist_editor", "PlaylistEditor")
 
     def open_dashboard(self):
-        self.dashboard_window = DashboardWindow()
-        self.dashboard_window.show()
+        self._open_window("dashboard_window", "dashboard_gui", "DashboardWindow")
 
     def start_key_rotation(self):
-        def rotate_loop():
-            interval = int(self.config.get("DRM", "Key_Rotation_Minuten", fallback="60"))
-            drm = AESHLSManager()
-            while True:
-                time.sleep(interval * 60)
-                path = drm.rotate_key()
-                if self.drm_output:
-                    self.drm_output.append(f"[Auto] Neuer Schlüssel gespeichert: {path}")
-        thread = threading.Thread(target=rotate_loop, daemon=True)
-        thread.start()
+        interval = int(self.config.get("DRM", "Key_Rotation_Minuten", fallback="60"))
+        drm = startup_timing.import_module("aes_hls").AESHLSManager()
+
+        def rotate(keys):
+            # Läuft im Rotations-Thread: nur sammeln, angezeigt wird im GUI-Thread
+            path = drm.rotate_key()
+            self.rotation_worker.log(f"[Auto] Neuer Schlüssel gespeichert: {path}")
+
+        def make_scheduler():
+            # Ein Slot pro Intervall; der Cursor in der DB verhindert eine Sofort-Rotation nach Neustart.
+            # Läuft im Rotations-Thread, der Konstruktor liest und schreibt den Cursor.
+            return RotationScheduler(self.db, "studio_hls", interval * 60, 1,
+                                     list_keys=lambda: ["hls"], rotate=rotate)
+
+        self.rotation_worker = RotationWorker(make_scheduler)
+        self.rotation_worker.lines.connect(self.append_log)
+        self.rotation_worker.start()
+
+    def append_log(self, lines):
+        self.drm_output.appendPlainText("\n".join(lines))
 
     def load_watermarks(self):
+        self.loader.submit("watermarks", self.db.get_watermarks, on_result=self.show_watermarks,
+                           on_error=lambda msg: QMessageBox.critical(self, "Fehler beim Laden", msg))
+
+    def show_watermarks(self, watermarks):
         self.wm_list.clear()
-        watermarks = self.db.get_watermarks()
         for wm in watermarks:
             visible_text = "Ja" if wm[4] else "Nein"
             item_text = f"ID: {wm[0]} | {wm[1]} | Position: {wm[3]} | Sichtbar: {visible_text}"
@@ -182,8 +212,8 @@ class MainWindow(QMainWindow):
             if not ok:
                 position = "bottom-right"
 
-            self.db.add_watermark(name.strip(), save_path, position, True)
-            self.load_watermarks()
+            self.loader.submit("add_watermark", self.db.add_watermark, name.strip(), save_path, position, True,
+                               on_result=lambda _: self.load_watermarks())
 
     def toggle_visibility(self):
         item = self.wm_list.currentItem()
@@ -191,20 +221,33 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Hinweis", "Bitte zuerst ein Watermark auswählen.")
             return
         wm_id = item.data(1000)
-        watermarks = self.db.get_watermarks()
-        visible = None
-        for wm in watermarks:
-            if wm[0] == wm_id:
-                visible = wm[4]
-                break
-        if visible is None:
+        self.loader.submit("toggle_watermark", self._toggle_watermark, wm_id, on_result=self.watermark_toggled)
+
+    def _toggle_watermark(self, wm_id):
+        # Läuft im Worker-Thread: nur dieses Watermark lesen statt aller
+        wm = self.db.get_watermark(wm_id)
+        if wm is None:
+            return False
+        self.db.update_watermark(wm_id, visible=not wm[4])
+        return True
+
+    def watermark_toggled(self, found):
+        if not found:
             QMessageBox.warning(self, "Fehler", "Watermark nicht gefunden.")
             return
-        self.db.update_watermark(wm_id, visible=not visible)
         self.load_watermarks()
 
+    def closeEvent(self, event):
+        self.loader.shutdown()
+        if self.rotation_worker:
+            self.rotation_worker.stop()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = MainWindow()
+    with startup_timing.measure("construct", "MainWindow"):
+        window = MainWindow()
     window.show()
+    # Nach dem ersten Durchlauf der Event-Loop ist das Fenster gezeichnet
+    QTimer.singleShot(0, lambda: startup_timing.report("Hauptfenster sichtbar"))
     sys.exit(app.exec())
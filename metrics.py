@@ -0,0 +1,242 @@
+# metrics.py
+#
+# Gemeinsame Instrumentierung für cas_api, admin_dashboard, self_service und
+# payment_api. Zähler und Histogramme liegen prozesslokal im Speicher und
+# werden im Prometheus-Textformat unter /metrics ausgeliefert, nur an
+# METRICS_ALLOWED_ADDRS oder mit "Authorization: Bearer <METRICS_TOKEN>".
+
+import bisect
+import hmac
+import threading
+import time
+from functools import wraps
+
+import config
+
+# Latenz-Buckets in Sekunden
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = list(zip(labelnames, labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monoton steigender Zähler, optional mit Labels (als Tupel übergeben)."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Momentanwert, kann gesetzt oder verändert werden."""
+
+    kind = "gauge"
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """Histogramm mit festen Buckets; ein Sample kostet ein bisect und drei Additionen."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [Bucket-Zähler..., +Inf-Zähler, Summe]
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, labels=()):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def time(self, labels=()):
+        """Decorator, der die Laufzeit der Funktion als Sample erfasst."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, labels)
+            return wrapper
+        return decorator
+
+    def collect(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            plain = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{plain} {_format_value(series[-1])}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Alle Metriken im Prometheus-Textformat."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "iptv_http_requests_total", "HTTP-Requests je Service, Endpoint und Status",
+    ("service", "endpoint", "method", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "iptv_http_request_duration_seconds", "Latenz der HTTP-Requests je Endpoint",
+    ("service", "endpoint"))
+DB_CALLS = REGISTRY.counter(
+    "iptv_db_calls_total", "Aufrufe je DBHelper-Methode", ("method",))
+DB_LATENCY = REGISTRY.histogram(
+    "iptv_db_call_duration_seconds", "Dauer je DBHelper-Methode", ("method",))
+CACHE_REQUESTS = REGISTRY.counter(
+    "iptv_cache_requests_total", "Cache-Zugriffe je Cache und Ergebnis (hit/miss)", ("cache", "result"))
+ROTATION_PASS = REGISTRY.histogram(
+    "iptv_key_rotation_pass_duration_seconds",
+    "Laufzeit eines Key-Rotationsdurchlaufs über alle Schlüssel (Timing Wheel: Summe der Ticks eines Umlaufs)",
+    ("source",),
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+
+def instrument_db(db):
+    """Wraps the public methods of a DBHelper instance with call counters and timings."""
+    for name in dir(type(db)):
+        if name.startswith("_"):
+            continue
+        method = getattr(db, name)
+        if not callable(method):
+            continue
+        setattr(db, name, _timed_db_call(name, method))
+    return db
+
+
+def _timed_db_call(name, method):
+    labels = (name,)
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - start, labels)
+            DB_CALLS.inc(labels)
+    return wrapper
+
+
+def scrape_allowed(f):
+    """Erlaubt /metrics nur von METRICS_ALLOWED_ADDRS oder mit 'Authorization: Bearer <METRICS_TOKEN>'."""
+    from flask import abort, request
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = config.METRICS_TOKEN
+        auth = request.headers.get("Authorization", "")
+        if request.remote_addr not in config.METRICS_ALLOWED_ADDRS and not (
+                token and hmac.compare_digest(auth, f"Bearer {token}")):
+            abort(403, "Metrics access denied")
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def instrument_app(app, service, guard=scrape_allowed):
+    """Registers request timing hooks and the guarded /metrics endpoint on a Flask app."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            endpoint = request.endpoint or "unknown"
+            HTTP_LATENCY.observe(time.perf_counter() - start, (service, endpoint))
+            HTTP_REQUESTS.inc((service, endpoint, request.method, str(response.status_code)))
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    @guard
+    def metrics():
+        return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
+
+    return app
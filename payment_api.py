@@ -1,19 +1,20 @@
 from flask import Flask, request, jsonify, abort
 import config
+import metrics
+import profiling
+import payment_providers
 from db_helper import DBHelper
+from payment_providers import InvalidWebhook
+from webhook_queue import WebhookQueue
 
 app = Flask(__name__)
-db = DBHelper(config.DB_PATH)
+metrics.instrument_app(app, "payment_api")
+profiling.init_app(app, "payment_api")
+db = metrics.instrument_db(DBHelper(config.DB_PATH))
 
-# Payment-Adapter Loader
-if config.PAYMENT_PROVIDER == "stripe":
-    from payment_providers.stripe_adapter import StripeAdapter as PaymentAdapter
-elif config.PAYMENT_PROVIDER == "paypal":
-    from payment_providers.paypal_adapter import PaypalAdapter as PaymentAdapter
-else:
-    raise Exception(f"Unsupported payment provider: {config.PAYMENT_PROVIDER}")
-
-payment_adapter = PaymentAdapter()
+# Payment-Adapter aus der Registry (payment_providers/__init__.py)
+payment_adapter = payment_providers.get_adapter(config.PAYMENT_PROVIDER, db)
+webhook_queue = WebhookQueue(db, payment_adapter.process_event)
 
 @app.route('/create_payment_session', methods=['POST'])
 def create_payment_session():
@@ -33,11 +34,16 @@ def create_payment_session():
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    # Der Adapter kümmert sich um die Verarbeitung und DB-Updates
+    # Nur Signatur prüfen und dauerhaft einreihen, die DB-Updates machen die Webhook-Worker
+    try:
+        event = payment_adapter.verify_webhook(request.data, request.headers.get(payment_adapter.signature_header))
+    except InvalidWebhook as e:
+        return jsonify({"error": str(e)}), 400
     try:
-        return payment_adapter.handle_webhook(request)
+        queued = webhook_queue.enqueue(event['id'], payment_adapter.name, event['type'], event)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    return jsonify({"status": "queued" if queued else "duplicate"})
 
 @app.route('/payment_status/<payment_id>', methods=['GET'])
 def payment_status(payment_id):
@@ -48,4 +54,5 @@ def payment_status(payment_id):
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    webhook_queue.start()
     app.run(host=config.HOST, port=config.PORT_PAYMENT_API, debug=True)
@@ -0,0 +1,22 @@
+# payment_providers/__init__.py
+#
+# Registry der Payment-Adapter. Module werden erst bei Bedarf importiert, damit
+# z.B. der Stub-Provider ohne installiertes stripe-Paket läuft.
+
+import importlib
+
+from payment_providers.base import InvalidWebhook, PaymentAdapter, StatusCache
+
+PROVIDERS = {
+    'stripe': ('payment_providers.stripe_adapter', 'StripeAdapter'),
+    'stub': ('payment_providers.stub_adapter', 'StubAdapter'),
+}
+
+
+def get_adapter(name, db):
+    """Instantiates the adapter registered under `name`."""
+    try:
+        module_name, class_name = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported payment provider: {name}")
+    return getattr(importlib.import_module(module_name), class_name)(db)
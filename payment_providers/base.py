@@ -0,0 +1,113 @@
+# payment_providers/base.py
+#
+# Gemeinsame Schnittstelle aller Payment-Adapter. Ein Adapter erzeugt
+# Checkout-Sessions beim Provider, prüft Webhook-Signaturen und bucht die
+# (aus der Webhook-Queue kommenden) Events. Jede Session wird sofort als
+# payments-Zeile mit Status 'pending' gespeichert; der Zahlungsstatus wird
+# lokal über payments.provider_ref nachgeschlagen, nicht beim Provider.
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import config
+
+# Laufzeit der Abos je Zahlungszyklus
+ZYKLUS_DAYS = {'1m': 30, '6m': 183, '12m': 365}
+
+# Endgültige Zahlungsstatus, die unbegrenzt gecacht werden dürfen
+FINAL_STATUSES = ('paid', 'refunded', 'failed')
+
+
+class InvalidWebhook(Exception):
+    """Webhook payload or signature could not be verified."""
+
+
+class StatusCache:
+    """Small LRU cache for payment status lookups.
+
+    Final statuses stay until evicted, everything else (pending, unknown)
+    expires after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries or config.PAYMENT_STATUS_CACHE_SIZE
+        self.ttl = config.PAYMENT_STATUS_CACHE_TTL if ttl is None else ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            status, expires = entry
+            if expires is not None and expires < self.clock():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return status
+
+    def put(self, key, status):
+        expires = None if status in FINAL_STATUSES else self.clock() + self.ttl
+        with self.lock:
+            self.entries[key] = (status, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class PaymentAdapter(ABC):
+    """Base class of all payment providers (see payment_providers.get_adapter)."""
+
+    name = None
+    signature_header = None
+
+    def __init__(self, db, status_cache=None):
+        self.db = db
+        self.status_cache = status_cache or StatusCache()
+
+    @abstractmethod
+    def create_payment_session(self, username, paket, zyklus):
+        """Creates a checkout session at the provider and returns its id."""
+
+    @abstractmethod
+    def verify_webhook(self, payload, sig_header):
+        """Checks the signature and returns the event as dict (raises InvalidWebhook)."""
+
+    def register_session(self, username, paket, zyklus, session_id, currency='eur'):
+        """Stores a new checkout session as pending payment (call from create_payment_session)."""
+        self.db.add_pending_payment(username, paket, self.amount_cents(paket, zyklus) / 100.0, currency, session_id)
+        self.status_cache.put(session_id, 'pending')
+
+    def process_event(self, event):
+        """Books a queued checkout.session.completed event (Stripe-compatible shape)."""
+        if event['type'] != 'checkout.session.completed':
+            return
+        session = event['payload']['data']['object']
+        metadata = session['metadata']
+        # Zeitraum nach der Buchungsregel von DBHelper: Upgrade ab heute, sonst im Anschluss an das laufende Abo
+        self.db.complete_checkout(
+            event['event_id'], metadata['username'], metadata['paket'],
+            session['amount_total'] / 100.0, session['currency'],
+            ZYKLUS_DAYS.get(metadata['zyklus'], 365), provider_ref=session['id']
+        )
+        self.status_cache.put(session['id'], 'paid')
+
+    def check_payment_status(self, payment_id):
+        """Status of the payment with provider reference `payment_id` (indexed, cached)."""
+        status = self.status_cache.get(payment_id)
+        if status is None:
+            payment = self.db.get_payment_by_ref(payment_id)
+            status = payment[4] if payment else 'unknown'
+            self.status_cache.put(payment_id, status)
+        return status
+
+    @staticmethod
+    def amount_cents(paket, zyklus):
+        amount = config.PRICES.get(paket, {}).get(zyklus)
+        if not amount:
+            raise ValueError("Ungültiges Paket oder Zyklus")
+        return int(amount * 100)
@@ -0,0 +1,61 @@
+# payment_providers/stub_adapter.py
+#
+# Lokaler Provider ohne Netzwerk für Tests und Offline-Betrieb
+# (PAYMENT_PROVIDER = "stub"). Sessions leben im Speicher, Webhooks werden mit
+# STUB_WEBHOOK_SECRET per HMAC-SHA256 signiert und haben dasselbe Format wie
+# Stripe-Events (checkout.session.completed).
+
+import hashlib
+import hmac
+import json
+import threading
+import uuid
+
+import config
+from payment_providers.base import InvalidWebhook, PaymentAdapter
+
+
+class StubAdapter(PaymentAdapter):
+    name = 'stub'
+    signature_header = 'X-Stub-Signature'
+
+    def __init__(self, db, status_cache=None):
+        super().__init__(db, status_cache)
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def create_payment_session(self, username, paket, zyklus):
+        session_id = f"cs_stub_{uuid.uuid4().hex}"
+        with self.lock:
+            self.sessions[session_id] = {
+                'id': session_id,
+                'object': 'checkout.session',
+                'amount_total': self.amount_cents(paket, zyklus),
+                'currency': 'eur',
+                'metadata': {'username': username, 'paket': paket, 'zyklus': zyklus},
+            }
+        self.register_session(username, paket, zyklus, session_id)
+        return session_id
+
+    @staticmethod
+    def sign(payload):
+        return hmac.new(config.STUB_WEBHOOK_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+
+    def complete_session(self, session_id):
+        """Simulates the provider: returns (payload, signature) of the completion webhook."""
+        with self.lock:
+            session = self.sessions[session_id]
+        payload = json.dumps({
+            'id': f"evt_stub_{uuid.uuid4().hex}",
+            'type': 'checkout.session.completed',
+            'data': {'object': session},
+        }).encode()
+        return payload, self.sign(payload)
+
+    def verify_webhook(self, payload, sig_header):
+        if not sig_header or not hmac.compare_digest(self.sign(payload), sig_header):
+            raise InvalidWebhook('Invalid signature')
+        try:
+            return json.loads(payload)
+        except ValueError:
+            raise InvalidWebhook('Invalid payload')
@@ -0,0 +1,106 @@
+# payment_reconciliation.py
+#
+# Abgleich der Zahlungen mit den täglichen Umsatz-Rollups (payment_rollups).
+# Die Zahlungen werden zeitlich sortiert in Chunks gestreamt und pro Tag,
+# Paket, Währung und Status aufsummiert; Abweichungen zu den gespeicherten
+# Rollups werden gemeldet und mit --fix für die betroffenen Tage ersetzt.
+# Alle Tage sind UTC-Tage wie payments.timestamp (CURRENT_TIMESTAMP); Berichte
+# und Dashboard rechnen deshalb mit utc_today().
+#
+#   python payment_reconciliation.py reconcile --from 2025-01-01 --fix
+#   python payment_reconciliation.py report --days 30
+
+import argparse
+import datetime
+
+import config
+from db_helper import DBHelper
+
+AMOUNT_PRECISION = 2
+
+
+def utc_today():
+    """Current UTC day, the day boundary of payments.timestamp and the rollups."""
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+def aggregate(payments):
+    """{(day, paket, currency, status): [payments, amount]} from payment rows."""
+    totals = {}
+    for _, _, amount, currency, status, timestamp, paket in payments:
+        key = (timestamp[:10], paket or '', currency, status)
+        entry = totals.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += amount
+    return totals
+
+
+def reconcile(db, start_day=None, end_day=None, batch_size=5000, fix=False):
+    """Compares streamed payments with the stored rollups.
+
+    Returns a dict with the number of payments, the checked day range and the
+    mismatching rollup keys as (key, expected, stored). With fix=True the
+    rollups of the checked range are replaced by the recomputed ones.
+    """
+    start = start_day or ''
+    end = (datetime.date.fromisoformat(end_day) + datetime.timedelta(days=1)).isoformat() if end_day else None
+    expected = aggregate(db.iter_payments(start or None, end, batch_size))
+    count = sum(entry[0] for entry in expected.values())
+    if not expected and not (start_day and end_day):
+        return {'payments': 0, 'range': None, 'mismatches': []}
+
+    days = [key[0] for key in expected]
+    first, last = start_day or min(days), end_day or max(days)
+    stored = {row[:4]: [row[4], row[5]] for row in db.get_payment_rollups(first, last)}
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want, have = expected.get(key, [0, 0.0]), stored.get(key, [0, 0.0])
+        if want[0] != have[0] or round(want[1] - have[1], AMOUNT_PRECISION):
+            mismatches.append((key, tuple(want), tuple(have)))
+
+    if fix and mismatches:
+        db.replace_payment_rollups(first, last, [key + (entry[0], round(entry[1], AMOUNT_PRECISION))
+                                                 for key, entry in expected.items()])
+    return {'payments': count, 'range': (first, last), 'mismatches': mismatches}
+
+
+def revenue_summary(db, start_day, end_day):
+    """Paid revenue per (paket, currency) from the rollups: {key: (payments, amount)}."""
+    summary = {}
+    for _, paket, currency, _, payments, amount in db.get_payment_rollups(start_day, end_day, status='paid'):
+        count, total = summary.get((paket, currency), (0, 0.0))
+        summary[(paket, currency)] = (count + payments, total + amount)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zahlungen mit Umsatz-Rollups abgleichen")
+    parser.add_argument('--db', default=config.DB_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('reconcile')
+    rec.add_argument('--from', dest='start')
+    rec.add_argument('--to', dest='end')
+    rec.add_argument('--batch-size', type=int, default=5000)
+    rec.add_argument('--fix', action='store_true', help="Rollups im geprüften Zeitraum neu schreiben")
+    rep = sub.add_parser('report')
+    rep.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    db = DBHelper(args.db)
+    if args.command == 'reconcile':
+        result = reconcile(db, args.start, args.end, args.batch_size, args.fix)
+        print(f"{result['payments']} Zahlungen geprüft, Zeitraum {result['range']}, "
+              f"{len(result['mismatches'])} Abweichungen")
+        for key, want, have in result['mismatches'][:50]:
+            print(f"  {key}: erwartet {want}, gespeichert {have}")
+        if args.fix and result['mismatches']:
+            print("Rollups korrigiert")
+    else:
+        today = utc_today()
+        start = (today - datetime.timedelta(days=args.days - 1)).isoformat()
+        for (paket, currency), (count, amount) in sorted(revenue_summary(db, start, today.isoformat()).items()):
+            print(f"{paket or '-':<10} {currency.upper():<4} {count:6d} Zahlungen {amount:12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+# preview_wall.py
+#
+# Vorschau-Wand für viele Kanäle: statt eines interaktiven Players
+# (vlc_preview.py) wird pro Kanal ein JPEG-Standbild per ffmpeg geholt. Ein
+# begrenzter Worker-Pool holt die Bilder reihum (Round-Robin über die
+# Playlist); es sind nie mehr als `workers` Grabs gleichzeitig unterwegs.
+# Die Vorschaubilder liegen mit TTL im Speicher, höchstens eins pro Kanal.
+#
+#   python preview_wall.py playlist.m3u --out previews/           # ein Durchlauf
+#   python preview_wall.py playlist.m3u --out previews/ --loop
+
+import argparse
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import metrics
+
+PREVIEW_GRABS = metrics.REGISTRY.counter(
+    "iptv_preview_grabs_total", "Vorschau-Grabs nach Ergebnis", ("result",))
+PREVIEW_GRAB_SECONDS = metrics.REGISTRY.histogram(
+    "iptv_preview_grab_seconds", "Dauer eines Vorschau-Grabs")
+PREVIEW_CACHE_BYTES = metrics.REGISTRY.gauge(
+    "iptv_preview_cache_bytes", "Größe der gecachten Vorschaubilder")
+
+_TVG_ID = re.compile(r'tvg-id="([^"]*)"')
+
+
+class GrabError(Exception):
+    """Snapshot could not be taken."""
+
+
+def parse_playlist(text):
+    """[(channel, url)] from an M3U playlist; channel is the tvg-id, else the display name."""
+    entries, seen, channel = [], set(), None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXTINF'):
+            match = _TVG_ID.search(line)
+            channel = (match.group(1) if match else '') or line.rpartition(',')[2].strip() or None
+        elif line and not line.startswith('#'):
+            channel = channel or line
+            if channel not in seen:
+                seen.add(channel)
+                entries.append((channel, line))
+            channel = None
+    return entries
+
+
+def ffmpeg_grab(url, width=None, timeout=None):
+    """One JPEG frame of `url` (stream URL or local file), scaled to `width` pixels."""
+    width = width or config.PREVIEW_WIDTH
+    cmd = [config.FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-nostdin',
+           '-i', url, '-frames:v', '1', '-vf', f'scale={width}:-2',
+           '-f', 'image2pipe', '-c:v', 'mjpeg', '-q:v', '5', 'pipe:1']
+    timeout = timeout or config.PREVIEW_GRAB_TIMEOUT
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise GrabError(f"ffmpeg nicht gefunden: {config.FFMPEG_PATH}")
+    except subprocess.TimeoutExpired:
+        raise GrabError(f"Timeout nach {timeout} s: {url}")
+    if result.returncode or not result.stdout:
+        message = result.stderr.decode(errors='replace').strip().splitlines()
+        raise GrabError(message[-1] if message else f"ffmpeg Exit-Code {result.returncode}")
+    return result.stdout
+
+
+class ThumbnailCache:
+    """Latest thumbnail per channel, dropped `ttl` seconds after it was grabbed."""
+
+    def __init__(self, ttl=None, clock=time.monotonic):
+        self.ttl = config.PREVIEW_TTL if ttl is None else ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # channel -> (grabbed_at, jpeg), älteste zuerst
+        self.bytes = 0
+
+    def put(self, channel, data):
+        with self.lock:
+            old = self.entries.pop(channel, None)
+            if old:
+                self.bytes -= len(old[1])
+            self.entries[channel] = (self.clock(), data)
+            self.bytes += len(data)
+        PREVIEW_CACHE_BYTES.set(self.bytes)
+
+    def get(self, channel):
+        with self.lock:
+            entry = self.entries.get(channel)
+            if entry is None:
+                return None
+            if self.clock() - entry[0] < self.ttl:
+                return entry[1]
+            del self.entries[channel]
+            self.bytes -= len(entry[1])
+        PREVIEW_CACHE_BYTES.set(self.bytes)
+        return None
+
+    def discard(self, channel):
+        with self.lock:
+            entry = self.entries.pop(channel, None)
+            if entry:
+                self.bytes -= len(entry[1])
+        PREVIEW_CACHE_BYTES.set(self.bytes)
+
+    def evict_expired(self):
+        """Drops expired thumbnails (oldest first, stops at the first valid one). Returns the count."""
+        evicted, now = 0, self.clock()
+        with self.lock:
+            while self.entries:
+                channel, (grabbed_at, data) = next(iter(self.entries.items()))
+                if now - grabbed_at < self.ttl:
+                    break
+                del self.entries[channel]
+                self.bytes -= len(data)
+                evicted += 1
+        PREVIEW_CACHE_BYTES.set(self.bytes)
+        return evicted
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class PreviewWall:
+    """Keeps a thumbnail per playlist channel fresh with a bounded worker pool.
+
+    `grab(url)` returns JPEG bytes (default: ffmpeg_grab). A channel is due
+    again `refresh` seconds after its last attempt, successful or not, so
+    dead streams are not retried in a tight loop. `on_update(channel, jpeg)`
+    is called from the worker thread after every successful grab.
+    """
+
+    def __init__(self, channels, grab=ffmpeg_grab, workers=None, refresh=None, ttl=None,
+                 on_update=None, clock=time.monotonic):
+        self.grab = grab
+        self.workers = workers or config.PREVIEW_WORKERS
+        self.refresh = config.PREVIEW_REFRESH if refresh is None else refresh
+        self.on_update = on_update
+        self.clock = clock
+        self.cache = ThumbnailCache(ttl, clock)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preview')
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.in_flight = set()
+        self.attempted = {}
+        self.errors = {}
+        self.urls = {}
+        self.order = []
+        self.position = 0
+        self.set_channels(channels)
+
+    def set_channels(self, channels):
+        """Replaces the playlist; state of removed channels is dropped."""
+        urls = dict(channels)
+        with self.lock:
+            for channel in set(self.urls) - set(urls):
+                self.attempted.pop(channel, None)
+                self.errors.pop(channel, None)
+                self.cache.discard(channel)
+            self.urls, self.order = urls, list(urls)
+            self.position = 0
+
+    def _is_due(self, channel, now):
+        last = self.attempted.get(channel)
+        return channel not in self.in_flight and (last is None or now - last >= self.refresh)
+
+    def schedule(self, only=None):
+        """Submits due channels round-robin into the free worker slots. Returns them.
+
+        `only` restricts the candidates to a set of channels.
+        """
+        now, submitted = self.clock(), []
+        with self.lock:
+            free = self.workers - len(self.in_flight)
+            for _ in range(len(self.order)):
+                if free <= 0:
+                    break
+                channel = self.order[self.position]
+                self.position = (self.position + 1) % len(self.order)
+                if (only is not None and channel not in only) or not self._is_due(channel, now):
+                    continue
+                self.in_flight.add(channel)
+                self.attempted[channel] = now
+                submitted.append((channel, self.urls[channel]))
+                free -= 1
+        for channel, url in submitted:
+            self.executor.submit(self._grab, channel, url)
+        return [channel for channel, _ in submitted]
+
+    def _grab(self, channel, url):
+        start = time.perf_counter()
+        try:
+            data = self.grab(url)
+        except Exception as e:
+            self.errors[channel] = str(e)
+            PREVIEW_GRABS.inc(("error",))
+        else:
+            self.cache.put(channel, data)
+            self.errors.pop(channel, None)
+            PREVIEW_GRABS.inc(("ok",))
+            if self.on_update:
+                self.on_update(channel, data)
+        finally:
+            PREVIEW_GRAB_SECONDS.observe(time.perf_counter() - start)
+            with self.lock:
+                self.in_flight.discard(channel)
+            self.wake.set()
+
+    def thumbnail(self, channel):
+        return self.cache.get(channel)
+
+    def refresh_round(self):
+        """Grabs every due channel once and blocks until done. Returns the number of grabs.
+
+        The due channels are fixed at the start of the round; a channel that
+        becomes due again while a slow round is still running waits for the
+        next round.
+        """
+        start = self.clock()
+        with self.lock:
+            pending = {channel for channel in self.order if self._is_due(channel, start)}
+        started = set()
+        while True:
+            self.wake.clear()
+            started.update(self.schedule(pending))
+            with self.lock:
+                # Erledigt sind auch Kanäle, die seit Rundenbeginn anderweitig geholt oder entfernt wurden
+                pending = {channel for channel in pending if channel in self.urls
+                           and self.attempted.get(channel, start - 1) < start}
+                busy = bool(self.in_flight & started)
+            if not pending and not busy:
+                return len(started)
+            self.wake.wait(0.05)
+
+    def run_forever(self, poll=1.0):
+        while not self.stopped.is_set():
+            self.wake.clear()
+            self.cache.evict_expired()
+            self.schedule()
+            self.wake.wait(poll)
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vorschaubilder aller Kanäle einer Playlist erzeugen")
+    parser.add_argument('playlist')
+    parser.add_argument('--out', default='previews')
+    parser.add_argument('--workers', type=int, default=config.PREVIEW_WORKERS)
+    parser.add_argument('--loop', action='store_true', help="Dauerhaft reihum aktualisieren")
+    args = parser.parse_args()
+
+    with open(args.playlist, encoding='utf-8') as f:
+        channels = parse_playlist(f.read())
+    os.makedirs(args.out, exist_ok=True)
+
+    def write(channel, data):
+        name = re.sub(r'[^\w.-]', '_', channel)
+        with open(os.path.join(args.out, f"{name}.jpg"), 'wb') as f:
+            f.write(data)
+
+    wall = PreviewWall(channels, workers=args.workers, on_update=write)
+    print(f"[INFO] {len(channels)} Kanäle, {wall.workers} Worker")
+    try:
+        if args.loop:
+            wall.run_forever()
+        else:
+            wall.refresh_round()
+            print(f"[INFO] {len(wall.cache)} Vorschaubilder in {args.out}, {len(wall.errors)} Fehler")
+            for channel, error in sorted(wall.errors.items()):
+                print(f"  {channel}: {error}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        wall.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# profiling.py
+#
+# Opt-in Profiling-Middleware für die Flask-Apps. Ein konfigurierbarer Anteil
+# der Requests wird per Stack-Sampling aufgezeichnet und als "collapsed stack"
+# Datei (eine Zeile "frame;frame;frame anzahl") abgelegt, direkt verwendbar mit
+# flamegraph.pl oder speedscope.
+
+import itertools
+import math
+import os
+import random
+import sys
+import threading
+import time
+from functools import wraps
+
+import config
+
+
+def collapse_frame(frame):
+    """Returns the stack of `frame` as 'root;...;leaf' string."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class StackSampler:
+    """Samples the stack of one thread in a background thread until stopped."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = collapse_frame(frame)
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+
+def write_collapsed(path, samples):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in sorted(samples.items()):
+            f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    def __init__(self, service, enabled=False, sample_rate=0.01, interval=0.005, output_dir="profiles"):
+        self.service = service
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.output_dir = output_dir
+        self._seq = itertools.count(1)  # next() ist atomar, auch bei parallelen Requests
+
+    def should_sample(self):
+        return self.enabled and random.random() < self.sample_rate
+
+    def start(self):
+        return StackSampler(threading.get_ident(), self.interval).start()
+
+    def finish(self, sampler, endpoint):
+        samples = sampler.stop()
+        if not samples:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        seq = next(self._seq)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        name = f"{self.service}_{endpoint}_{stamp}_{os.getpid()}_{seq}.folded"
+        path = os.path.join(self.output_dir, name)
+        write_collapsed(path, samples)
+        return path
+
+    def status(self):
+        return {
+            "service": self.service,
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "interval": self.interval,
+            "output_dir": self.output_dir,
+        }
+
+
+def master_key_required(f):
+    """Erlaubt den Zugriff nur mit 'Authorization: Bearer <MASTER_KEY>'."""
+    from flask import abort, request
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.headers.get("Authorization", "") != f"Bearer {config.MASTER_KEY}":
+            abort(403, "Master key required")
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_app(app, service, guard=master_key_required):
+    """Installs the sampling hooks and the admin toggle endpoint on a Flask app."""
+    from flask import abort, g, jsonify, request
+
+    profiler = Profiler(
+        service,
+        enabled=config.PROFILING_ENABLED,
+        sample_rate=config.PROFILING_SAMPLE_RATE,
+        interval=config.PROFILING_INTERVAL,
+        output_dir=config.PROFILING_DIR,
+    )
+
+    @app.before_request
+    def _profiling_start():
+        if profiler.should_sample():
+            g._profiling_sampler = profiler.start()
+
+    @app.teardown_request
+    def _profiling_finish(exc=None):
+        sampler = g.pop("_profiling_sampler", None)
+        if sampler is not None:
+            profiler.finish(sampler, request.endpoint or "unknown")
+
+    @app.route("/admin/profiling", methods=["GET", "POST"], endpoint="profiling_toggle")
+    @guard
+    def profiling_toggle():
+        if request.method == "POST":
+            data = request.get_json(silent=True) or request.form
+            if "enabled" in data:
+                profiler.enabled = str(data["enabled"]).lower() in ("1", "true", "on", "yes")
+            if "sample_rate" in data:
+                try:
+                    sample_rate = float(data["sample_rate"])
+                except (TypeError, ValueError):
+                    abort(400, "Invalid sample_rate")
+                if not math.isfinite(sample_rate):
+                    abort(400, "Invalid sample_rate")
+                profiler.sample_rate = min(1.0, max(0.0, sample_rate))
+        return jsonify(profiler.status())
+
+    app.extensions["profiler"] = profiler
+    return profiler
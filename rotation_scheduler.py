@@ -0,0 +1,121 @@
+# rotation_scheduler.py
+#
+# Verteilt die Schlüsselrotation über das Rotationsintervall: ein Hashed
+# Timing Wheel mit N Slots ordnet jeden Schlüssel (Benutzer, Paket, ...) per
+# stabilem Hash einem Slot zu, jeder Tick bearbeitet nur 1/N des Keyspace.
+# Der Cursor (zuletzt bearbeiteter Tick) wird in der Datenbank gespeichert,
+# sodass ein Neustart fortsetzt statt einen kompletten Durchlauf zu starten.
+# Die Laufzeit eines ganzen Umlaufs (Summe der Ticks) geht als
+# metrics.ROTATION_PASS ein, einzelne Ticks als TICK_DURATION.
+
+import threading
+import time
+import zlib
+
+import metrics
+
+TICK_LAG = metrics.REGISTRY.histogram(
+    "iptv_rotation_tick_lag_seconds", "Verspätung eines Rotations-Ticks gegenüber dem Plan", ("scheduler",),
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0, 3600.0))
+TICK_DURATION = metrics.REGISTRY.histogram(
+    "iptv_rotation_tick_duration_seconds", "Laufzeit eines Rotations-Ticks", ("scheduler",))
+TICK_KEYS = metrics.REGISTRY.counter(
+    "iptv_rotation_keys_total", "Im Tick rotierte Schlüssel", ("scheduler",))
+TICKS_SKIPPED = metrics.REGISTRY.counter(
+    "iptv_rotation_ticks_skipped_total", "Nach langer Pause übersprungene Ticks", ("scheduler",))
+
+
+class RotationScheduler:
+    """Hashed timing wheel that rotates 1/slots of the keyspace per tick."""
+
+    def __init__(self, db, name, interval, slots, list_keys, rotate,
+                 jitter=0.0, max_catch_up=2, clock=time.time):
+        self.db = db
+        self.name = name
+        self.interval = float(interval)
+        self.slots = max(1, int(slots))
+        self.tick_length = self.interval / self.slots
+        self.list_keys = list_keys
+        self.rotate = rotate
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.max_catch_up = max(1, max_catch_up)
+        self.clock = clock
+        self._labels = (name,)
+        self._wheel = None
+        self._wheel_revolution = None
+        self._pass_seconds = 0.0  # Laufzeit der Ticks des aktuellen Umlaufs
+        cursor = db.get_scheduler_cursor(name)
+        # Erster Start: laufenden Tick als erledigt betrachten, kein Voll-Durchlauf
+        if cursor is None:
+            cursor = self.current_tick()
+            db.set_scheduler_cursor(name, cursor)
+        self.cursor = cursor
+
+    def slot_of(self, key):
+        """Stable slot for `key` (crc32, unabhängig von PYTHONHASHSEED)."""
+        return zlib.crc32(str(key).encode()) % self.slots
+
+    def current_tick(self, now=None):
+        now = self.clock() if now is None else now
+        return int(now // self.tick_length)
+
+    def scheduled_time(self, tick):
+        """Planned start of `tick`, shifted by a deterministic jitter inside the tick."""
+        offset = 0.0
+        if self.jitter:
+            offset = (zlib.crc32(f"{self.name}:{tick}".encode()) / 0x100000000) * self.jitter * self.tick_length
+        return tick * self.tick_length + offset
+
+    def next_due(self):
+        return self.scheduled_time(self.cursor + 1)
+
+    def _bucket(self, tick):
+        revolution = tick // self.slots
+        if self._wheel is None or self._wheel_revolution != revolution:
+            wheel = [[] for _ in range(self.slots)]
+            for key in self.list_keys():
+                wheel[self.slot_of(key)].append(key)
+            self._wheel, self._wheel_revolution = wheel, revolution
+        return self._wheel[tick % self.slots]
+
+    def run_pending(self, now=None):
+        """Runs all due ticks (at most max_catch_up after a pause). Returns the number of ticks run."""
+        now = self.clock() if now is None else now
+        due = self.cursor + 1
+        last_due = self.current_tick(now)
+        if self.scheduled_time(last_due) > now:  # Jitter liegt immer innerhalb des eigenen Ticks
+            last_due -= 1
+        if last_due < due:
+            return 0
+        if last_due - due + 1 > self.max_catch_up:
+            skipped = last_due - due + 1 - self.max_catch_up
+            TICKS_SKIPPED.inc(self._labels, skipped)
+            due = last_due - self.max_catch_up + 1
+        ran = 0
+        for tick in range(due, last_due + 1):
+            self._run_tick(tick, now)
+            ran += 1
+        return ran
+
+    def _run_tick(self, tick, now):
+        TICK_LAG.observe(max(0.0, now - self.scheduled_time(tick)), self._labels)
+        start = time.perf_counter()
+        keys = self._bucket(tick)
+        if keys:
+            self.rotate(keys)
+            TICK_KEYS.inc(self._labels, len(keys))
+        duration = time.perf_counter() - start
+        TICK_DURATION.observe(duration, self._labels)
+        self._pass_seconds += duration
+        if tick % self.slots == self.slots - 1:
+            # Letzter Slot: ein Umlauf über den ganzen Keyspace ist fertig
+            metrics.ROTATION_PASS.observe(self._pass_seconds, self._labels)
+            self._pass_seconds = 0.0
+        self.cursor = tick
+        self.db.set_scheduler_cursor(self.name, tick)
+
+    def run_forever(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.run_pending()
+            stop_event.wait(max(0.0, self.next_due() - self.clock()))
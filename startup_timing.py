@@ -0,0 +1,54 @@
+# startup_timing.py
+#
+# Startzeit-Messung für das Studio. Mit IPTV_STARTUP_TIMING=1 oder
+# "python main.py --startup-timing" werden Import- und Konstruktionszeiten
+# je Modul bzw. Fenster gesammelt und per report() ausgegeben (main.py nach
+# dem ersten Frame und nach dem ersten Öffnen eines Fensters). Ohne Flag
+# kosten measure() und import_module() praktisch nichts.
+# Vollständige Aufschlüsselung aller Importe: python -X importtime main.py
+
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("IPTV_STARTUP_TIMING") == "1" or "--startup-timing" in sys.argv
+
+# Referenzzeitpunkt: Import dieses Moduls (main.py importiert es zuerst)
+T0 = time.perf_counter()
+
+entries = []
+
+
+@contextmanager
+def measure(kind, name):
+    """Records the duration of the block as (kind, name, seconds)."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entries.append((kind, name, time.perf_counter() - start))
+
+
+def import_module(name):
+    """importlib.import_module with timing; already imported modules cost nothing."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with measure("import", name):
+        return importlib.import_module(name)
+
+
+def report(label, out=None):
+    """Prints the collected entries (slowest first) and clears them."""
+    if not ENABLED:
+        return
+    out = out or sys.stderr
+    print(f"[INFO] {label}: {(time.perf_counter() - T0) * 1000:.1f} ms seit Start", file=out)
+    for kind, name, seconds in sorted(entries, key=lambda entry: -entry[2]):
+        print(f"[INFO]   {kind:<9} {name:<30} {seconds * 1000:8.1f} ms", file=out)
+    entries.clear()
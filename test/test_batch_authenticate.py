@@ -0,0 +1,75 @@
+import datetime
+import hashlib
+import hmac
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+import metrics
+from db_helper import DBHelper
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_limiter")
+
+
+@pytest.fixture
+def api(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Beim Import legt cas_api seinen DBHelper an, nie auf der echten DB
+        monkeypatch.setattr(config, "DB_PATH", os.path.join(tmp_dir, 'test.db'))
+        monkeypatch.setattr(config, "LOG_FILE", os.path.join(tmp_dir, 'admin_events.log'))
+        cas_api = importlib.import_module("cas_api")
+        db = metrics.instrument_db(DBHelper(config.DB_PATH))
+        today = datetime.date.today()
+        db.add_user("alice", "", "HWID-A", "Basis", "token-a", "alice@example.com")
+        db.add_user("bob", "", "HWID-B", "Basis", "token-b", "bob@example.com")
+        db.add_subscription("alice", "Basis", today.isoformat(), (today + datetime.timedelta(days=30)).isoformat())
+        monkeypatch.setattr(cas_api, "db", db)
+        monkeypatch.setattr(cas_api.limiter, "enabled", False)
+        cas_api.app.config["TESTING"] = True
+        yield cas_api.app.test_client()
+
+
+def post(client, payload, signature=None):
+    body = json.dumps(payload)
+    if signature is None:
+        signature = hmac.new(config.API_SECRET_KEY.encode(), body.encode(), hashlib.sha256).hexdigest()
+    return client.post("/api/authenticate/batch", data=body, content_type="application/json",
+                       headers={"X-Signature": signature})
+
+
+def test_signature_covers_the_body(api):
+    assert post(api, {"devices": [{"token": "token-a"}]}, signature="0" * 64).status_code == 403
+
+
+@pytest.mark.parametrize("payload", [{}, {"devices": []}, {"devices": None}])
+def test_missing_or_empty_devices(api, payload):
+    assert post(api, payload).status_code == 400
+
+
+def test_too_many_devices(api):
+    devices = [{"token": "token-a"}] * (config.BATCH_AUTH_MAX_DEVICES + 1)
+    assert post(api, {"devices": devices}).status_code == 413
+
+
+def test_mixed_batch_in_request_order(api):
+    response = post(api, {"devices": [
+        {"hwid": "HWID-X", "token": "unbekannt"},
+        {"hwid": "HWID-A", "token": None},      # null-Token: Fallback auf die hwid
+        {"hwid": None, "token": "token-b"},     # ohne aktives Abo
+        {"hwid": "egal", "token": "token-a"},
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [(r["status"], r.get("code")) for r in results] == [
+        ("error", 404), ("ok", None), ("error", 403), ("ok", None)]
+    assert results[1]["token"] == "" and results[1]["user"]["username"] == "alice"
+    assert results[2]["hwid"] == ""
+    assert results[3]["user"]["token"] == "token-a"
+    assert results[1]["ecm_key"] == results[3]["ecm_key"]
@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_helper import DBHelper
+
+TODAY = "2030-01-01"
+
+
+@pytest.fixture
+def db_path():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'test.db')
+        DBHelper(path).add_user("alice", "", "HWID-1", "Basis", "token1", "")
+        yield path
+
+
+def test_book_subscription_period_rules(db_path):
+    db = DBHelper(db_path)
+    booked, active, user = db.book_subscription("alice", "Basis+", 30, today=TODAY)
+    assert booked[2:5] == ("Basis+", "2030-01-01", "2030-01-31")
+    assert active == booked
+    assert user[2] == "Basis+"
+
+    # Gleiches oder niedrigeres Paket schließt an das aktuelle Ende an
+    booked, active, _ = db.book_subscription("alice", "Basis", 30, today=TODAY)
+    assert booked[3:5] == ("2030-01-31", "2030-03-02")
+    assert active == booked
+
+    # Höheres Paket startet sofort
+    booked, active, user = db.book_subscription("alice", "Premium", 10, today=TODAY)
+    assert booked[3:5] == ("2030-01-01", "2030-01-11")
+    assert active[2] == "Basis" and user[2] == "Premium"
+
+    assert db.book_subscription("nobody", "Basis", 30, today=TODAY) is None
+
+
+def test_concurrent_bookings_chain_without_overlap(db_path):
+    events = []
+
+    def book():
+        # Eigene DBHelper-Instanz je Thread: kein gemeinsamer Python-Lock, nur die SQLite-Sperre
+        db = DBHelper(db_path)
+        db.add_subscription_listener(lambda username, event: events.append(event))
+        db.book_subscription("alice", "Basis", 30, today=TODAY)
+
+    threads = [threading.Thread(target=book) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    subs = sorted(DBHelper(db_path).get_active_subscriptions("alice"), key=lambda s: s[3])
+    assert len(subs) == 16 and len(events) == 16
+    assert subs[0][3] == TODAY
+    for previous, current in zip(subs, subs[1:]):
+        assert current[3] == previous[4]
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bulk_users import export_users, import_users
+from db_helper import DBHelper
+
+
+@pytest.fixture
+def tmp_dir():
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+def write_csv(path, count, bad_rows=()):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("username,hwid,paket,email\n")
+        for i in range(count):
+            hwid = "" if i in bad_rows else f"HWID-{i}"
+            f.write(f"user{i:03d},{hwid},Basis,user{i}@example.com\n")
+
+
+def test_import_generates_tokens_and_rejects_invalid_rows(tmp_dir):
+    db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+    src = os.path.join(tmp_dir, 'users.csv')
+    write_csv(src, 25, bad_rows={3})
+
+    stats = import_users(db, src, chunk_size=10)
+
+    assert stats['imported'] == 24
+    assert stats['rejected'] == 1
+    users = db.get_all_users()
+    assert len(users) == 24
+    assert len({u[3] for u in users}) == 24
+    assert all(len(u[3]) == 32 for u in users)
+    assert db.get_import_progress(os.path.abspath(src)) == 0
+
+
+def test_import_resumes_after_last_committed_chunk(tmp_dir):
+    db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+    src = os.path.join(tmp_dir, 'users.csv')
+    write_csv(src, 25)
+
+    original = db.add_users_batch
+    calls = []
+
+    def failing_batch(rows, source=None, rows_done=None):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError("Verbindung verloren")
+        return original(rows, source=source, rows_done=rows_done)
+
+    db.add_users_batch = failing_batch
+    with pytest.raises(RuntimeError):
+        import_users(db, src, chunk_size=10)
+    assert db.get_import_progress(os.path.abspath(src)) == 10
+    assert len(db.get_all_users()) == 10
+
+    db.add_users_batch = original
+    stats = import_users(db, src, chunk_size=10)
+    assert stats['resumed_at'] == 10
+    assert stats['imported'] == 15
+    assert len(db.get_all_users()) == 25
+
+
+def test_export_jsonl_streams_all_users(tmp_dir):
+    db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+    for i in range(7):
+        db.add_user(f"user{i}", "pw", f"HWID-{i}", "Premium", f"token{i}", "")
+    out = os.path.join(tmp_dir, 'users.jsonl')
+
+    assert export_users(db, out, batch_size=3) == 7
+    with open(out, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert [r['username'] for r in rows] == [f"user{i}" for i in range(7)]
+    assert 'password' not in rows[0]
+
+
+def test_jsonl_rejects_malformed_lines_and_foreign_tokens(tmp_dir):
+    db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+    db.add_user("owner", "pw", "HWID-O", "Basis", "tok-db", "")
+    src = os.path.join(tmp_dir, 'users.jsonl')
+    with open(src, 'w', encoding='utf-8') as f:
+        f.write('{"username": "a", "hwid": "H1", "token": "tok-a"}\n')
+        f.write('{"username": "b", "hwid": \n')                          # kaputtes JSON
+        f.write('["c", "H3"]\n')                                         # kein Objekt
+        f.write('{"username": "d", "hwid": "H4", "token": "tok-a"}\n')   # Token doppelt in der Datei
+        f.write('{"username": "e", "hwid": "H5", "token": "tok-db"}\n')  # Token gehört "owner"
+        f.write('{"username": 42, "hwid": 7}\n')
+
+    stats = import_users(db, src, chunk_size=10)
+
+    assert stats['imported'] == 2
+    assert stats['rejected'] == 4
+    assert [e.split(':')[0] for e in stats['errors']] == ["Zeile 2", "Zeile 3", "Zeile 4", "Zeile 5"]
+    assert db.get_user_by_token("tok-db")[0] == "owner"
+    assert db.get_user_by_token("tok-a")[0] == "a"
+    assert db.get_user_by_username("42")[1] == "7"
+
+
+def test_reimporting_an_export_keeps_passwords_and_tokens(tmp_dir):
+    db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+    for i in range(3):
+        db.add_user(f"user{i}", f"pw{i}", f"HWID-{i}", "Basis", f"token{i}", "")
+    out = os.path.join(tmp_dir, 'users.jsonl')
+    export_users(db, out)
+    with open(out, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    with open(out, 'w', encoding='utf-8') as f:
+        for row in rows:
+            row['paket'] = "Premium"
+            del row['token']
+            f.write(json.dumps(row) + '\n')
+
+    assert import_users(db, out)['imported'] == 3
+
+    with db.lock, sqlite3.connect(db.db_path) as conn:
+        users = conn.execute('SELECT username, password, paket, token FROM users ORDER BY username').fetchall()
+    assert users == [(f"user{i}", f"pw{i}", "Premium", f"token{i}") for i in range(3)]
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import db_helper
+from db_helper import DBHelper
+
+
+def test_batch_lookups_match_single_lookups(monkeypatch):
+    monkeypatch.setattr(db_helper, "IN_CHUNK", 3)  # mehrere IN-Chunks erzwingen
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(8):
+            db.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+            if i % 2 == 0:
+                db.add_subscription(f"user{i}", "Basis", "2025-01-01", "2099-01-01")
+        db.store_keys_batch([
+            ("old", "2099-01-01", "user0", "Basis", "2025-01-01T00:00:00"),
+            ("new", "2099-01-01", "user0", "Basis", "2025-01-01T01:00:00"),
+            ("next", "2099-01-01", "user0", "Basis", "2030-01-01T00:00:00"),
+        ])
+
+        tokens = [f"token{i}" for i in range(8)] + ["unknown"]
+        by_token = db.get_users_by_tokens(tokens)
+        assert set(by_token) == set(tokens[:8])
+        assert by_token["token5"] == db.get_user_by_token("token5")
+
+        by_hwid = db.get_users_by_hwids(["HWID-1", "HWID-7", "HWID-x"])
+        assert set(by_hwid) == {"HWID-1", "HWID-7"}
+
+        usernames = [f"user{i}" for i in range(8)]
+        subs = db.get_active_subscriptions_for_users(usernames)
+        assert set(subs) == {"user0", "user2", "user4", "user6"}
+        assert subs["user2"] == db.get_active_subscription("user2")
+
+        pairs = db.get_key_pairs_for_users(usernames, "2026-01-01T00:00:00", "2030-01-01T00:00:00")
+        current, upcoming = pairs["user0"]
+        assert current[1] == "new"
+        assert upcoming[1] == "next"
+        assert current[:6] == db.get_valid_key_for_user("user0")
+        assert "user1" not in pairs
+
+
+def test_store_keys_batch_keeps_first_key_per_owner_and_start():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        db.store_keys_batch([("first", "2099-01-01", "user0", "Basis", "2030-01-01T00:00:00")])
+        db.store_keys_batch([("second", "2099-01-01", "user0", "Basis", "2030-01-01T00:00:00")])
+
+        _, upcoming = db.get_key_pair("user0", "2026-01-01T00:00:00", "2030-01-01T00:00:00")
+        assert upcoming[1] == "first"
+
+
+def test_get_watermark_reads_single_row():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        db.add_watermark("logo", "/tmp/logo.png", "top-left", True)
+        db.add_watermark("sender", "/tmp/sender.png", "bottom-right", False)
+        wm_id = db.get_watermarks()[1][0]
+        assert db.get_watermark(wm_id) == db.get_watermarks()[1]
+        assert db.get_watermark(wm_id + 100) is None
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+import bench_db_helper
+from db_helper import DBHelper
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        helper = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(50):
+            helper.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+            helper.add_subscription(f"user{i}", "Basis", "2025-01-01", "2099-01-01")
+            helper.store_key(f"key{i}", "2099-01-01", f"user{i}", "Basis")
+        yield helper
+
+
+def scanned_tables(db, fn):
+    """Runs fn() and returns the tables its SQL statements scan completely."""
+    return bench_db_helper.scanned_tables(db.db_path, bench_db_helper.capture_statements(fn))
+
+
+@pytest.mark.parametrize("call", [
+    lambda db: db.get_user_by_token("token7"),
+    lambda db: db.get_user_by_username("user7"),
+    lambda db: db.get_active_subscriptions("user7"),
+    lambda db: db.get_valid_keys(owner="user7"),
+    lambda db: db.get_valid_key_for_user("user7"),
+    lambda db: list(db.iter_entitlements({"Basis": 1}, ["user7"])),
+    lambda db: list(db.iter_entitlements({"Basis": 1}, batch_size=10)),
+])
+def test_request_path_lookups_use_indexes(db, call):
+    assert scanned_tables(db, lambda: call(db)) == set()
+
+
+def test_get_valid_keys_applies_owner_filter_to_unexpiring_keys(db):
+    db.store_key("global", None, None, None)
+    keys = db.get_valid_keys(owner="user7")
+    assert [k[1] for k in keys] == ["key7"]
+
+
+@pytest.mark.parametrize("order_by", ["username", "paket"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_user_pages_use_indexes_and_follow_sort_order(db, order_by, descending):
+    db.update_user_package("user3", None)
+    db.update_user_package("user4", "Premium")
+    expected = sorted(db.get_all_users(), key=lambda row: DBHelper.user_sort_key(row, order_by), reverse=descending)
+
+    rows, after = [], None
+    while True:
+        page = db.get_users_page(after, 7, order_by, descending)
+        if not page:
+            break
+        rows.extend(page)
+        after = DBHelper.user_sort_key(page[-1], order_by)
+    assert rows == expected
+    assert db.count_users() == 50
+    assert scanned_tables(db, lambda: db.get_users_page(after, 7, order_by, descending)) == set()
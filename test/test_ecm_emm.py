@@ -0,0 +1,107 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ecm_emm
+from db_helper import DBHelper
+
+
+def test_ecm_roundtrip_and_tamper_detection():
+    even, odd = os.urandom(16), os.urandom(16)
+    ecm = ecm_emm.build_ecm("Premium", 4711, even, odd)
+
+    assert len(ecm) == ecm_emm.ECM.size == 57
+    assert ecm[0] == ecm_emm.ECM_TABLE_ODD
+    parsed = ecm_emm.parse_ecm(ecm, "Premium")
+    assert (parsed['cw_even'], parsed['cw_odd'], parsed['period']) == (even.hex(), odd.hex(), 4711)
+    assert even not in ecm and odd not in ecm
+
+    with pytest.raises(ecm_emm.MessageError):
+        ecm_emm.parse_ecm(ecm, "Basis")
+    tampered = bytearray(ecm)
+    tampered[10] ^= 1
+    with pytest.raises(ecm_emm.MessageError):
+        ecm_emm.parse_ecm(bytes(tampered), "Premium")
+
+
+def test_batch_emms_match_single_messages():
+    subscribers = [(address, 1_900_000_000 + address) for address in range(1, 51)]
+    buffer = ecm_emm.build_emms(subscribers, "Basis+", issued=1_800_000_000)
+
+    assert len(buffer) == 50 * ecm_emm.EMM.size
+    messages = list(ecm_emm.iter_emms(buffer))
+    single = ecm_emm.parse_emm(ecm_emm.build_emm(8, "Basis+", 1_900_000_008, issued=1_800_000_000))
+    parsed = ecm_emm.parse_emm(messages[7])
+    assert parsed == single
+    assert parsed['address'] == 8
+    assert parsed['bitmap'] == ecm_emm.PACKAGE_BITS["Basis+"]
+    assert parsed['package_key'] == ecm_emm.package_key("Basis+").hex()
+    with pytest.raises(ecm_emm.MessageError):
+        ecm_emm.parse_emm(messages[7], address=9)
+
+
+def _xor(a, b):
+    return bytes(x ^ y for x, y in zip(a, b))
+
+
+def test_ecms_of_same_period_never_share_keystream():
+    pairs = [(os.urandom(16), os.urandom(16)) for _ in range(20)]
+    ecms = [ecm_emm.build_ecm("Premium", 4711, even, odd) for even, odd in pairs]
+    start = ecm_emm.ECM.size - ecm_emm.MAC_SIZE - 32
+    streams = {_xor(ecm[start:start + 32], even + odd) for ecm, (even, odd) in zip(ecms, pairs)}
+    # Jede Nachricht hat ihren eigenen Keystream: ein bekanntes CW-Paar verrät die anderen nicht
+    assert len(streams) == len(pairs)
+    known = _xor(ecms[0][start:start + 32], pairs[0][0] + pairs[0][1])
+    assert _xor(ecms[1][start:start + 32], known) != pairs[1][0] + pairs[1][1]
+
+
+def test_emms_of_same_second_never_share_keystream():
+    key_start = ecm_emm.EMM.size - ecm_emm.MAC_SIZE - 16
+    grant = ecm_emm.build_emms([(8, 1_900_000_000)] * 2, "Premium", issued=1_800_000_000)
+    first, second = ecm_emm.iter_emms(grant)
+    assert first[key_start:key_start + 16] != second[key_start:key_start + 16]
+
+    other = ecm_emm.build_emm(8, "Basis", 1_900_000_000, issued=1_800_000_000)
+    k1, k2 = ecm_emm.package_key("Premium"), ecm_emm.package_key("Basis")
+    assert _xor(first[key_start:key_start + 16], other[key_start:key_start + 16]) != _xor(k1, k2)
+
+    # Entzug: kein Paket-Key, das Key-Feld enthält keinen Keystream
+    revoke = ecm_emm.build_emm(8, None, 0, issued=1_800_000_000)
+    assert revoke[key_start:key_start + 16] == bytes(16)
+    parsed = ecm_emm.parse_emm(revoke)
+    assert parsed['bitmap'] == 0 and parsed['package_key'] is None
+
+
+def test_generate_package_emms_covers_active_subscribers():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(6):
+            db.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+            db.add_subscription(f"user{i}", "Premium" if i % 2 else "Basis", "2025-01-01", "2099-12-31")
+        db.cancel_subscription("user5")
+
+        buffer, count = ecm_emm.generate_package_emms(db, "Premium")
+
+        assert count == 2
+        parsed = [ecm_emm.parse_emm(m) for m in ecm_emm.iter_emms(buffer)]
+        assert [p['expiry'] for p in parsed] == [ecm_emm.to_timestamp("2099-12-31")] * 2
+
+
+def test_package_emms_go_to_subscribers_whose_best_package_it_is():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(3):
+            db.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+            db.add_subscription(f"user{i}", "Basis", "2025-01-01", "2099-12-31")
+        db.add_subscription("user0", "Basis", "2025-01-01", "2098-06-30")
+        db.add_subscription("user1", "Premium", "2025-01-01", "2098-02-28")
+
+        basis = [ecm_emm.parse_emm(m) for m in ecm_emm.iter_emms(ecm_emm.generate_package_emms(db, "Basis")[0])]
+        premium = [ecm_emm.parse_emm(m) for m in ecm_emm.iter_emms(ecm_emm.generate_package_emms(db, "Premium")[0])]
+
+        assert [p['address'] for p in basis] == [1, 3]
+        assert basis[0]['expiry'] == ecm_emm.to_timestamp("2099-12-31")
+        assert [(p['address'], p['expiry']) for p in premium] == [(2, ecm_emm.to_timestamp("2098-02-28"))]
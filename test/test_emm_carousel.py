@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ecm_emm
+from db_helper import DBHelper
+from emm_carousel import EMMCarousel
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        helper = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(10):
+            helper.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+            helper.add_subscription(f"user{i}", "Basis", "2025-01-01", "2099-12-31")
+        yield helper
+
+
+def addresses(chunk):
+    return [ecm_emm.parse_emm(m)['address'] for m in ecm_emm.iter_emms(chunk)]
+
+
+def test_round_robin_covers_every_subscriber(db):
+    carousel = EMMCarousel(db)
+    assert carousel.resync() == 10
+    carousel.next_chunk(10)  # Erstausstrahlung der Resync-Änderungen
+
+    first = addresses(carousel.next_chunk(4))
+    rest = addresses(carousel.next_chunk(6))
+    assert sorted(first + rest) == list(range(1, 11))
+
+
+def test_subscription_changes_jump_the_queue(db):
+    carousel = EMMCarousel(db)
+    carousel.resync()
+    carousel.next_chunk(10)
+    db.add_subscription_listener(carousel.on_subscription_change)
+
+    db.add_subscription("user7", "Premium", "2025-01-01", "2099-12-31")
+    db.cancel_subscription("user2")
+    chunk = [ecm_emm.parse_emm(m) for m in ecm_emm.iter_emms(carousel.next_chunk(3))]
+
+    assert [m['address'] for m in chunk[:2]] == [8, 3]
+    assert chunk[0]['bitmap'] == ecm_emm.PACKAGE_BITS["Premium"]
+    assert chunk[1]['bitmap'] == 0
+    assert carousel.resync() == 0
+
+
+def test_token_bucket_limits_output_to_bitrate(db):
+    clock = [0.0]
+    carousel = EMMCarousel(db, bitrate=ecm_emm.EMM.size * 8 * 20, clock=lambda: clock[0])
+    carousel.resync()
+
+    sent = len(carousel.tick())
+    for step in range(1, 17):
+        clock[0] = step * 0.125  # binär exakt, keine Rundungsreste
+        sent += len(carousel.tick())
+    assert sent // ecm_emm.EMM.size == 40  # 20 EMM/s über 2 Sekunden
+
+
+def test_emm_expiry_is_that_of_the_highest_package_and_deletes_revoke(db):
+    carousel = EMMCarousel(db)
+    carousel.resync()
+    carousel.next_chunk(10)
+    db.add_subscription_listener(carousel.on_subscription_change)
+
+    db.add_subscription("user4", "Premium", "2025-01-01", "2098-02-28")
+    (emm,) = [ecm_emm.parse_emm(m) for m in ecm_emm.iter_emms(carousel.next_chunk(1))]
+    assert emm['bitmap'] == ecm_emm.PACKAGE_BITS["Premium"]
+    assert emm['expiry'] == ecm_emm.to_timestamp("2098-02-28")  # nicht das Basis-Ende 2099
+
+    address = db.get_subscriber_id("user6")
+    db.delete_user("user6")
+    (emm,) = [ecm_emm.parse_emm(m) for m in ecm_emm.iter_emms(carousel.next_chunk(1))]
+    assert (emm['address'], emm['bitmap']) == (address, 0)
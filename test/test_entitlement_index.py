@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_helper import DBHelper
+from entitlement_index import EntitlementIndex
+
+CHANNELS = {"news": "Basis", "sport": "Basis+", "kino": "Premium"}
+PAKETE = ("Basis", "Basis+", "Premium")
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        helper = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(9):
+            helper.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+            helper.add_subscription(f"user{i}", PAKETE[i % 3], "2025-01-01", "2099-12-31")
+        helper.add_user("nobody", "", "HWID-X", "Basis", "tokenX", "")
+        yield helper
+
+
+def make_index(db):
+    index = EntitlementIndex(db, channel_packages=CHANNELS, refresh_interval=0)
+    index.rebuild()
+    return index
+
+
+def test_channel_checks_follow_package_hierarchy(db):
+    index = make_index(db)
+
+    assert index.is_entitled("user2", "kino")       # Premium
+    assert index.is_entitled("user2", "news")
+    assert index.is_entitled("user1", "sport")      # Basis+
+    assert not index.is_entitled("user1", "kino")
+    assert not index.is_entitled("user0", "sport")  # Basis
+    assert not index.is_entitled("nobody", "news")
+    assert not index.is_entitled("user2", "unbekannt")
+    assert index.channels_for("user1") == ["news", "sport"]
+
+
+def test_users_of_package_includes_higher_packages(db):
+    index = make_index(db)
+
+    assert index.users_of("Premium") == [3, 6, 9]
+    assert index.users_of("Basis+") == [2, 3, 5, 6, 8, 9]
+    assert index.count("Basis") == 9
+
+
+def test_listener_updates_single_user_and_refresh_sees_other_writers(db):
+    index = make_index(db)
+    db.add_subscription_listener(index.on_subscription_change)
+
+    db.cancel_subscription("user2")
+    db.add_subscription("user0", "Premium", "2025-01-01", "2099-12-31")
+    assert not index.is_entitled("user2", "news")
+    assert index.is_entitled("user0", "kino")
+    assert index.refresh() is False  # eigene Änderungen lösen keinen Neuaufbau aus
+
+    other_process = DBHelper(db.db_path)
+    other_process.add_subscription("nobody", "Basis", "2025-01-01", "2099-12-31")
+    assert index.refresh() is True
+    assert index.is_entitled("nobody", "news")
+
+
+def test_filter_playlist_drops_unentitled_channels(db):
+    index = make_index(db)
+    m3u = "\n".join([
+        "#EXTM3U",
+        '#EXTINF:-1 tvg-id="news",News',
+        "http://example/news.m3u8",
+        '#EXTINF:-1 tvg-id="kino",Kino',
+        "#EXTVLCOPT:network-caching=1000",
+        "http://example/kino.m3u8",
+        "#EXTINF:-1,Ohne Kennung",
+        "http://example/other.m3u8",
+    ])
+
+    filtered = index.filter_playlist("user1", m3u)
+
+    assert "news.m3u8" in filtered and "other.m3u8" in filtered
+    assert "kino" not in filtered.lower()
+
+
+def test_subscriber_ids_survive_readding_and_deleted_users_drop_out(db):
+    index = make_index(db)
+    db.add_subscription_listener(index.on_subscription_change)
+    before = db.get_subscriber_id("user2")
+
+    db.add_user("user2", "neu", "HWID-2b", "Premium", "token2", "")
+    with pytest.raises(sqlite3.IntegrityError):
+        db.add_user("user3", "", "HWID-3", "Basis", "token2", "")  # fremdes Token
+    assert db.get_subscriber_id("user2") == before
+    assert db.get_user_by_token("token2")[0] == "user2"
+    assert index.is_entitled("user2", "kino")
+
+    db.delete_user("user2")
+    assert not index.is_entitled("user2", "news")
+    assert before not in index.users_of("Basis")
+    db.add_user("user2", "", "HWID-2", "Basis", "token2", "")
+    assert db.get_subscriber_id("user2") > 10  # gelöschte IDs werden nicht wiederverwendet
+
+    index.refresh()
+    DBHelper(db.db_path).delete_user_by_token("token5")
+    assert index.refresh() is True  # users-Änderung eines anderen Prozesses
+    assert not index.is_entitled("user5", "sport")
+
+
+def test_rebuild_reads_in_chunks_and_keeps_concurrent_listener_changes(db):
+    index = make_index(db)
+    db.add_subscription_listener(index.on_subscription_change)
+    original = db.iter_entitlements
+
+    def iter_entitlements(ranks, usernames=None, batch_size=1000):
+        rows = original(ranks, usernames, batch_size=2)
+        if usernames is None:
+            yield next(rows)                  # user0 ist gelesen ...
+            assert not db.lock.locked()      # ... und der Lock zwischen den Chunks frei
+            db.add_subscription("user0", "Premium", "2025-01-01", "2099-12-31")
+        yield from rows
+
+    db.iter_entitlements = iter_entitlements
+    index.rebuild()
+
+    assert index.is_entitled("user0", "kino")
+    assert index.count("Basis") == 9
+
+
+def test_background_thread_builds_the_index(db):
+    index = EntitlementIndex(db, channel_packages=CHANNELS, refresh_interval=0.01)
+    thread = threading.Thread(target=index.run_forever, daemon=True)
+    thread.start()
+    try:
+        assert index.ready.wait(5)
+        assert index.is_entitled("user2", "kino")
+        DBHelper(db.db_path).add_subscription("nobody", "Basis", "2025-01-01", "2099-12-31")
+        deadline = time.monotonic() + 5
+        while not index.is_entitled("nobody", "news") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert index.is_entitled("nobody", "news")
+    finally:
+        index.stop()
+        thread.join(5)
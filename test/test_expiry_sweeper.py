@@ -0,0 +1,82 @@
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_helper import DBHelper
+from expiry_sweeper import ExpirySweeper
+
+TODAY = datetime.date(2030, 6, 15)
+NOW = time.mktime(TODAY.timetuple()) + 12 * 3600
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        helper = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(12):
+            helper.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+            end = TODAY + datetime.timedelta(days=i - 6)  # user0..5 abgelaufen, user6 läuft heute aus
+            helper.add_subscription(f"user{i}", "Basis", "2030-01-01", end.isoformat())
+        yield helper
+
+
+def test_sweep_deactivates_expired_in_batches_and_notifies(db):
+    events = []
+    db.add_subscription_listener(lambda username, event: events.append((username, event)))
+    sweeper = ExpirySweeper(db, batch_size=4, clock=lambda: NOW)
+
+    expired = sweeper.run_once()
+
+    assert sorted(expired) == [f"user{i}" for i in range(6)]
+    assert sorted(events) == [(f"user{i}", "expire") for i in range(6)]
+    assert db.get_next_expiry() == TODAY.isoformat()
+    assert sweeper.run_once() == []
+
+
+def test_next_wakeup_is_day_after_next_end_date(db):
+    sweeper = ExpirySweeper(db, max_sleep=7 * 86400, clock=lambda: NOW)
+    sweeper.run_once()
+
+    tomorrow = time.mktime((TODAY + datetime.timedelta(days=1)).timetuple())
+    assert sweeper.next_wakeup() == tomorrow
+    assert ExpirySweeper(db, max_sleep=60, clock=lambda: NOW).next_wakeup() == NOW + 60
+
+
+def test_new_subscription_wakes_the_sweeper(db):
+    sweeper = ExpirySweeper(db, clock=lambda: NOW)
+    db.add_subscription_listener(sweeper.on_subscription_change)
+
+    db.add_subscription("user11", "Premium", "2030-01-01", "2030-06-20")
+    assert sweeper.wake.is_set()
+
+
+def test_run_forever_survives_a_failing_sweep(db, monkeypatch):
+    sweeper = ExpirySweeper(db, retry=0.01, clock=lambda: NOW)
+    expire = db.expire_subscriptions
+    calls = []
+
+    def flaky(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return expire(*args)
+
+    monkeypatch.setattr(db, "expire_subscriptions", flaky)
+    thread = threading.Thread(target=sweeper.run_forever, daemon=True)
+    thread.start()
+    try:
+        deadline = time.time() + 5
+        while db.get_next_expiry() != TODAY.isoformat() and time.time() < deadline:
+            time.sleep(0.01)
+        assert thread.is_alive()
+        assert db.get_next_expiry() == TODAY.isoformat()
+    finally:
+        sweeper.stop()
+        thread.join(5)
@@ -0,0 +1,85 @@
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_helper import DBHelper
+from key_retention import KeyRetention
+
+NOW = 2_000_000_000.0
+
+
+def iso(ts):
+    return datetime.datetime.utcfromtimestamp(ts).isoformat()
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield DBHelper(os.path.join(tmp_dir, 'test.db'))
+
+
+def test_expired_keys_move_to_archive_in_batches(db):
+    rows = [(f"old{i}", iso(NOW - 7200 - i), f"user{i}", "Basis", iso(NOW - 10000 - i)) for i in range(25)]
+    rows += [(f"grace{i}", iso(NOW - 60), f"user{i}", "Basis", iso(NOW - 3600)) for i in range(5)]
+    rows += [(f"live{i}", iso(NOW + 3600), f"user{i}", "Basis", iso(NOW)) for i in range(5)]
+    db.store_keys_batch(rows)
+    db.store_key("manual", None, None, None)
+
+    calls = []
+    original = db.archive_expired_keys
+
+    def counting(cutoff, batch_size):
+        calls.append(batch_size)
+        return original(cutoff, batch_size)
+
+    db.archive_expired_keys = counting
+    stats = KeyRetention(db, grace=3600, batch_size=10, pause=0, clock=lambda: NOW).run_once()
+
+    assert stats['archived'] == 25
+    assert len(calls) == 3
+    assert stats['keys'] == 11
+    assert stats['keys_archive'] == 25
+    remaining = {k[1] for k in db.get_recent_keys(limit=100)}
+    assert remaining == {"manual"} | {f"grace{i}" for i in range(5)} | {f"live{i}" for i in range(5)}
+    assert [k[1] for k in db.get_archived_keys("user3")] == ["old3"]
+
+
+def test_incremental_vacuum_reclaims_pages(db):
+    rows = [(os.urandom(64).hex(), iso(NOW - 86400 * 2), f"user{i}", "Basis", iso(NOW - 86400 * 3))
+            for i in range(2000)]
+    db.store_keys_batch(rows)
+    assert db.get_storage_stats()['auto_vacuum'] == 2  # INCREMENTAL
+
+    stats = KeyRetention(db, grace=3600, batch_size=500, pause=0, vacuum_pages=0,
+                         clock=lambda: NOW).run_once()
+
+    assert stats['archived'] == 2000
+    assert stats['reclaimed_pages'] > 0
+    assert stats['freelist_count'] == 0
+
+
+def test_run_forever_continues_after_a_failing_pass(db, monkeypatch):
+    retention = KeyRetention(db, clock=lambda: NOW)
+    stop = threading.Event()
+    calls = []
+
+    def flaky(cutoff, batch_size):
+        calls.append(cutoff)
+        if len(calls) == 2:
+            stop.set()
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return 0
+
+    monkeypatch.setattr(db, "archive_expired_keys", flaky)
+    thread = threading.Thread(target=retention.run_forever, args=(0.01, stop), daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(calls) == 2
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import metrics
+from db_helper import DBHelper
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    hist = registry.histogram("test_latency_seconds", "Test", ("endpoint",), buckets=(0.1, 1.0))
+    hist.observe(0.05, ("auth",))
+    hist.observe(0.5, ("auth",))
+    hist.observe(3.0, ("auth",))
+
+    text = registry.render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{endpoint="auth",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{endpoint="auth",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{endpoint="auth",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{endpoint="auth"} 3' in text
+
+
+def test_instrument_db_counts_calls():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = metrics.instrument_db(DBHelper(os.path.join(tmp_dir, 'test.db')))
+        before = metrics.DB_CALLS.value(("get_user_by_token",))
+        db.get_user_by_token("nope")
+        db.get_user_by_token("nope")
+
+        assert metrics.DB_CALLS.value(("get_user_by_token",)) == before + 2
+        assert metrics.DB_LATENCY.count(("get_user_by_token",)) >= 2
+
+
+def test_concurrent_observations_are_not_lost():
+    registry = metrics.Registry()
+    hist = registry.histogram("test_concurrent_seconds", "Test", buckets=(1.0,))
+    gauge = registry.gauge("test_concurrent_gauge", "Test")
+
+    def work():
+        for i in range(10000):
+            hist.observe(0.5)
+            gauge.set(i)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert hist.count() == 40000
+    assert gauge.value() == 9999
+
+
+def test_metrics_endpoint_requires_local_address_or_token(monkeypatch):
+    flask = pytest.importorskip("flask")
+    app = metrics.instrument_app(flask.Flask(__name__), "test")
+    client = app.test_client()
+    monkeypatch.setattr(metrics.config, "METRICS_TOKEN", "scrape-secret")
+
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.9"}).status_code == 403
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.9"},
+                      headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
@@ -0,0 +1,111 @@
+import datetime
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import payment_providers
+from db_helper import DBHelper
+from payment_providers import InvalidWebhook, StatusCache
+from payment_reconciliation import reconcile
+from webhook_queue import WebhookQueue
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        helper = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        helper.add_user("alice", "", "HWID-1", "Basis", "token1", "")
+        yield helper
+
+
+def test_stub_checkout_is_booked_once_and_status_is_local(db):
+    adapter = payment_providers.get_adapter("stub", db)
+    queue = WebhookQueue(db, adapter.process_event)
+    session_id = adapter.create_payment_session("alice", "Premium", "1m")
+    assert adapter.check_payment_status(session_id) == "pending"
+
+    payload, signature = adapter.complete_session(session_id)
+    event = adapter.verify_webhook(payload, signature)
+    queue.enqueue(event['id'], adapter.name, event['type'], event)
+    queue.drain()
+
+    payment = db.get_payment_by_ref(session_id)
+    assert payment[1:5] == ("alice", 20.0, "eur", "paid")
+    assert adapter.check_payment_status(session_id) == "paid"
+    assert db.get_best_active_package("alice") == "Premium"
+
+    # Zweites Event zur selben Session (anderer event_id) bucht nichts doppelt
+    payload, signature = adapter.complete_session(session_id)
+    event = adapter.verify_webhook(payload, signature)
+    queue.enqueue(event['id'], adapter.name, event['type'], event)
+    queue.drain()
+    assert len(db.get_payments_by_user("alice")) == 1
+
+
+def test_stub_rejects_bad_signatures(db):
+    adapter = payment_providers.get_adapter("stub", db)
+    payload, signature = adapter.complete_session(adapter.create_payment_session("alice", "Basis", "6m"))
+    with pytest.raises(InvalidWebhook):
+        adapter.verify_webhook(payload + b" ", signature)
+    with pytest.raises(InvalidWebhook):
+        adapter.verify_webhook(payload, None)
+    with pytest.raises(ValueError):
+        payment_providers.get_adapter("paypal", db)
+
+
+def test_status_cache_keeps_final_and_expires_pending():
+    clock = [0.0]
+    cache = StatusCache(max_entries=2, ttl=5, clock=lambda: clock[0])
+    cache.put("a", "paid")
+    cache.put("b", "pending")
+    clock[0] = 6
+    assert cache.get("a") == "paid"
+    assert cache.get("b") is None
+    cache.put("c", "paid")
+    cache.put("d", "paid")
+    assert cache.get("a") is None  # LRU-Verdrängung
+
+
+def test_pending_checkout_is_persisted_and_completed_in_place(db):
+    adapter = payment_providers.get_adapter("stub", db)
+    session_id = adapter.create_payment_session("alice", "Basis+", "1m")
+
+    # Andere Instanz (z.B. anderer Prozess) ohne gemeinsamen Cache
+    other = payment_providers.get_adapter("stub", db)
+    assert other.check_payment_status(session_id) == "pending"
+    assert [row[2:] for row in db.get_payment_rollups("2000-01-01", "2999-12-31")] == [("eur", "pending", 1, 15.0)]
+
+    payload, signature = adapter.complete_session(session_id)
+    event = adapter.verify_webhook(payload, signature)
+    queue = WebhookQueue(db, adapter.process_event)
+    queue.enqueue(event['id'], adapter.name, event['type'], event)
+    queue.drain()
+
+    assert len(db.get_payments_by_user("alice")) == 1
+    assert db.get_payment_by_ref(session_id)[4] == "paid"
+    assert [row[2:] for row in db.get_payment_rollups("2000-01-01", "2999-12-31")] == [("eur", "paid", 1, 15.0)]
+    assert reconcile(db)['mismatches'] == []
+
+
+def test_paid_checkout_follows_the_booking_period_rule(db):
+    today = datetime.date.today()
+    db.add_subscription("alice", "Basis+", today.isoformat(), (today + datetime.timedelta(days=10)).isoformat())
+    adapter = payment_providers.get_adapter("stub", db)
+    queue = WebhookQueue(db, adapter.process_event)
+
+    def pay(paket):
+        payload, signature = adapter.complete_session(adapter.create_payment_session("alice", paket, "1m"))
+        event = adapter.verify_webhook(payload, signature)
+        queue.enqueue(event['id'], adapter.name, event['type'], event)
+        queue.drain()
+        return db.get_active_subscription("alice")
+
+    renewal = pay("Basis")      # kein Upgrade: schließt an das laufende Abo an
+    assert renewal[3] == (today + datetime.timedelta(days=10)).isoformat()
+    assert renewal[4] == (today + datetime.timedelta(days=40)).isoformat()
+    upgrade = pay("Premium")    # Upgrade: ab heute
+    assert [s[3] for s in db.get_active_subscriptions("alice") if s[2] == "Premium"] == [today.isoformat()]
+    assert upgrade[4] == (today + datetime.timedelta(days=40)).isoformat()
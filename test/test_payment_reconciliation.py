@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_helper import DBHelper
+from payment_reconciliation import reconcile, revenue_summary
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        helper = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        helper.add_user("alice", "", "HWID-1", "Basis", "token1", "")
+        yield helper
+
+
+def backdate(db, day):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE payments SET timestamp = ? || substr(timestamp, 11) WHERE payment_id = "
+                     "(SELECT MAX(payment_id) FROM payments)", (day,))
+
+
+def test_add_payment_maintains_daily_rollups(db):
+    for amount, paket in ((10.0, "Basis"), (20.0, "Premium"), (20.0, "Premium")):
+        db.add_payment("alice", amount, "eur", "paid", paket)
+    db.add_payment("alice", 15.0, "eur", "failed", "Basis+")
+
+    rows = db.get_payment_rollups("2000-01-01", "2999-12-31")
+    assert sorted(row[1:] for row in rows) == [
+        ("Basis", "eur", "paid", 1, 10.0),
+        ("Basis+", "eur", "failed", 1, 15.0),
+        ("Premium", "eur", "paid", 2, 40.0),
+    ]
+    assert revenue_summary(db, "2000-01-01", "2999-12-31") == {
+        ("Basis", "eur"): (1, 10.0), ("Premium", "eur"): (2, 40.0)}
+
+
+def test_reconcile_streams_chunks_and_repairs_drift(db):
+    for i in range(7):
+        db.add_payment("alice", 10.0, "eur", "paid", "Basis")
+        backdate(db, f"2025-03-0{1 + i % 3}")
+    # Rollups passen nach dem Zurückdatieren nicht mehr zu den Zahlungen
+    result = reconcile(db, batch_size=2)
+    assert result['payments'] == 7
+    assert result['range'] == ("2025-03-01", "2025-03-03")
+    assert len(result['mismatches']) == 3
+
+    reconcile(db, batch_size=2, fix=True)
+    assert reconcile(db)['mismatches'] == []
+    rows = db.get_payment_rollups("2025-03-01", "2025-03-03")
+    assert [(row[0], row[4]) for row in rows] == [("2025-03-01", 3), ("2025-03-02", 2), ("2025-03-03", 2)]
+
+
+def test_rollups_are_backfilled_when_the_table_is_created(db):
+    db.add_payment("alice", 10.0, "eur", "paid", "Basis")
+    db.add_payment("alice", 20.0, "eur", "paid", "Basis")
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('DROP TABLE payment_rollups')  # Stand vor Einführung der Rollups
+
+    upgraded = DBHelper(db.db_path)
+
+    assert [row[1:] for row in upgraded.get_payment_rollups("2000-01-01", "2999-12-31")] == [
+        ("Basis", "eur", "paid", 2, 30.0)]
+    assert reconcile(upgraded)['mismatches'] == []
+    DBHelper(db.db_path)  # erneutes Öffnen zählt nicht doppelt
+    assert upgraded.get_payment_rollups("2000-01-01", "2999-12-31")[0][4] == 2
@@ -0,0 +1,179 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import preview_wall
+from preview_wall import PreviewWall, ThumbnailCache, parse_playlist
+
+THUMB_SIZE = 2048
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FileGrabber:
+    """Reads local files as thumbnails and tracks calls and concurrency."""
+
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.002)
+            with open(url, 'rb') as f:
+                return f.read()
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def write_playlist(tmp_dir, count):
+    lines = ["#EXTM3U"]
+    for i in range(count):
+        path = os.path.join(tmp_dir, f"ch{i}.jpg")
+        with open(path, 'wb') as f:
+            f.write(bytes([i % 256]) * THUMB_SIZE)
+        lines += [f'#EXTINF:-1 tvg-id="ch{i}",Kanal {i}', path]
+    return parse_playlist("\n".join(lines))
+
+
+def test_parse_playlist():
+    m3u = ('#EXTM3U\n#EXTINF:-1 tvg-id="ard",Das Erste\nhttp://a/1.m3u8\n'
+           '#EXTINF:-1,Ohne ID\n#EXTVLCOPT:network-caching=1000\nhttp://a/2.m3u8\n'
+           'http://a/3.m3u8\n#EXTINF:-1 tvg-id="ard",Doppelt\nhttp://a/4.m3u8\n')
+    assert parse_playlist(m3u) == [("ard", "http://a/1.m3u8"), ("Ohne ID", "http://a/2.m3u8"),
+                                   ("http://a/3.m3u8", "http://a/3.m3u8")]
+
+
+@pytest.mark.parametrize("count", [10, 40])
+def test_round_grabs_each_channel_once_with_bounded_pool(count):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        channels = write_playlist(tmp_dir, count)
+        grabber = FileGrabber()
+        wall = PreviewWall(channels, grab=grabber, workers=3, refresh=60)
+        try:
+            assert wall.refresh_round() == count
+            # CPU: genau ein Grab pro Kanal, nie mehr als `workers` gleichzeitig
+            assert grabber.calls == count
+            assert grabber.max_active <= 3
+            # Speicher: ein Vorschaubild pro Kanal
+            assert len(wall.cache) == count
+            assert wall.cache.bytes == count * THUMB_SIZE
+            assert wall.thumbnail("ch1") == bytes([1]) * THUMB_SIZE
+            # Innerhalb von `refresh` ist nichts fällig
+            assert wall.refresh_round() == 0
+        finally:
+            wall.stop()
+
+
+def test_schedule_is_round_robin_and_failures_wait_for_refresh():
+    clock = FakeClock()
+    started = []
+    release = threading.Event()
+
+    def grab(url):
+        started.append(url)
+        release.wait(5)
+        raise preview_wall.GrabError("kein Signal")
+
+    wall = PreviewWall([(f"ch{i}", f"url{i}") for i in range(5)], grab=grab, workers=2,
+                       refresh=30, clock=clock)
+    try:
+        assert wall.schedule() == ["ch0", "ch1"]
+        assert wall.schedule() == []  # alle Worker belegt
+        release.set()
+        wall.refresh_round()
+        assert sorted(started) == [f"url{i}" for i in range(5)]
+        assert wall.errors["ch3"] == "kein Signal"
+        assert wall.refresh_round() == 0  # fehlgeschlagene Kanäle erst nach `refresh` erneut
+
+        clock.now += 30
+        release.clear()
+        first, second = wall.schedule()
+        assert int(second[2:]) == (int(first[2:]) + 1) % 5  # reihum weiter
+        release.set()
+    finally:
+        wall.stop()
+
+
+def test_slow_round_ends_when_refresh_is_shorter_than_a_grab():
+    calls = []
+
+    def grab(url):
+        calls.append(url)
+        time.sleep(0.05)
+        return b"x"
+
+    wall = PreviewWall([(f"ch{i}", f"url{i}") for i in range(5)], grab=grab, workers=2, refresh=0.01)
+    result = []
+    try:
+        runner = threading.Thread(target=lambda: result.append(wall.refresh_round()), daemon=True)
+        runner.start()
+        runner.join(5)
+        # Kanäle, die während der Runde wieder fällig werden, warten auf die nächste Runde
+        assert not runner.is_alive()
+        assert result == [5]
+        assert sorted(calls) == [f"url{i}" for i in range(5)]
+    finally:
+        wall.stop()
+
+
+def test_cache_ttl_eviction():
+    clock = FakeClock()
+    cache = ThumbnailCache(ttl=60, clock=clock)
+    cache.put("a", b"x" * 10)
+    clock.now += 30
+    cache.put("b", b"y" * 20)
+    assert cache.bytes == 30
+
+    clock.now += 30
+    assert cache.evict_expired() == 1
+    assert cache.get("a") is None and cache.get("b") == b"y" * 20
+    assert cache.bytes == 20
+    clock.now += 30
+    assert cache.get("b") is None and cache.bytes == 0
+
+
+def test_cache_gauge_follows_get_and_discard():
+    clock = FakeClock()
+    cache = ThumbnailCache(ttl=60, clock=clock)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"y" * 20)
+    assert preview_wall.PREVIEW_CACHE_BYTES.value() == 30
+
+    cache.discard("b")
+    assert preview_wall.PREVIEW_CACHE_BYTES.value() == 10
+    clock.now += 60
+    assert cache.get("a") is None
+    assert preview_wall.PREVIEW_CACHE_BYTES.value() == 0
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg nicht installiert")
+def test_ffmpeg_grab_local_file():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "test.ts")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=640x360:rate=25",
+                        "-t", "1", path], check=True)
+        data = preview_wall.ffmpeg_grab(path, width=160)
+        assert data[:2] == b"\xff\xd8"
+        with pytest.raises(preview_wall.GrabError):
+            preview_wall.ffmpeg_grab(os.path.join(tmp_dir, "fehlt.ts"))
@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import profiling
+from profiling import Profiler
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_writes_collapsed_stacks():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        profiler = Profiler("test", enabled=True, sample_rate=1.0, interval=0.001, output_dir=tmp_dir)
+        assert profiler.should_sample()
+
+        sampler = profiler.start()
+        busy_wait(0.05)
+        path = profiler.finish(sampler, "authenticate")
+
+        assert path is not None and os.path.basename(path).startswith("test_authenticate_")
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0
+        assert any("busy_wait" in line for line in lines)
+
+
+def test_disabled_profiler_never_samples():
+    profiler = Profiler("test", enabled=False, sample_rate=1.0)
+    assert not profiler.should_sample()
+
+
+def test_output_names_stay_unique_across_threads():
+    class Sampler:
+        def stop(self):
+            return {"a;b": 1}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        profiler = Profiler("test", enabled=True, output_dir=tmp_dir)
+        paths = []
+        threads = [threading.Thread(target=lambda: paths.append(profiler.finish(Sampler(), "x")))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(paths)) == 20
+
+
+def test_toggle_rejects_invalid_sample_rate():
+    flask = pytest.importorskip("flask")
+
+    app = flask.Flask(__name__)
+    profiler = profiling.init_app(app, "test", guard=lambda f: f)
+    client = app.test_client()
+
+    for value in ("abc", "nan", None, [1]):
+        assert client.post("/admin/profiling", json={"sample_rate": value}).status_code == 400
+    assert client.post("/admin/profiling", data={"sample_rate": "x"}).status_code == 400
+
+    response = client.post("/admin/profiling", json={"sample_rate": "0.5"})
+    assert response.status_code == 200 and profiler.sample_rate == 0.5
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import metrics
+from db_helper import DBHelper
+from rotation_scheduler import RotationScheduler
+
+USERS = [f"user{i}" for i in range(100)]
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield DBHelper(os.path.join(tmp_dir, 'test.db'))
+
+
+def make_scheduler(db, clock, rotated, **kwargs):
+    return RotationScheduler(db, "test", interval=100, slots=10, list_keys=lambda: USERS,
+                             rotate=rotated.extend, clock=lambda: clock[0], **kwargs)
+
+
+def test_each_tick_rotates_one_slot_and_a_revolution_covers_everyone(db):
+    clock, rotated = [1000.0], []
+    scheduler = make_scheduler(db, clock, rotated)
+
+    assert scheduler.run_pending() == 0  # kein Voll-Durchlauf beim ersten Start
+    passes = metrics.ROTATION_PASS.count(("test",))
+
+    clock[0] = 1010.0
+    assert scheduler.run_pending() == 1
+    assert rotated and all(scheduler.slot_of(u) == 1 for u in rotated)
+
+    for step in range(2, 11):
+        clock[0] = 1000.0 + step * 10
+        assert scheduler.run_pending() == 1
+    assert sorted(rotated) == sorted(USERS)
+    assert metrics.ROTATION_PASS.count(("test",)) == passes + 1  # ein vollständiger Umlauf
+
+
+def test_restart_resumes_from_persisted_cursor(db):
+    clock, rotated = [1000.0], []
+    make_scheduler(db, clock, rotated)
+    clock[0] = 1005.0
+    make_scheduler(db, clock, rotated).run_pending()
+    rotated.clear()
+
+    clock[0] = 1025.0  # Ticks 101 und 102 sind fällig
+    restarted = make_scheduler(db, clock, rotated)
+    assert restarted.cursor == 100
+    assert restarted.run_pending() == 2
+    assert {restarted.slot_of(u) for u in rotated} <= {1, 2}
+
+
+def test_long_pause_only_catches_up_recent_ticks(db):
+    clock, rotated = [1000.0], []
+    make_scheduler(db, clock, rotated).run_pending()
+
+    clock[0] = 5000.0
+    restarted = make_scheduler(db, clock, rotated, max_catch_up=2)
+    assert restarted.run_pending() == 2
+    assert restarted.cursor == 500
+
+
+def test_jitter_stays_inside_the_tick(db):
+    scheduler = make_scheduler(db, [0.0], [], jitter=1.0)
+    for tick in range(200):
+        assert tick * 10 <= scheduler.scheduled_time(tick) < (tick + 1) * 10
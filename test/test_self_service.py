@@ -0,0 +1,75 @@
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+import metrics
+from db_helper import DBHelper
+
+pytest.importorskip("flask")
+
+DB_METHODS = [name for name in dir(DBHelper) if not name.startswith("_")]
+
+
+def db_calls():
+    """Summe aller DBHelper-Aufrufe laut metrics.instrument_db."""
+    return sum(metrics.DB_CALLS.value((name,)) for name in DB_METHODS)
+
+
+@pytest.fixture
+def portal(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'test.db')
+        # Beim Import legt self_service seinen DBHelper an, nie auf der echten DB
+        monkeypatch.setattr(config, "DB_PATH", path)
+        self_service = importlib.import_module("self_service")
+        db = metrics.instrument_db(DBHelper(path))
+        db.add_user("alice", "", "HWID-1", "Basis", "token1", "alice@example.com")
+        monkeypatch.setattr(self_service, "db", db)
+        self_service.app.config["TESTING"] = True
+        yield self_service, db, self_service.app.test_client()
+
+
+def session_state(client, self_service):
+    with client.session_transaction() as session:
+        return session.get(self_service.SESSION_KEY)
+
+
+def test_cached_get_does_not_query_db(portal):
+    self_service, _, client = portal
+    assert client.post("/selfservice", data={"token": "token1"}).status_code == 200
+
+    before = db_calls()
+    response = client.get("/selfservice")
+    assert response.status_code == 200
+    assert b"alice" in response.data
+    assert db_calls() == before
+
+
+def test_changes_refresh_cached_state(portal):
+    self_service, db, client = portal
+    client.post("/selfservice", data={"token": "token1"})
+
+    client.post("/selfservice/renew_token", data={"username": "alice"}, follow_redirects=True)
+    token = db.get_user_by_username("alice")[3]
+    assert token != "token1"
+    assert session_state(client, self_service)["user"]["token"] == token
+
+    client.post("/selfservice/subscribe", data={"username": "alice", "paket": "Premium", "zyklus": "1m"},
+                follow_redirects=True)
+    state = session_state(client, self_service)
+    assert state["user"]["paket"] == "Premium"
+    assert state["subscription"]["paket"] == "Premium" and state["subscription"]["active"] == 1
+
+    client.post("/selfservice/cancel", data={"username": "alice"}, follow_redirects=True)
+    assert session_state(client, self_service)["subscription"] is None
+
+    # Auch nach den Änderungen kommt der nächste GET ohne DB-Abfrage aus
+    before = db_calls()
+    response = client.get("/selfservice")
+    assert token.encode() in response.data
+    assert db_calls() == before
@@ -0,0 +1,50 @@
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import startup_timing
+from db_helper import DBHelper
+
+
+def test_measure_and_report(monkeypatch):
+    monkeypatch.setattr(startup_timing, "ENABLED", True)
+    monkeypatch.setattr(startup_timing, "entries", [])
+    with startup_timing.measure("construct", "Fenster"):
+        pass
+    sys.modules.pop("colorsys", None)
+    startup_timing.import_module("colorsys")
+    # Bereits importierte Module werden nicht erneut gemessen
+    assert startup_timing.import_module("colorsys") is sys.modules["colorsys"]
+    assert [entry[:2] for entry in startup_timing.entries] == [("construct", "Fenster"), ("import", "colorsys")]
+
+    out = io.StringIO()
+    startup_timing.report("Test", out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith("[INFO] Test:")
+    assert any("construct" in line and "Fenster" in line for line in lines[1:])
+    assert startup_timing.entries == []
+
+
+def test_disabled_records_nothing(monkeypatch):
+    monkeypatch.setattr(startup_timing, "ENABLED", False)
+    monkeypatch.setattr(startup_timing, "entries", [])
+    with startup_timing.measure("construct", "Fenster"):
+        pass
+    out = io.StringIO()
+    startup_timing.report("Test", out)
+    assert startup_timing.entries == [] and out.getvalue() == ""
+
+
+def test_deferred_schema():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'test.db')
+        db = DBHelper(path, create_tables=False)
+        assert not os.path.exists(path) or not sqlite3.connect(path).execute(
+            "SELECT name FROM sqlite_master WHERE name = 'users'").fetchone()
+        db.ensure_schema()
+        db.ensure_schema()
+        db.add_user("alice", "", "HWID-1", "Basis", "token1", "")
+        assert db.count_users() == 1
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import watermark_renderer
+from watermark_renderer import WatermarkRenderer
+
+
+@pytest.fixture
+def logo_path():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'logo.png')
+        # Linke Hälfte deckend rot, rechte Hälfte halbtransparent weiß
+        pixels = np.zeros((50, 100, 4), dtype=np.uint8)
+        pixels[:, :50] = (255, 0, 0, 255)
+        pixels[:, 50:] = (255, 255, 255, 128)
+        Image.fromarray(pixels, 'RGBA').save(path)
+        yield path
+
+
+def test_composite_blends_at_position(logo_path):
+    renderer = WatermarkRenderer(scale=0.5, margin=0.0)
+    frame = np.full((100, 200, 3), 100, dtype=np.uint8)
+    renderer.composite(frame, logo_path, 'bottom-right')
+
+    # Logo 100x50 unten rechts, Rest unverändert
+    assert (frame[:50] == 100).all() and (frame[:, :100] == 100).all()
+    assert tuple(frame[75, 110]) == (255, 0, 0)
+    r, g, b = frame[75, 190]
+    assert abs(int(r) - (100 + 155 * 128 // 255)) <= 1 and r == g == b
+
+
+@pytest.mark.parametrize("position, corner", [
+    ('top-left', (0, 0)), ('top-right', (0, 150)), ('bottom-left', (75, 0)), ('bottom-right', (75, 150)),
+])
+def test_positions(logo_path, position, corner):
+    ov = WatermarkRenderer(scale=0.25, margin=0.0).overlay(logo_path, position, 200, 100)
+    assert (ov.y, ov.x) == corner and ov.inverse.shape[:2] == (25, 50)
+
+
+def test_logo_decoded_once_and_overlays_cached(logo_path, monkeypatch):
+    opened = []
+    original = watermark_renderer.Image.open
+    monkeypatch.setattr(watermark_renderer.Image, "open", lambda path: opened.append(path) or original(path))
+    renderer = WatermarkRenderer(cache_size=3)
+    renderer.precompute([(1, "logo", logo_path, "top-left", 1), (2, "aus", logo_path, "top-right", 0)],
+                        resolutions=((1280, 720), (640, 360)))
+    assert opened == [logo_path]
+    assert len(renderer.overlays) == 2
+
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    first = renderer.overlay(logo_path, "top-left", 640, 360)
+    renderer.render(frame, [(1, "logo", logo_path, "top-left", 1)])
+    assert renderer.overlay(logo_path, "top-left", 640, 360) is first
+
+    for width in (320, 480, 800):
+        renderer.overlay(logo_path, "top-left", width, 360)
+    assert len(renderer.overlays) == 3
+    assert (logo_path, "top-left", 1280, 720) not in renderer.overlays
+    assert opened == [logo_path]
+
+
+def test_unknown_position(logo_path):
+    with pytest.raises(ValueError):
+        WatermarkRenderer().overlay(logo_path, 'center', 640, 360)
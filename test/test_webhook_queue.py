@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_helper import DBHelper
+from webhook_queue import WebhookQueue
+
+
+@pytest.fixture
+def db():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        helper = DBHelper(os.path.join(tmp_dir, 'test.db'))
+        for i in range(20):
+            helper.add_user(f"user{i}", "", f"HWID-{i}", "Basis", f"token{i}", "")
+        yield helper
+
+
+def checkout_event(i):
+    return {'id': f"evt_{i}", 'type': 'checkout.session.completed',
+            'data': {'object': {'metadata': {'username': f"user{i}", 'paket': 'Premium'},
+                                'amount_total': 2000, 'currency': 'eur'}}}
+
+
+def book(db):
+    def handler(event):
+        session = event['payload']['data']['object']
+        db.complete_checkout(event['event_id'], session['metadata']['username'], session['metadata']['paket'],
+                             session['amount_total'] / 100.0, session['currency'], 30)
+    return handler
+
+
+def test_duplicates_are_acknowledged_but_booked_once(db):
+    queue = WebhookQueue(db, book(db))
+    assert queue.enqueue("evt_1", "stripe", "checkout.session.completed", checkout_event(1))
+    assert not queue.enqueue("evt_1", "stripe", "checkout.session.completed", checkout_event(1))
+
+    assert queue.drain() == 1
+    assert not queue.enqueue("evt_1", "stripe", "checkout.session.completed", checkout_event(1))
+    assert queue.drain() == 0
+    assert len(db.get_payments_by_user("user1")) == 1
+    assert db.get_user_by_username("user1")[2] == "Premium"
+    assert db.get_webhook_queue_stats() == {'done': 1}
+
+
+def test_failed_events_are_retried_with_backoff_then_marked_failed(db):
+    clock = [1000.0]
+    calls = []
+
+    def flaky(event):
+        calls.append(event['attempts'])
+        raise RuntimeError("database is locked")
+
+    queue = WebhookQueue(db, flaky, max_attempts=3, retry_base=10, clock=lambda: clock[0])
+    queue.enqueue("evt_x", "stripe", "checkout.session.completed", checkout_event(2))
+
+    assert queue.drain() == 1
+    assert queue.drain() == 0  # Backoff noch nicht abgelaufen
+    clock[0] += 10
+    assert queue.drain() == 1
+    clock[0] += 20
+    assert queue.drain() == 1
+    assert calls == [1, 2, 3]
+    assert db.get_webhook_queue_stats() == {'failed': 1}
+
+
+def test_crashed_claims_are_requeued_and_completed_once(db):
+    queue = WebhookQueue(db, book(db), clock=lambda: 1000.0)
+    queue.enqueue("evt_3", "stripe", "checkout.session.completed", checkout_event(3))
+    db.claim_webhook_events(1000.0)  # Worker stirbt nach dem Claim
+
+    assert queue.drain() == 0
+    assert db.requeue_stale_webhook_events(1001.0) == 1
+    assert queue.drain() == 1
+    assert len(db.get_payments_by_user("user3")) == 1
+
+
+def test_worker_pool_processes_every_event_exactly_once(db):
+    queue = WebhookQueue(db, book(db), workers=4, batch_size=3)
+    for i in range(20):
+        queue.enqueue(f"evt_{i}", "stripe", "checkout.session.completed", checkout_event(i))
+    queue.start()
+    try:
+        for _ in range(200):
+            if db.get_webhook_queue_stats() == {'done': 20}:
+                break
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+
+    assert db.get_webhook_queue_stats() == {'done': 20}
+    assert all(len(db.get_payments_by_user(f"user{i}")) == 1 for i in range(20))
@@ -1,22 +1,150 @@
-from PySide6.QtWidgets import (QWidget, QLabel, QLineEdit, QPushButton,
-                               QVBoxLayout, QHBoxLayout, QMessageBox, QListWidget, QListWidgetItem, QComboBox)
-from PySide6.QtCore import Qt
-from db_helper import DBHelper
+from collections import OrderedDict
+
+from PySide6.QtWidgets import (QWidget, QLabel, QLineEdit, QPushButton, QTableView, QAbstractItemView,
+                               QVBoxLayout, QHBoxLayout, QMessageBox, QComboBox)
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+from db_helper import DBHelper, USER_SORT_COLUMNS
+from gui_workers import DataLoader
+
+class UserTableModel(QAbstractTableModel):
+    """Users table that loads pages on demand (fetchMore) and sorts in SQL.
+
+    Pages are fetched through the DataLoader; rows are inserted when a page
+    arrives, so neither fetchMore nor data() touches the database on the GUI
+    thread. Only the last `max_pages` pages stay in memory; an evicted page
+    shows empty cells until its reload (via the keyset start kept per page)
+    arrives.
+    """
+
+    HEADERS = ("Benutzername", "HWID", "Paket", "Token", "Email")
+
+    load_failed = Signal(str)
+
+    def __init__(self, db, loader, page_size=500, max_pages=20, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.loader = loader
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.order_by = 'username'
+        self.descending = False
+        self.requests = set()
+        self.reset()
+
+    def reset(self):
+        for key in self.requests:
+            self.loader.cancel(key)
+        self.beginResetModel()
+        self.loaded = 0
+        self.fetched = 0            # Anzahl bereits angehängter Seiten
+        self.exhausted = False
+        self.page_starts = [None]   # Keyset-Start (`after`) je Seite
+        self.pages = OrderedDict()  # LRU: Seitennummer -> Zeilen
+        self.requests = set()
+        self.endResetModel()
+
+    def _request(self, number):
+        key = f"users:{number}"
+        if key in self.requests:
+            return
+        self.requests.add(key)
+        self.loader.submit(key, self.db.get_users_page, self.page_starts[number], self.page_size,
+                           self.order_by, self.descending,
+                           on_result=lambda rows: self._page_loaded(number, rows),
+                           on_error=lambda message: self._page_failed(number, message))
+
+    def _page_loaded(self, number, rows):
+        self.requests.discard(f"users:{number}")
+        self.pages[number] = rows
+        if len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+        if number < self.fetched:
+            # Nachgeladene Seite: nur die sichtbaren Zellen neu zeichnen
+            first = number * self.page_size
+            self.dataChanged.emit(self.index(first, 0),
+                                  self.index(min(first + self.page_size, self.loaded) - 1, len(self.HEADERS) - 1))
+            return
+        self.fetched += 1
+        if len(rows) == self.page_size:
+            self.page_starts.append(DBHelper.user_sort_key(rows[-1], self.order_by))
+        else:
+            self.exhausted = True
+        if rows:
+            self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + len(rows) - 1)
+            self.loaded += len(rows)
+            self.endInsertRows()
+
+    def _page_failed(self, number, message):
+        self.requests.discard(f"users:{number}")
+        self.load_failed.emit(message)
+
+    def row_at(self, row):
+        number = row // self.page_size
+        rows = self.pages.get(number)
+        if rows is None:
+            self._request(number)
+            return None
+        self.pages.move_to_end(number)
+        offset = row % self.page_size
+        # Zwischen zwei Seitenzugriffen gelöschte Benutzer verkürzen die Seite
+        return rows[offset] if offset < len(rows) else None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid() and not self.exhausted:
+            self._request(self.fetched)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = self.row_at(index.row())
+        return row[index.column()] if row else None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.order_by = USER_SORT_COLUMNS[column]
+        self.descending = order == Qt.DescendingOrder
+        self.reset()
+
+    def username_at(self, row):
+        data = self.row_at(row)
+        return data[0] if data else None
 
 class UserAdminWindow(QWidget):
-    def __init__(self):
+    def __init__(self, db=None):
         super().__init__()
         self.setWindowTitle("Benutzerverwaltung")
         self.setMinimumSize(600, 400)
-        self.db = DBHelper()
+        # DBHelper des Studios mitbenutzen; das Schema legt der DataLoader an, nie der GUI-Thread
+        self.db = db or DBHelper(create_tables=False)
+        self.loader = DataLoader(parent=self)
         self.init_ui()
-        self.load_users()
+        self.loader.submit("schema", self.db.ensure_schema, on_result=self.database_ready,
+                           on_error=self.load_failed)
 
     def init_ui(self):
         self.label_title = QLabel("Benutzerverwaltung")
         self.label_title.setStyleSheet("font-size: 18px; font-weight: bold")
 
-        self.user_list = QListWidget()
+        self.user_model = UserTableModel(self.db, self.loader, parent=self)
+        self.user_model.load_failed.connect(self.load_failed)
+        self.user_table = QTableView()
+        self.user_table.setSortingEnabled(True)
+        self.user_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.user_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.user_table.verticalHeader().setDefaultSectionSize(22)
 
         self.input_name = QLineEdit()
         self.input_name.setPlaceholderText("Benutzername")
@@ -63,22 +191,28 @@ class UserAdminWindow(QWidget):
 
         layout = QVBoxLayout()
         layout.addWidget(self.label_title)
-        layout.addWidget(self.user_list)
+        layout.addWidget(self.user_table)
         layout.addLayout(hlayout1)
         layout.addLayout(hlayout2)
         layout.addLayout(hlayout3)
 
         self.setLayout(layout)
 
+    def database_ready(self, _):
+        # Erst jetzt an die View hängen, sonst fordert sie die erste Seite vor dem Schema an
+        self.user_table.setModel(self.user_model)
+        self.user_table.sortByColumn(0, Qt.AscendingOrder)
+
     def load_users(self):
-        self.user_list.clear()
-        try:
-            users = self.db.get_all_users()
-            for name, hwid, paket, token, email in users:
-                item = QListWidgetItem(f"{name} ({hwid}) [{paket}] Token: {token}")
-                self.user_list.addItem(item)
-        except Exception as e:
-            QMessageBox.critical(self, "Fehler beim Laden", str(e))
+        # Die View fordert die erste Seite über fetchMore an, der DataLoader lädt sie im Hintergrund
+        self.user_model.reset()
+
+    def load_failed(self, message):
+        QMessageBox.critical(self, "Fehler beim Laden", message)
+
+    def closeEvent(self, event):
+        self.loader.shutdown()
+        super().closeEvent(event)
 
     def add_user(self):
         name = self.input_name.text().strip()
@@ -90,25 +224,29 @@ class UserAdminWindow(QWidget):
         if not name or not pw or not hwid or not token:
             QMessageBox.warning(self, "Fehler", "Bitte alle Felder ausfüllen.")
             return
-        try:
-            self.db.add_user(name, pw, hwid, paket, token, email)
-            self.load_users()
-            self.input_name.clear()
-            self.input_password.clear()
-            self.input_hwid.clear()
-            self.input_token.clear()
-            self.input_email.clear()
-        except Exception as e:
-            QMessageBox.critical(self, "Fehler beim Hinzufügen", str(e))
+        self.button_add.setEnabled(False)
+        self.loader.submit("add_user", self.db.add_user, name, pw, hwid, paket, token, email,
+                           on_result=self.user_added, on_error=self.add_failed)
+
+    def user_added(self, _):
+        self.button_add.setEnabled(True)
+        self.load_users()
+        self.input_name.clear()
+        self.input_password.clear()
+        self.input_hwid.clear()
+        self.input_token.clear()
+        self.input_email.clear()
+
+    def add_failed(self, message):
+        self.button_add.setEnabled(True)
+        QMessageBox.critical(self, "Fehler beim Hinzufügen", message)
 
     def delete_user(self):
-        selected = self.user_list.currentItem()
-        if selected:
-            username = selected.text().split(" (")[0]
-            try:
-                self.db.delete_user(username)
-                self.load_users()
-            except Exception as e:
-                QMessageBox.critical(self, "Fehler beim Löschen", str(e))
+        selected = self.user_table.currentIndex()
+        username = self.user_model.username_at(selected.row()) if selected.isValid() else None
+        if username:
+            self.loader.submit("delete_user", self.db.delete_user, username,
+                               on_result=lambda _: self.load_users(),
+                               on_error=lambda msg: QMessageBox.critical(self, "Fehler beim Löschen", msg))
         else:
             QMessageBox.information(self, "Hinweis", "Bitte zuerst einen Benutzer auswählen.")
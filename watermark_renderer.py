@@ -0,0 +1,118 @@
+# watermark_renderer.py
+#
+# Blendet die Watermarks (Tabelle watermarks: path, position, visible) in
+# Videoframes ein. Jedes Logo wird einmal dekodiert und pro Frame-Auflösung
+# einmal skaliert; das vorberechnete Overlay (Farbe mit Alpha multipliziert,
+# inverses Alpha, Zielposition) liegt in einem LRU-Cache. Pro Frame bleibt
+# nur Ganzzahl-Arithmetik auf dem Ausschnitt unter dem Logo:
+#
+#   out = (frame * (256 - a) + rgb * a) >> 8        a = Alpha in 0..256
+#
+# Frames sind numpy-Arrays (Höhe, Breite, 3) in uint8, RGB.
+#
+#   python benchmarks/bench_watermark.py --resolution 1920x1080
+
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from PIL import Image
+
+import config
+import metrics
+
+POSITIONS = ('top-left', 'top-right', 'bottom-left', 'bottom-right')
+
+# Auflösungen, für die precompute() Overlays vorab erzeugt
+COMMON_RESOLUTIONS = ((1920, 1080), (1280, 720), (1024, 576), (720, 576), (640, 360))
+
+OVERLAYS_BUILT = metrics.REGISTRY.counter(
+    "iptv_watermark_overlays_built_total", "Skalierte Watermark-Overlays (LRU-Misses)")
+
+# premul: rgb * a (uint16, h x w x 3), inverse: 256 - a (uint16, h x w x 1)
+Overlay = namedtuple('Overlay', 'x y premul inverse')
+
+
+class WatermarkRenderer:
+    """Composites watermark logos onto RGB frames with cached, pre-scaled overlays."""
+
+    def __init__(self, scale=None, margin=None, cache_size=None):
+        self.scale = scale or config.WATERMARK_SCALE
+        self.margin = config.WATERMARK_MARGIN if margin is None else margin
+        self.cache_size = cache_size or config.WATERMARK_CACHE_SIZE
+        self.lock = threading.Lock()
+        self.sources = {}              # path -> dekodiertes RGBA-Bild (PIL)
+        self.overlays = OrderedDict()  # (path, position, width, height) -> Overlay
+
+    def source(self, path):
+        """Decoded RGBA logo; every file is decoded only once."""
+        with self.lock:
+            image = self.sources.get(path)
+        if image is None:
+            with Image.open(path) as raw:
+                image = raw.convert('RGBA')
+            with self.lock:
+                image = self.sources.setdefault(path, image)
+        return image
+
+    def _build(self, path, position, width, height):
+        if position not in POSITIONS:
+            raise ValueError(f"Unbekannte Watermark-Position: {position}")
+        logo = self.source(path)
+        logo_w = max(1, min(width, round(width * self.scale)))
+        logo_h = max(1, min(height, round(logo.height * logo_w / logo.width)))
+        pixels = np.asarray(logo.resize((logo_w, logo_h), Image.LANCZOS), dtype=np.uint16)
+        alpha = (pixels[:, :, 3:] * 256 + 127) // 255
+        margin = round(width * self.margin)
+        x = margin if position.endswith('left') else width - logo_w - margin
+        y = margin if position.startswith('top') else height - logo_h - margin
+        x, y = min(max(0, x), width - logo_w), min(max(0, y), height - logo_h)
+        OVERLAYS_BUILT.inc()
+        return Overlay(x, y, pixels[:, :, :3] * alpha, 256 - alpha)
+
+    def overlay(self, path, position, width, height):
+        """Pre-scaled overlay for a frame size (LRU cache of cache_size entries)."""
+        key = (path, position, width, height)
+        with self.lock:
+            overlay = self.overlays.get(key)
+            if overlay is not None:
+                self.overlays.move_to_end(key)
+                return overlay
+        overlay = self._build(path, position, width, height)
+        with self.lock:
+            self.overlays[key] = overlay
+            while len(self.overlays) > self.cache_size:
+                self.overlays.popitem(last=False)
+        return overlay
+
+    def precompute(self, watermarks, resolutions=COMMON_RESOLUTIONS):
+        """Builds the overlays of all visible watermark rows (db.get_watermarks()) up front."""
+        for _, _, path, position, visible in watermarks:
+            if visible:
+                for width, height in resolutions:
+                    self.overlay(path, position, width, height)
+
+    def composite(self, frame, path, position):
+        """Blends one logo into `frame` in place and returns the frame."""
+        height, width = frame.shape[:2]
+        ov = self.overlay(path, position, width, height)
+        h, w = ov.inverse.shape[:2]
+        region = frame[ov.y:ov.y + h, ov.x:ov.x + w]
+        blended = region * ov.inverse
+        blended += ov.premul
+        blended >>= 8
+        region[...] = blended
+        return frame
+
+    def render(self, frame, watermarks):
+        """Blends all visible watermark rows into `frame` in place."""
+        for _, _, path, position, visible in watermarks:
+            if visible:
+                self.composite(frame, path, position)
+        return frame
+
+    def clear(self):
+        """Forgets decoded logos and overlays (e.g. after a watermark file was replaced)."""
+        with self.lock:
+            self.sources.clear()
+            self.overlays.clear()
@@ -0,0 +1,106 @@
+# webhook_queue.py
+#
+# Dauerhafte Eingangs-Queue für Payment-Webhooks. Der Webhook-Endpunkt prüft
+# nur die Signatur, legt das Event in webhook_events ab und antwortet sofort;
+# ein Worker-Pool verarbeitet die Events danach. Die event_id des Providers
+# ist Primärschlüssel, Wiederholungen des Providers werden dadurch verworfen.
+# Fehlgeschlagene Events werden mit exponentiellem Backoff erneut versucht,
+# nach einem Absturz hängengebliebene Events beim Start zurückgesetzt.
+
+import json
+import threading
+import time
+
+import config
+import metrics
+
+WEBHOOK_EVENTS = metrics.REGISTRY.counter(
+    "iptv_webhook_events_total", "Webhook-Events nach Ergebnis", ("result",))
+WEBHOOK_PROCESSING = metrics.REGISTRY.histogram(
+    "iptv_webhook_processing_seconds", "Verarbeitungszeit eines Webhook-Events")
+
+
+class WebhookQueue:
+    """SQLite-backed webhook queue with a worker pool.
+
+    `handler(event)` gets a dict with event_id, provider, type, payload (parsed
+    JSON) and attempts; an exception schedules a retry.
+    """
+
+    def __init__(self, db, handler, workers=None, batch_size=None, max_attempts=None,
+                 retry_base=None, clock=time.time):
+        self.db = db
+        self.handler = handler
+        self.workers = workers or config.WEBHOOK_WORKERS
+        self.batch_size = batch_size or config.WEBHOOK_BATCH
+        self.max_attempts = max_attempts or config.WEBHOOK_MAX_ATTEMPTS
+        self.retry_base = config.WEBHOOK_RETRY_BASE if retry_base is None else retry_base
+        self.clock = clock
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def enqueue(self, event_id, provider, event_type, payload):
+        """Stores the event durably. Returns False for duplicates (already received)."""
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+        queued = self.db.enqueue_webhook_event(event_id, provider, event_type, payload)
+        WEBHOOK_EVENTS.inc(("queued" if queued else "duplicate",))
+        if queued:
+            self.wake.set()
+        return queued
+
+    def process_batch(self):
+        """Claims and processes one batch of due events. Returns the number processed."""
+        rows = self.db.claim_webhook_events(self.clock(), self.batch_size)
+        for event_id, provider, event_type, payload, attempts in rows:
+            event = {'event_id': event_id, 'provider': provider, 'type': event_type,
+                     'payload': json.loads(payload), 'attempts': attempts}
+            start = time.perf_counter()
+            try:
+                self.handler(event)
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    self.db.fail_webhook_event(event_id, str(e))
+                    WEBHOOK_EVENTS.inc(("failed",))
+                else:
+                    retry_at = self.clock() + self.retry_base * 2 ** (attempts - 1)
+                    self.db.fail_webhook_event(event_id, str(e), retry_at)
+                    WEBHOOK_EVENTS.inc(("retry",))
+            else:
+                self.db.finish_webhook_event(event_id)
+                WEBHOOK_EVENTS.inc(("done",))
+            WEBHOOK_PROCESSING.observe(time.perf_counter() - start)
+        return len(rows)
+
+    def drain(self):
+        """Processes until no event is due (for tests and benchmarks). Returns the total."""
+        total = 0
+        while True:
+            done = self.process_batch()
+            if not done:
+                return total
+            total += done
+
+    def _worker(self):
+        while not self.stopped.is_set():
+            if self.process_batch():
+                continue
+            self.wake.wait(config.WEBHOOK_POLL_INTERVAL)
+            self.wake.clear()
+
+    def start(self):
+        requeued = self.db.requeue_stale_webhook_events(self.clock() - config.WEBHOOK_STALE_AFTER)
+        if requeued:
+            print(f"[INFO] {requeued} Webhook-Events nach Absturz erneut eingereiht")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self.stopped.set()
+        self.wake.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []